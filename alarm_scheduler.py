@@ -0,0 +1,200 @@
+#
+# Alarm scheduler for radio_alarm_clock.py
+# This file must be saved on the Pico next to radio_alarm_clock.py
+#
+# Times are absolute seconds: day * 86400 + seconds since midnight, where day
+# counts the days since the clock was started. Every alarm has its next fire
+# time in a min-heap, so the per tick check is one compare against the head.
+#
+# Adding an alarm pushes one heap entry. Editing or deleting an alarm bumps its
+# version instead of searching the heap; entries with an old version are thrown
+# away when they reach the head.
+#
+try:
+    import heapq
+except ImportError:
+    import uheapq as heapq
+
+SECONDS_PER_DAY = 86400
+
+KIND_ONCE = 0 # fires at the next occurrence of its time of day, then is removed
+KIND_WEEKLY = 1 # fires on the weekdays in its day mask (bit 0 = Monday)
+KIND_SNOOZE = 2 # fires once at an absolute time, then is removed
+
+EVERY_DAY = 0x7F
+WEEKDAYS = 0x1F
+WEEKEND = 0x60
+
+# Positions in an alarm entry
+KIND = 0
+TIME = 1 # seconds since midnight (absolute time for snoozes)
+DAYS = 2
+FIRE = 3 # next fire time
+VERSION = 4
+
+# Alarm scheduler class
+class AlarmScheduler:
+
+    def __init__( self, start_weekday = 0 ):
+        self.start_weekday = start_weekday # weekday of day 0, 0 = Monday
+        self.alarms = {} # id -> [ kind, time, days, next fire, version ]
+        self.heap = [] # ( next fire, id, version )
+        self.next_id = 1
+        self.last_fired = -1 # id and kind of the alarm due() returned last (for report())
+        self.last_kind = -1
+
+    def weekday( self, day ):
+        return(( day + self.start_weekday ) % 7 )
+
+#
+# Make day fall on weekday (0 = Monday) and schedule the weekly alarms again
+#
+    def set_weekday( self, day, weekday, now ):
+        self.start_weekday = ( weekday - day ) % 7
+        self.reschedule( now )
+
+#
+# First time at or after "after" that falls on time_of_day (and on one of the days in the mask)
+#
+    def next_occurrence( self, time_of_day, days, after ):
+        day = after // SECONDS_PER_DAY
+        if day * SECONDS_PER_DAY + time_of_day < after:
+            day += 1
+        if days:
+            while not ( days >> self.weekday( day )) & 1:
+                day += 1
+        return( day * SECONDS_PER_DAY + time_of_day )
+
+    def schedule( self, alarm_id, entry, fire ):
+        entry[FIRE] = fire
+        entry[VERSION] += 1
+        heapq.heappush( self.heap, ( fire, alarm_id, entry[VERSION] ))
+
+#
+# Adding alarms, each returns the id of the new alarm. "now" is the current absolute
+# time; an alarm for the current minute still fires, like the old minute compare did.
+#
+    def add( self, kind, time, days, fire ):
+        alarm_id = self.next_id
+        self.next_id += 1
+        entry = [kind, time, days, 0, 0]
+        self.alarms[alarm_id] = entry
+        self.schedule( alarm_id, entry, fire )
+        return( alarm_id )
+
+    def add_once( self, time_of_day, now ):
+        return( self.add( KIND_ONCE, time_of_day, 0,
+                          self.next_occurrence( time_of_day, 0, now - now % 60 )))
+
+    def add_weekly( self, time_of_day, days, now ):
+        if days & EVERY_DAY == 0:
+            raise ValueError( "no weekday selected" )
+        return( self.add( KIND_WEEKLY, time_of_day, days & EVERY_DAY,
+                          self.next_occurrence( time_of_day, days & EVERY_DAY, now - now % 60 )))
+
+    def add_snooze( self, fire ):
+        return( self.add( KIND_SNOOZE, fire, 0, fire ))
+
+#
+# Change the time (and for weekly alarms the days) of an existing alarm
+#
+    def edit( self, alarm_id, time_of_day, now, days = None ):
+        entry = self.alarms[alarm_id]
+        if entry[KIND] == KIND_SNOOZE:
+            entry[TIME] = time_of_day
+            self.schedule( alarm_id, entry, time_of_day )
+            return
+        if days is not None and entry[KIND] == KIND_WEEKLY:
+            entry[DAYS] = days & EVERY_DAY
+        entry[TIME] = time_of_day
+        self.schedule( alarm_id, entry,
+                       self.next_occurrence( time_of_day, entry[DAYS], now - now % 60 ))
+
+    def delete( self, alarm_id ):
+        if alarm_id in self.alarms:
+            del self.alarms[alarm_id]
+            self.drop_stale()
+
+    def delete_kind( self, kind ): # e.g. all pending snoozes
+        for alarm_id in [alarm_id for alarm_id in self.alarms if self.alarms[alarm_id][KIND] == kind]:
+            del self.alarms[alarm_id]
+        self.drop_stale()
+
+    def get( self, alarm_id ): # ( kind, time, days, next fire ) or None
+        entry = self.alarms.get( alarm_id )
+        if entry is None:
+            return( None )
+        return( entry[KIND], entry[TIME], entry[DAYS], entry[FIRE] )
+
+    def pending( self ):
+        return( len( self.alarms ))
+
+    def ids( self ): # every alarm id, oldest first
+        return( sorted( self.alarms ))
+
+#
+# Throw away heap entries of deleted or edited alarms that sit at the head
+#
+    def drop_stale( self ):
+        heap = self.heap
+        while heap:
+            fire, alarm_id, version = heap[0]
+            entry = self.alarms.get( alarm_id )
+            if entry is not None and entry[VERSION] == version:
+                return
+            heapq.heappop( heap )
+
+#
+# Absolute time of the next alarm, -1 when none is set
+#
+    def next_fire( self ):
+        self.drop_stale()
+        if self.heap:
+            return( self.heap[0][0] )
+        return( -1 )
+
+#
+# Called once per tick. Returns the id of an alarm that is due, or -1.
+# Weekly alarms are put back into the heap at their next day; the others are removed.
+#
+    def due( self, now ):
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            fire, alarm_id, version = heapq.heappop( heap )
+            entry = self.alarms.get( alarm_id )
+            if entry is None or entry[VERSION] != version:
+                continue
+            if entry[KIND] == KIND_WEEKLY:
+                self.schedule( alarm_id, entry,
+                               self.next_occurrence( entry[TIME], entry[DAYS], fire + 1 ))
+            else:
+                del self.alarms[alarm_id]
+            self.last_fired = alarm_id
+            self.last_kind = entry[KIND]
+            return( alarm_id )
+        return( -1 )
+
+#
+# The clock was set: work out every next fire time again from the new time.
+# Snoozes keep their absolute time, so they still fire after the same wait.
+#
+    def reschedule( self, now, shift = 0 ):
+        self.heap = []
+        for alarm_id in self.alarms:
+            entry = self.alarms[alarm_id]
+            if entry[KIND] == KIND_SNOOZE:
+                entry[TIME] += shift
+                fire = entry[TIME]
+            else:
+                fire = self.next_occurrence( entry[TIME], entry[DAYS], now - now % 60 )
+            entry[FIRE] = fire
+            entry[VERSION] += 1
+            self.heap.append(( fire, alarm_id, entry[VERSION] ))
+        heapq.heapify( self.heap )
+
+#
+# One line summary for the serial console
+#
+    def report( self ):
+        return( "alarms:{} heap:{} next:{} last:{}/{}".format( len( self.alarms ), len( self.heap ),
+                self.next_fire(), self.last_fired, self.last_kind ))
@@ -0,0 +1,122 @@
+"""Replay an input trace on the host through the simulator.
+
+    python benchmarks/host_replay.py trace.bin --out replay.log
+    python benchmarks/host_replay.py trace.bin --compare replay.log
+
+The trace is one recorded on the Pico (or in the simulator) with
+``set trace on`` / ``set trace off``. Every event runs through
+benchmarks/replay.py as fast as the virtual clock allows, and the per event
+log of state, time and radio register changes is printed or written out.
+
+The simulator charges the host CPU time to its virtual clock during the
+replay (see sim.clock.VirtualClock), so the ``us:`` timings are modelled bus
+time plus CPython time on this machine: comparable between runs on the same
+machine, not with the Pico. The replay runs ``--repeat`` times with CPython's
+garbage collector off and every event keeps its best time.
+
+``--compare`` diffs the log against an earlier one and exits with status 1
+when the clock behaved differently. The ``us:`` timings are left out of the
+diff; they are summed up next to each other instead, so the same command
+shows whether a change made the replay slower.
+"""
+
+import argparse
+import contextlib
+import difflib
+import gc
+import io
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from sim import Simulation  # noqa: E402
+
+REPLAY = os.path.join(HERE, "replay.py")
+TIMING = re.compile(r" us:(\d+)$")
+
+
+def run_replay(trace, speed=0):
+    flash_dir = tempfile.mkdtemp(prefix="sim-replay-")
+    try:
+        shutil.copy(trace, os.path.join(flash_dir, "trace.bin"))
+        sim = Simulation(REPLAY, flash_dir=flash_dir, defines={"SPEED": speed}, cpu_time=True)
+        gc.disable()
+        with contextlib.redirect_stdout(io.StringIO()):
+            sim.run(seconds=7 * 24 * 3600)
+        return sim.namespace["log"]
+    finally:
+        gc.enable()
+        shutil.rmtree(flash_dir, ignore_errors=True)
+
+
+def best_timings(logs):
+    """Merge replays of one trace: the first log with each event's best time."""
+    merged = []
+    for lines in zip(*logs):
+        times = [TIMING.search(line) for line in lines]
+        if times[0] is None:
+            merged.append(lines[0])
+            continue
+        fastest = min(int(match.group(1)) for match in times if match)
+        merged.append(lines[0][:times[0].start()] + " us:%d" % fastest)
+    return merged
+
+
+def split_timing(lines):
+    """Return the log without timings and the total time in us."""
+    behaviour = []
+    total_us = 0
+    for line in lines:
+        match = TIMING.search(line)
+        if match:
+            total_us += int(match.group(1))
+            line = line[:match.start()]
+        behaviour.append(line)
+    return behaviour, total_us
+
+
+def compare(old, new):
+    """Print the differences; return True when the behaviour changed."""
+    old_lines, old_us = split_timing(old)
+    new_lines, new_us = split_timing(new)
+    diff = list(difflib.unified_diff(old_lines, new_lines, "old", "new", lineterm=""))
+    for line in diff:
+        print(line)
+    events = sum(1 for line in new_lines if line[:1].isdigit())  # not the start and alarm lines
+    print("events %d, behaviour %s" % (events, "changed" if diff else "identical"))
+    if old_us:
+        print("time %d us -> %d us (%+.1f%%)" % (old_us, new_us, (new_us - old_us) * 100.0 / old_us))
+    return bool(diff)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("trace", help="trace file recorded by the clock")
+    parser.add_argument("--out", help="write the replay log to this file")
+    parser.add_argument("--compare", help="earlier replay log to compare against")
+    parser.add_argument("--speed", type=int, default=0,
+                        help="times faster than recorded (default 0: no waiting)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="replays, each event keeps its best time (default 3)")
+    args = parser.parse_args(argv)
+
+    log = best_timings([run_replay(args.trace, args.speed) for i in range(args.repeat)])
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write("\n".join(log) + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            old = f.read().splitlines()
+        return 1 if compare(old, log) else 0
+    if not args.out:
+        print("\n".join(log))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
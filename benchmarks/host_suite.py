@@ -0,0 +1,162 @@
+"""Run benchmarks/suite.py on the host through the simulator.
+
+    python benchmarks/host_suite.py --out results.json
+    python benchmarks/host_suite.py --compare results.json
+
+The suite runs twice. The first run uses the plain virtual clock: bus
+traffic and heap numbers (CPython allocations traced by tracemalloc) come from
+it and are identical from run to run. The second run also charges the host CPU
+time to the virtual clock (see sim.clock.VirtualClock), and the times
+(mean_us, p99_us, max_us, commands_per_s) come from it: modelled bus time plus
+CPython time on this machine. They vary a little between runs and are only
+comparable with results from the same machine. To keep them steady, that run
+is repeated (``--repeat``) with CPython's garbage collector off and the best
+figure of the repeats is kept, the way timeit does. ``--virtual`` skips the second run
+and reports bus time only. Run suite.py on the Pico for MicroPython heap
+and wall-clock figures.
+
+``--compare`` prints every metric next to an earlier result file and exits
+with status 1 when one got worse by more than ``--tolerance`` (times: by more
+than ``--time-tolerance``, which allows for the host's noise).
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from sim import Simulation  # noqa: E402
+
+SUITE = os.path.join(HERE, "suite.py")
+
+# metrics taken from the run with CPU time
+TIME_METRICS = ["mean_us", "p99_us", "max_us", "commands_per_s"]
+
+# metrics where a larger value is a regression
+METRICS = [
+    "mean_us",
+    "p99_us",
+    "spi_bytes_per_frame",
+    "i2c_transactions_per_s",
+    "i2c_transactions_per_batch",
+    "i2c_bytes_per_s",
+    "heap_bytes_per_tick",
+]
+
+
+def revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_once(iterations, cpu_time=False, trace_heap=False):
+    sim = Simulation(SUITE, defines={"ITERATIONS": iterations}, cpu_time=cpu_time)
+    if trace_heap:
+        tracemalloc.start()
+    if cpu_time:
+        gc.disable()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            sim.run(seconds=24 * 3600)
+    finally:
+        if trace_heap:
+            tracemalloc.stop()
+        if cpu_time:
+            gc.enable()
+    return sim.namespace["results"]
+
+
+def best(values, metric):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return max(values) if metric == "commands_per_s" else min(values)
+
+
+def run_suite(iterations, cpu_time=True, repeat=3):
+    results = run_once(iterations, trace_heap=True)
+    results["clock"] = "virtual"
+    if cpu_time:
+        timed = [run_once(iterations, cpu_time=True) for i in range(repeat)]
+        for name, workload in results["workloads"].items():
+            for metric in TIME_METRICS:
+                if metric in workload:
+                    workload[metric] = best([t["workloads"][name][metric] for t in timed], metric)
+        results["clock"] = "virtual+cpu"
+        results["repeat"] = repeat
+    results["heap"] = "tracemalloc"
+    results["revision"] = revision()
+    return results
+
+
+def compare(old, new, tolerance, time_tolerance):
+    """Print old/new per metric; return the number of regressions."""
+    regressions = 0
+    print("%-14s %-24s %12s %12s %8s" % ("workload", "metric", "old", "new", "change"))
+    for name, current in new["workloads"].items():
+        previous = old.get("workloads", {}).get(name)
+        if previous is None:
+            continue
+        for metric in METRICS:
+            a = previous.get(metric)
+            b = current.get(metric)
+            if a is None or b is None:
+                continue
+            if a:
+                change = (b - a) / a
+            else:
+                change = 0.0 if not b else float("inf")
+            flag = ""
+            limit = time_tolerance if metric in TIME_METRICS else tolerance
+            if change > limit:
+                flag = "  worse"
+                regressions += 1
+            elif change < -limit:
+                flag = "  better"
+            print("%-14s %-24s %12.1f %12.1f %+7.1f%%%s" % (name, metric, a, b, change * 100, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="relative increase counted as a regression (default 0.05)")
+    parser.add_argument("--time-tolerance", type=float, default=0.25,
+                        help="the same for the times measured with CPU time (default 0.25)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs with CPU time, the best one counts (default 3)")
+    parser.add_argument("--virtual", action="store_true",
+                        help="bus time only, no CPU time: identical from run to run")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.iterations, cpu_time=not args.virtual, repeat=args.repeat)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        return 1 if compare(old, results, args.tolerance, args.time_tolerance) else 0
+    if not args.out:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+#
+# Render micro-benchmark for radio_alarm_clock.py
+# Copy this file to the Pico next to radio_alarm_clock.py and run it instead of the clock,
+# or run it on a PC with host CPU time charged to the simulator's clock (drawing uses no
+# bus, so the plain virtual clock would show 0 us):
+#
+#   python -m sim --script benchmarks/render_benchmark.py --cpu-time --seconds 3600
+#
+# Importing the clock sets up the display, radio and menus but does not start the runtime.
+#
+# For every screen it times FRAMES frames drawn text by text (USE_TEMPLATES = False)
+# against FRAMES frames started from the cached static layer (USE_TEMPLATES = True).
+# The first frame of each run is not counted, so layer building is left out.
+#
+import utime
+import radio_alarm_clock as clock
+
+FRAMES = 50
+STATES = [0, 1, 2, 3, 32, 33, 4, 42, 43, 5]
+
+def time_frames( use_templates, state ): # average us per render_frame()
+    clock.USE_TEMPLATES = use_templates
+    clock.menu.state = state
+    clock.render_frame()
+    start = utime.ticks_us()
+    for i in range( FRAMES ):
+        clock.render_frame()
+    return( utime.ticks_diff( utime.ticks_us(), start ) // FRAMES )
+
+def run():
+    print( "state  text us  template us  speedup" )
+    text_total = 0
+    template_total = 0
+    for state in STATES:
+        text_us = time_frames( False, state )
+        template_us = time_frames( True, state )
+        text_total += text_us
+        template_total += template_us
+        print( "{:>5}  {:>7}  {:>11}  {:>6.2f}x".format(
+            state, text_us, template_us, text_us / max( 1, template_us )))
+    print( "  all  {:>7}  {:>11}  {:>6.2f}x".format(
+        text_total, template_total, text_total / max( 1, template_total )))
+    print( clock.templates.report() )
+
+    clock.USE_TEMPLATES = True
+    clock.menu.state = 0
+
+run()
@@ -0,0 +1,112 @@
+#
+# Input trace replay for radio_alarm_clock.py
+# Copy this file to the Pico next to radio_alarm_clock.py and a trace recorded with
+# "set trace on" / "set trace off" and run it instead of the clock, or run it on a PC
+# through the simulator with benchmarks/host_replay.py.
+# Importing the clock sets up the display, radio and menus but does not start the runtime.
+#
+# The clock goes back to the state the trace started from, then every event is fed
+# through the state machine the way the runtime would: the ticks up to the event's
+# tick are counted (checking the alarms on each), the event is dispatched, the frame
+# is drawn and flushed and the radio bus is serviced. SPEED sets how much faster than
+# recorded the events follow each other (0 = no waiting at all). The alarm volume
+# ramp runs on its own timer in the clock and is not stepped here.
+#
+# One log line per event:
+#
+#   <n> <ms> t<tick> b<button> <kind> s<switch> state:<state> time:<hh:mm:ss> day:<day> [rXX=YYYY ...] [us:<time>]
+#
+# The log starts with a "start" line for the snapshot (all registers).
+# rXX=YYYY are the radio registers whose value changed with the event, as written to
+# the chip. An alarm going off between two events gets a line of its own. us: (only
+# with TIMING) is the time the event took, the one field that differs between two
+# replays of the same trace on the same code.
+#
+import utime
+
+import radio_alarm_clock as clock
+from input_trace import load_trace
+from input_events import event_button, event_switch, event_kind, event_speed
+from input_events import EVENT_PRESS, EVENT_RELEASE
+
+if "TRACE" not in globals(): # host_replay.py can set these before running the file
+    TRACE = clock.TRACE_FILE
+if "SPEED" not in globals():
+    SPEED = 0
+if "TIMING" not in globals():
+    TIMING = True
+
+KIND_NAMES = { EVENT_PRESS: "press", EVENT_RELEASE: "release" }
+
+def kind_name( code ):
+    kind = event_kind( code )
+    if kind in KIND_NAMES:
+        return( KIND_NAMES[kind] )
+    return( "repeat%d" % event_speed( code ))
+
+def state_text():
+    seconds = clock.clock_seconds
+    return( "state:%d time:%02d:%02d:%02d day:%d" % ( clock.menu.state, seconds // 3600,
+            ( seconds // 60 ) % 60, seconds % 60, clock.clock_day ))
+
+def register_changes( before, after ): # registers 02h-05h as written to the chip
+    changes = ""
+    for i in range( 0, len( after ), 2 ):
+        if before[i] != after[i] or before[i + 1] != after[i + 1]:
+            changes += " r%02X=%02X%02X" % ( 2 + i // 2, after[i], after[i + 1] )
+    return( changes )
+
+def settle(): # the rest of a band scan and every queued radio write
+    radio = clock.fm_radio
+    while radio.Scanning:
+        radio.ScanStep()
+        utime.sleep_ms( clock.SCAN_POLL_MS )
+    for i in range( clock.RADIO_QUEUE_SIZE ):
+        if not radio.ServiceBus():
+            break
+
+def replay( name ):
+    state, events = load_trace( name )
+    radio = clock.fm_radio
+    clock.restore_trace_state( state )
+    settle()
+    clock.display.invalidate()
+    clock.render_frame()
+    clock.display.flush()
+    registers = bytearray( radio.Shadow )
+    lines = [ "start " + state_text() + register_changes( bytearray( 8 ), registers ) ]
+    tick = 0
+    last_ms = 0
+    total_us = 0
+    for index in range( len( events )):
+        ms, event_tick, code = events[index]
+        if SPEED > 0:
+            utime.sleep_ms( max( 0, ms - last_ms ) // SPEED )
+        last_ms = ms
+        while tick < event_tick:
+            tick += 1
+            clock.advance_clock( 1 )
+            if clock.check_alarm():
+                settle()
+                lines.append( "alarm t%d %s%s" % ( tick, state_text(),
+                              register_changes( registers, radio.Shadow )))
+                registers[:] = radio.Shadow
+        start = utime.ticks_us()
+        clock.dispatch_event( code )
+        clock.render_frame()
+        clock.display.flush()
+        settle()
+        elapsed = utime.ticks_diff( utime.ticks_us(), start )
+        total_us += elapsed
+        line = "%d %d t%d b%d %s s%d %s%s" % ( index, ms, tick, event_button( code ), kind_name( code ),
+               event_switch( code ), state_text(), register_changes( registers, radio.Shadow ))
+        if TIMING:
+            line += " us:%d" % elapsed
+        lines.append( line )
+        registers[:] = radio.Shadow
+    return( lines, len( events ), total_us )
+
+log, replayed, elapsed_us = replay( TRACE )
+for line in log:
+    print( line )
+print( "replayed %d events in %d us" % ( replayed, elapsed_us ))
@@ -0,0 +1,203 @@
+#
+# Benchmark suite for radio_alarm_clock.py
+# Copy this file to the Pico next to radio_alarm_clock.py and run it instead of the clock,
+# or run it on a PC through the simulator with benchmarks/host_suite.py.
+# Importing the clock sets up the display, radio and menus but does not start the runtime.
+#
+# Every workload puts the menu in one state and runs ITERATIONS loop iterations, each
+# doing the work of one clock tick: advance the time, check the alarms, optionally press
+# a button or poll the radio, draw the frame, flush it to the panel and service the radio
+# bus. Per workload it reports the mean and 99th percentile iteration time, SPI bytes
+# per frame, I2C transactions and bytes per second (one iteration = one second) and heap
+# bytes allocated per tick. The results are printed as one line of JSON.
+#
+# The serial workloads run one command line per iteration the way serial_task does
+# (one transaction: a single radio write and redraw), so their mean_us is the cost
+# of a batch and commands_per_s the command throughput at that cost. Their replies
+# are not printed, so the console only shows the JSON.
+#
+import gc
+import sys
+import utime
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+import radio_alarm_clock as clock
+
+if "ITERATIONS" not in globals(): # host_suite.py can set this before running the file
+    ITERATIONS = 200
+
+#
+# ( name, state, buttons pressed in turn (0 = none), poll the radio status )
+#
+WORKLOADS = [
+    ( "state_0", 0, [0], False ),
+    ( "state_1", 1, [0], False ),
+    ( "state_2", 2, [0], False ),
+    ( "state_3", 3, [0], False ),
+    ( "state_32", 32, [0], False ),
+    ( "state_33", 33, [0], False ),
+    ( "state_4", 4, [0], False ),
+    ( "state_42", 42, [0], False ),
+    ( "state_43", 43, [0], False ),
+    ( "state_5", 5, [0], False ),
+    ( "time_set", 2, [3], False ), # minute +1 every second
+    ( "tuning", 42, [2, 3], False ), # frequency up/down: one radio write per second
+    ( "volume", 43, [2, 3], False ), # volume up/down: one radio write per second
+    ( "status_poll", 4, [0], True ), # GetSettings() every second
+]
+
+#
+# ( name, command line run every iteration, alternating with the second one )
+#
+SERIAL_WORKLOADS = [
+    ( "serial_get", "get time; get vol; get freq; get mute", "get alarms" ),
+    ( "serial_set", "set vol 9; set freq 101.1; set mute 0", "set vol 3; set freq 99.9; set mute 1" ),
+]
+
+# I2C wrapper class that counts the radio's bus traffic
+class CountingI2C:
+
+    def __init__( self, i2c ):
+        self.i2c = i2c
+        self.transactions = 0
+        self.bytes = 0
+
+    def writeto( self, address, buffer, stop = True ):
+        self.transactions += 1
+        self.bytes += len( buffer )
+        return( self.i2c.writeto( address, buffer, stop ))
+
+    def readfrom_into( self, address, buffer, stop = True ):
+        self.transactions += 1
+        self.bytes += len( buffer )
+        return( self.i2c.readfrom_into( address, buffer, stop ))
+
+    def readfrom_mem_into( self, address, register, buffer, addrsize = 8 ):
+        self.transactions += 1
+        self.bytes += 1 + len( buffer ) # register address plus data
+        return( self.i2c.readfrom_mem_into( address, register, buffer, addrsize = addrsize ))
+
+def percentile( values, fraction ): # values must be sorted
+    return( values[min( len( values ) - 1, int( fraction * len( values )))] )
+
+def run_workload( name, state, buttons, poll, bus ):
+    times = []
+    spi_bytes = []
+    allocated = []
+    bus.transactions = 0
+    bus.bytes = 0
+    clock.menu.state = state
+    clock.display.invalidate()
+    clock.render_frame() # first frame sends everything, not counted
+    clock.display.flush()
+    gc.collect()
+
+    for i in range( ITERATIONS ):
+        button = buttons[i % len( buttons )]
+        heap_before = gc.mem_alloc()
+        start = utime.ticks_us()
+
+        clock.advance_clock( 1 )
+        clock.alarms.due( clock.clock_now() )
+        if button:
+            clock.switch_level = 0
+            clock.menu.dispatch( button )
+        if poll:
+            clock.fm_radio.GetSettings()
+        clock.render_frame()
+        clock.display.flush()
+        clock.fm_radio.ServiceBus()
+
+        times.append( utime.ticks_diff( utime.ticks_us(), start ))
+        allocated.append( max( 0, gc.mem_alloc() - heap_before ))
+        spi_bytes.append( clock.display.bytes_last_frame )
+        clock.menu.state = state
+
+    times.sort()
+    return( {
+        "state": state,
+        "mean_us": sum( times ) / len( times ),
+        "p99_us": percentile( times, 0.99 ),
+        "max_us": times[-1],
+        "spi_bytes_per_frame": sum( spi_bytes ) / len( spi_bytes ),
+        "spi_bytes_per_frame_max": max( spi_bytes ),
+        "i2c_transactions_per_s": bus.transactions / ITERATIONS,
+        "i2c_bytes_per_s": bus.bytes / ITERATIONS,
+        "heap_bytes_per_tick": sum( allocated ) / len( allocated ),
+        "heap_bytes_per_tick_max": max( allocated ),
+    } )
+
+def no_reply( text ):
+    pass
+
+def run_serial_workload( name, lines, bus ):
+    times = []
+    spi_bytes = []
+    allocated = []
+    commands = 0
+    bus.transactions = 0
+    bus.bytes = 0
+    clock.menu.state = 0
+    clock.display.invalidate()
+    clock.render_frame()
+    clock.display.flush()
+    gc.collect()
+
+    for i in range( ITERATIONS ):
+        line = lines[i % len( lines )]
+        commands += line.count( ";" ) + 1
+        heap_before = gc.mem_alloc()
+        start = utime.ticks_us()
+
+        clock.serial.begin()
+        clock.serial.execute( line )
+        clock.serial.commit()
+        clock.render_frame()
+        clock.display.flush()
+        clock.fm_radio.ServiceBus()
+
+        elapsed = utime.ticks_diff( utime.ticks_us(), start )
+        times.append( elapsed )
+        allocated.append( max( 0, gc.mem_alloc() - heap_before ))
+        spi_bytes.append( clock.display.bytes_last_frame )
+
+    times.sort()
+    total_us = sum( times )
+    return( {
+        "state": 0,
+        "mean_us": total_us / len( times ),
+        "p99_us": percentile( times, 0.99 ),
+        "max_us": times[-1],
+        "commands_per_s": commands * 1000000 / total_us if total_us else None, # None: no measurable time
+        "spi_bytes_per_frame": sum( spi_bytes ) / len( spi_bytes ),
+        "spi_bytes_per_frame_max": max( spi_bytes ),
+        "i2c_transactions_per_batch": bus.transactions / ITERATIONS,
+        "i2c_bytes_per_s": bus.bytes / ITERATIONS,
+        "heap_bytes_per_tick": sum( allocated ) / len( allocated ),
+        "heap_bytes_per_tick_max": max( allocated ),
+    } )
+
+def run():
+    bus = CountingI2C( clock.fm_radio.radio_i2c )
+    clock.fm_radio.radio_i2c = bus
+    results = {
+        "platform": sys.platform,
+        "iterations": ITERATIONS,
+        "full_frame_spi_bytes": len( clock.oled.buffer ) + 6, # what oled.show() sends
+        "workloads": {},
+    }
+    for name, state, buttons, poll in WORKLOADS:
+        results["workloads"][name] = run_workload( name, state, buttons, poll, bus )
+    clock.serial.reply = no_reply
+    for workload in SERIAL_WORKLOADS:
+        results["workloads"][workload[0]] = run_serial_workload( workload[0], workload[1:], bus )
+    del clock.serial.reply
+    clock.fm_radio.radio_i2c = bus.i2c
+    clock.menu.state = 0
+    return( results )
+
+results = run()
+print( json.dumps( results ))
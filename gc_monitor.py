@@ -0,0 +1,64 @@
+#
+# Heap allocation and garbage collection statistics for radio_alarm_clock.py
+# This file must be saved on the Pico next to radio_alarm_clock.py
+#
+# begin()/end() around a piece of work (e.g. drawing a frame) record how many
+# heap bytes it allocated. collect() runs the garbage collector at a point the
+# caller chose as idle and records how long the pause was, so collections do
+# not happen at random moments in the middle of a frame or a radio write.
+#
+import gc
+import utime
+
+# Allocation monitor class
+class AllocationMonitor:
+
+    def __init__( self ):
+        self.start = 0
+#
+# Allocation per measured frame
+#
+        self.frames = 0
+        self.alloc_last = 0
+        self.alloc_max = 0
+        self.alloc_total = 0
+        self.collections_in_frame = 0 # automatic collections that interrupted a frame
+#
+# Collections run by collect()
+#
+        self.collections = 0
+        self.pause_last = 0 # us
+        self.pause_max = 0
+
+    def begin( self ):
+        self.start = gc.mem_alloc()
+
+    def end( self ):
+        allocated = gc.mem_alloc() - self.start
+        self.frames += 1
+        if allocated < 0: # the heap shrank, so the collector ran during the frame
+            self.collections_in_frame += 1
+            allocated = 0
+        self.alloc_last = allocated
+        self.alloc_total += allocated
+        if allocated > self.alloc_max:
+            self.alloc_max = allocated
+        return( allocated )
+
+    def collect( self ):
+        start = utime.ticks_us()
+        gc.collect()
+        pause = utime.ticks_diff( utime.ticks_us(), start )
+        self.collections += 1
+        self.pause_last = pause
+        if pause > self.pause_max:
+            self.pause_max = pause
+        return( pause )
+
+#
+# One line summary for the serial console
+#
+    def report( self ):
+        return( "alloc:{}/{}B per frame, {} frames interrupted by gc, gc:{} pause:{}/{}us".format(
+            self.alloc_last, self.alloc_max, self.collections_in_frame,
+            self.collections, self.pause_last, self.pause_max ))
@@ -0,0 +1,228 @@
+#
+# Interrupt safe button events for radio_alarm_clock.py
+# This file must be saved on the Pico next to radio_alarm_clock.py
+#
+# The button interrupts push one byte per event into a preallocated ring
+# buffer and return. Everything else (state changes, radio writes, prints)
+# happens when the main program pops the events, outside interrupt context.
+#
+# Event code layout (one byte):
+#   bits 0-2  button number (1-4)
+#   bit  3    level of the +/- switch when the event happened
+#   bits 4-7  event kind (repeats keep their speed, 0-3, in bits 4-5)
+#
+import machine
+import utime
+
+EVENT_PRESS = 0x00
+EVENT_RELEASE = 0x10
+EVENT_REPEAT = 0x40 # while a button is held (from long_ms on), faster and faster
+
+BUTTON_MASK = 0x07
+SWITCH_BIT = 0x08
+KIND_MASK = 0xF0
+SPEED_MASK = 0x30
+
+def event_code( button, switch_level, kind = EVENT_PRESS ):
+    if switch_level:
+        return( kind | SWITCH_BIT | button )
+    return( kind | button )
+
+def event_button( code ):
+    return( code & BUTTON_MASK )
+
+def event_switch( code ):
+    return(( code & SWITCH_BIT ) >> 3 )
+
+def event_kind( code ):
+    if code & EVENT_REPEAT:
+        return( EVENT_REPEAT )
+    return( code & KIND_MASK )
+
+def event_speed( code ): # 0 (first repeats) to 3 (held for a while), 0 for other kinds
+    if code & EVENT_REPEAT:
+        return(( code & SPEED_MASK ) >> 4 )
+    return( 0 )
+
+# Input queue class
+class InputQueue:
+
+    def __init__( self, size = 32 ):
+#
+# One slot is always left empty so head == tail means "no events".
+# Only interrupts move tail and only the main program moves head.
+#
+        self.codes = bytearray( size )
+        self.size = size
+        self.head = 0
+        self.tail = 0
+#
+# Counters
+#
+        self.pushed = 0
+        self.dropped = 0 # events lost because the queue was full
+        self.depth_max = 0
+
+#
+# Interrupt side: add an event code. No allocation, returns False when full.
+#
+    def push( self, code ):
+        tail = self.tail
+        following = tail + 1
+        if following == self.size:
+            following = 0
+        if following == self.head:
+            self.dropped += 1
+            return( False )
+        self.codes[tail] = code
+        self.tail = following
+        self.pushed += 1
+        depth = following - self.head
+        if depth < 0:
+            depth += self.size
+        if depth > self.depth_max:
+            self.depth_max = depth
+        return( True )
+
+#
+# Main program side: next event code, or -1 when the queue is empty
+#
+    def pop( self ):
+        head = self.head
+        if head == self.tail:
+            return( -1 )
+        code = self.codes[head]
+        head += 1
+        if head == self.size:
+            head = 0
+        self.head = head
+        return( code )
+
+    def pending( self ):
+        depth = self.tail - self.head
+        if depth < 0:
+            depth += self.size
+        return( depth )
+
+#
+# Buttons sampled by a machine.Timer
+#
+# The pin interrupts only start the timer. Every poll_ms it samples the buttons:
+# a level has to stay changed for debounce_ms before it counts, which gives a
+# press or a release event. A button held for long_ms gives the first repeat;
+# the repeats then come repeat_ms apart, repeat_step_ms sooner each time down
+# to repeat_min_ms, and their speed field goes up as they pile up. Once every
+# button is released and steady the timer stops.
+#
+REPEAT_SPEEDS = ( 6, 14, 24 ) # repeats before speed 1, 2 and 3
+
+# Button timer class
+class ButtonTimer:
+
+    def __init__( self, queue, pins, switch, notify, debounce_ms = 15, poll_ms = 5,
+                  long_ms = 400, repeat_ms = 120, repeat_step_ms = 10, repeat_min_ms = 30 ):
+        self.queue = queue
+        self.pins = pins # index = button number, pins[0] is not used
+        self.switch = switch
+        self.notify = notify # called (from the timer interrupt) after events were queued
+        self.debounce_ms = debounce_ms
+        self.poll_ms = poll_ms
+        self.long_ms = long_ms
+        self.repeat_ms = repeat_ms
+        self.repeat_step_ms = repeat_step_ms
+        self.repeat_min_ms = repeat_min_ms
+
+        buttons = len( pins )
+        self.pressed = bytearray( buttons ) # debounced level, 1 = pressed
+        self.settle = [0] * buttons # ms the pin has differed from pressed[]
+        self.held = [0] * buttons # ms since the press was accepted
+        self.next_repeat = [0] * buttons # held[] value of the next repeat
+        self.repeats = [0] * buttons
+        self.timer = machine.Timer()
+        self.poll_callback = self.poll # bound once, so starting the timer does not allocate
+        self.running = False
+        self.first_edge = 0 # ticks_ms of the edge that started the timer
+#
+# Counters
+#
+        self.edges = 0 # button interrupts
+        self.bounces = 0 # level changes that did not last debounce_ms
+        self.polls = 0
+
+#
+# Interrupt side: called for every edge of a button pin
+#
+    def edge( self ):
+        self.edges += 1
+        if not self.running:
+            self.running = True
+            self.first_edge = utime.ticks_ms()
+            self.timer.init( mode = machine.Timer.PERIODIC, period = self.poll_ms,
+                             callback = self.poll_callback )
+
+    def repeat_speed( self, repeats ):
+        speed = 0
+        for limit in REPEAT_SPEEDS:
+            if repeats >= limit:
+                speed += 1
+        return( speed )
+
+#
+# Timer interrupt: sample every button once. No allocation.
+#
+    def poll( self, timer ):
+        self.polls += 1
+        step = self.poll_ms
+        switch_level = self.switch.value()
+        busy = False
+        queued = False
+        for button in range( 1, len( self.pins )):
+            level = 1 - self.pins[button].value() # the buttons pull the pin low
+            if level != self.pressed[button]:
+                busy = True
+                self.settle[button] += step
+                if self.settle[button] < self.debounce_ms:
+                    continue
+                self.settle[button] = 0
+                self.pressed[button] = level
+                if level:
+                    self.held[button] = 0
+                    self.repeats[button] = 0
+                    self.next_repeat[button] = self.long_ms
+                    queued |= self.queue.push( event_code( button, switch_level, EVENT_PRESS ))
+                else:
+                    queued |= self.queue.push( event_code( button, switch_level, EVENT_RELEASE ))
+                continue
+            if self.settle[button]:
+                self.settle[button] = 0
+                self.bounces += 1
+            if not level:
+                continue
+# Held: repeats closer and closer together
+            busy = True
+            held = self.held[button] + step
+            self.held[button] = held
+            if held < self.next_repeat[button]:
+                continue
+            repeats = self.repeats[button]
+            kind = EVENT_REPEAT | ( self.repeat_speed( repeats ) << 4 )
+            queued |= self.queue.push( event_code( button, switch_level, kind ))
+            self.repeats[button] = repeats + 1
+            self.next_repeat[button] = held + max( self.repeat_min_ms,
+                                                   self.repeat_ms - repeats * self.repeat_step_ms )
+        if queued:
+            self.notify()
+        if busy:
+            return
+#
+# Stop, unless a button went down after it was sampled above: its edge found the
+# timer still running and did nothing, so this poll has to keep it going
+#
+        state = machine.disable_irq() # an edge from here on must find the timer stopped
+        for button in range( 1, len( self.pins )):
+            if not self.pins[button].value():
+                busy = True
+        if not busy:
+            self.running = False
+            self.timer.deinit()
+        machine.enable_irq( state )
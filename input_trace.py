@@ -0,0 +1,95 @@
+#
+# Input trace recording for radio_alarm_clock.py
+# This file must be saved on the Pico next to radio_alarm_clock.py
+#
+# While recording, every button event the clock acts on is stored with the time
+# since the start and the clock tick it arrived in. Together with the state the
+# clock was in when recording started, that is enough to play the session back
+# through the state machine (benchmarks/replay.py, on the Pico or on a PC).
+#
+# Trace file layout (little endian):
+#   header: magic "ITR2" | clock seconds (4) | day (2) | weekday (1) | menu state (1) | format (1) |
+#           channel (2) | volume (1) | mute (1) | increment index (1) |
+#           alarm minute of the day (2) | alarm set (1) | snooze minutes (1) | events (2)
+#   event:  ms since the start (4) | tick since the start (2) | event code (1)
+#
+# The event code is the one byte code of input_events.py (button, switch level, kind).
+#
+import struct
+import utime
+
+TRACE_MAGIC = b"ITR2"
+HEADER = "<4sIHBBBHBBBHBBH"
+HEADER_SIZE = struct.calcsize( HEADER )
+EVENT = "<IHB"
+EVENT_SIZE = struct.calcsize( EVENT )
+STATE_FIELDS = 12 # header values between the magic and the event count
+
+# Trace recorder class
+class TraceRecorder:
+
+    def __init__( self, capacity = 512 ):
+        self.capacity = capacity
+        self.events = bytearray( capacity * EVENT_SIZE )
+        self.state = None # tuple of the STATE_FIELDS values at start()
+        self.count = 0
+        self.recording = False
+        self.start_ms = 0
+        self.start_tick = 0
+        self.dropped = 0 # events that did not fit
+
+    def start( self, state, tick ):
+        if len( state ) != STATE_FIELDS:
+            raise ValueError( "trace state needs {} values".format( STATE_FIELDS ))
+        self.state = tuple( state )
+        self.count = 0
+        self.dropped = 0
+        self.start_ms = utime.ticks_ms()
+        self.start_tick = tick
+        self.recording = True
+
+    def stop( self ):
+        self.recording = False
+
+#
+# Store one event (no allocation, returns at once when not recording)
+#
+    def record( self, code, tick ):
+        if not self.recording:
+            return
+        tick -= self.start_tick
+        if self.count == self.capacity or tick > 0xFFFF:
+            self.dropped += 1
+            return
+        struct.pack_into( EVENT, self.events, self.count * EVENT_SIZE,
+                          utime.ticks_diff( utime.ticks_ms(), self.start_ms ), tick, code )
+        self.count += 1
+
+    def save( self, name ):
+        if self.state is None:
+            raise ValueError( "nothing recorded" )
+        with open( name, "wb" ) as f:
+            f.write( struct.pack( HEADER, TRACE_MAGIC, *( self.state + ( self.count, ))))
+            f.write( memoryview( self.events )[0:self.count * EVENT_SIZE] )
+        return( HEADER_SIZE + self.count * EVENT_SIZE )
+
+    def report( self ):
+        return( "trace {} events:{}/{} dropped:{}".format(
+            "on" if self.recording else "off", self.count, self.capacity, self.dropped ))
+
+#
+# Read a trace file: returns ( state tuple, [ ( ms, tick, code ), ... ] )
+#
+def load_trace( name ):
+    with open( name, "rb" ) as f:
+        data = f.read()
+    if len( data ) < HEADER_SIZE:
+        raise ValueError( "not a trace file" )
+    header = struct.unpack_from( HEADER, data, 0 )
+    if header[0] != TRACE_MAGIC:
+        raise ValueError( "not a trace file" )
+    count = header[-1]
+    if len( data ) < HEADER_SIZE + count * EVENT_SIZE:
+        raise ValueError( "trace file is cut short" )
+    events = [ struct.unpack_from( EVENT, data, HEADER_SIZE + i * EVENT_SIZE ) for i in range( count ) ]
+    return( header[1:-1], events )
@@ -0,0 +1,191 @@
+#
+# Second core I/O for radio_alarm_clock.py
+# This file must be saved on the Pico next to radio_alarm_clock.py
+#
+# In dual core mode a loop on core 1 owns the slow buses: it sends frames to the
+# OLED over SPI and runs the radio's write queue, band scan and RDS polling over
+# I2C. Core 0 keeps the tick, the buttons and the menus, so a slow transfer can
+# never hold them up.
+#
+# Frames cross over in a double buffer. submit_frame() copies the rendered frame
+# into the back buffer under the lock. Core 1 swaps it to the front (also under
+# the lock) and flushes it from there while core 0 is free to fill the back
+# buffer again. A frame that core 1 has not picked up yet is simply replaced by
+# the newer one. Radio settings need no copy: Radio.QueueLock makes its write
+# queue safe between the cores.
+#
+# Panel commands (contrast, on/off from the power manager) share the SPI bus and
+# the DC/CS pins with the frames, so they go through the worker too: contrast(),
+# poweron() and poweroff() only note the newest wanted value under the lock and
+# core 1 sends it between two frames. The power manager is handed the worker in
+# place of the panel.
+#
+# Core 1 does not poll. When a pass found nothing to do it blocks on the wake
+# lock until core 0 calls notify(): submit_frame() and the panel commands do
+# that themselves, the clock's radio_task and rds_task do it when settings were
+# queued, a retry or an RDS poll is due (MicroPython's lock has no timeout, so
+# the timing stays with uasyncio on core 0). Core 1 sets changed after a failed
+# write so radio_task can time the retry.
+#
+# on_shown, when set, is called once a frame reached the panel (the power
+# manager measures the wake latency up to there).
+#
+# Without _thread (the host simulation) or with dual_core = False, everything
+# runs on one core: submit_frame() flushes right away and radio_task keeps
+# servicing the bus.
+#
+import utime
+try:
+    import _thread
+except ImportError:
+    _thread = None
+
+# I/O worker class
+class IOWorker:
+
+    def __init__( self, display, radio, frame_size, changed, dual_core = True, scan_poll_ms = 5 ):
+        self.display = display
+        self.radio = radio
+        self.changed = changed # ThreadSafeFlag set when core 1 changed something on screen
+        self.scan_poll_ms = scan_poll_ms
+        self.dual = dual_core and _thread is not None
+        self.running = False
+        self.on_shown = None
+        if self.dual:
+            self.lock = _thread.allocate_lock()
+            self.wake = _thread.allocate_lock() # locked: nothing new for core 1, notify() releases it
+            self.frames = [ bytearray( frame_size ), bytearray( frame_size ) ]
+            self.back = 0 # buffer core 0 fills next, core 1 flushes the other one
+            self.pending = False # a frame waits in the back buffer
+            self.panel_power = -1 # wanted on (1) / off (0), -1 when sent
+            self.panel_contrast = -1 # wanted contrast, -1 when sent
+            radio.QueueLock = _thread.allocate_lock()
+#
+# Counters
+#
+        self.frames_submitted = 0
+        self.frames_sent = 0
+        self.frames_replaced = 0 # submitted again before core 1 took them
+        self.waits = 0 # times core 1 blocked for want of work
+
+    def start( self ):
+        if self.dual and not self.running:
+            self.running = True
+            _thread.start_new_thread( self.run, () )
+
+#
+# Core 0: hand the frame in buffer over to be sent to the panel
+#
+    def submit_frame( self, buffer ):
+        self.frames_submitted += 1
+        if not self.dual:
+            self.display.flush()
+            self.frames_sent += 1
+            if self.on_shown is not None:
+                self.on_shown()
+            return
+        with self.lock:
+            self.frames[self.back][:] = buffer
+            if self.pending:
+                self.frames_replaced += 1
+            self.pending = True
+        self.notify()
+
+#
+# Core 0: wake core 1. A notify() while core 1 is busy is kept: its next wait
+# returns at once and it makes one more pass.
+#
+    def notify( self ):
+        if self.dual and self.wake.locked():
+            self.wake.release()
+
+#
+# Core 0: panel commands (single core: sent right away)
+#
+    def contrast( self, value ):
+        if not self.dual:
+            self.display.oled.contrast( value )
+            return
+        with self.lock:
+            self.panel_contrast = value
+        self.notify()
+
+    def poweron( self ):
+        self.panel( 1 )
+
+    def poweroff( self ):
+        self.panel( 0 )
+
+    def panel( self, on ):
+        if not self.dual:
+            if on:
+                self.display.oled.poweron()
+            else:
+                self.display.oled.poweroff()
+            return
+        with self.lock:
+            self.panel_power = on
+        self.notify()
+
+    def send_panel( self ): # core 1: the panel commands noted since the last pass
+        with self.lock:
+            power = self.panel_power
+            contrast = self.panel_contrast
+            self.panel_power = -1
+            self.panel_contrast = -1
+        oled = self.display.oled
+        if power == 1:
+            oled.poweron()
+        elif power == 0:
+            oled.poweroff()
+        if contrast >= 0:
+            oled.contrast( contrast )
+        return( power >= 0 or contrast >= 0 )
+
+    def take_frame( self ): # core 1: the newest frame, or None
+        with self.lock:
+            if not self.pending:
+                return( None )
+            front = self.back
+            self.back = 1 - front
+            self.pending = False
+        return( self.frames[front] )
+
+#
+# Core 1: frames first, then one radio write and one RDS poll at most per pass
+#
+    def run( self ):
+        radio = self.radio
+        while self.running:
+            commands = self.send_panel()
+            frame = self.take_frame()
+            if frame is not None:
+                self.display.flush( frame )
+                self.frames_sent += 1
+                if self.on_shown is not None:
+                    self.on_shown()
+            online = radio.Online
+            attempts = radio.Attempts
+            if radio.Scanning:
+                if radio.ScanStep() == False or radio.ScanChannel % 10 == 0:
+                    self.changed.set() # progress, or the station line once it is over
+                utime.sleep_ms( self.scan_poll_ms )
+                continue
+            busy = radio.ServiceBus() or frame is not None or commands
+            if radio.RdsWanted() and radio.RdsRemaining() == 0:
+                if radio.PollRds():
+                    self.changed.set()
+            if radio.Online != online or radio.Attempts > attempts:
+                self.changed.set() # shown on screen, and radio_task times the retry
+            if not busy:
+                self.waits += 1
+                self.wake.acquire() # blocks until core 0 calls notify() (at once if it did meanwhile)
+
+    def stop( self ):
+        self.running = False
+        self.notify()
+
+    def report( self ):
+        return( "io {} frames:{} sent:{} replaced:{} waits:{}".format(
+            "dual core" if self.dual else "single core", self.frames_submitted,
+            self.frames_sent, self.frames_replaced, self.waits ))
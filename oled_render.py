@@ -0,0 +1,289 @@
+#
+# Rendering helpers for the SSD1306 OLED used by radio_alarm_clock.py
+# This file must be saved on the Pico next to radio_alarm_clock.py and ssd1306.py
+#
+import micropython
+import framebuf
+
+# SSD1306 addressing commands (same values the ssd1306 driver uses in show())
+SET_COL_ADDR = 0x21
+SET_PAGE_ADDR = 0x22
+
+#
+# Compare one page of two framebuffers and return the first and last column
+# that differ. Returns -1 when the page is unchanged.
+#
+@micropython.native
+def first_difference( new, old, start, end ):
+    i = start
+    while i < end:
+        if new[i] != old[i]:
+            return( i - start )
+        i += 1
+    return( -1 )
+
+@micropython.native
+def last_difference( new, old, start, end ):
+    i = end - 1
+    while i >= start:
+        if new[i] != old[i]:
+            return( i - start )
+        i -= 1
+    return( -1 )
+
+# Dirty-page display class
+class DirtyPageDisplay:
+
+    def __init__( self, oled, width, height ):
+        self.oled = oled
+        self.width = width
+        self.pages = height // 8
+#
+# The ssd1306 driver shifts 64 column panels into the middle of the controller RAM
+#
+        self.column_offset = 32 if width == 64 else 0
+#
+# Copy of the frame that was last transmitted to the panel
+#
+        self.sent = bytearray( self.pages * width )
+        self.sent_valid = False
+#
+# Bus traffic counters (data plus addressing command bytes)
+#
+        self.frames = 0
+        self.bytes_last_frame = 0
+        self.regions_last_frame = 0
+        self.bytes_total = 0
+
+#
+# Force the next flush to send the whole frame (e.g. after the panel was reset)
+#
+    def invalidate( self ):
+        self.sent_valid = False
+
+#
+# Send only the columns of each page that changed since the last flush. buffer
+# defaults to the driver's own; the second core flushes from a copy instead.
+#
+    def flush( self, buffer = None ):
+        if buffer is None:
+            buffer = self.oled.buffer
+        width = self.width
+        frame_bytes = 0
+        regions = 0
+
+        for page in range( self.pages ):
+            start = page * width
+            end = start + width
+            if self.sent_valid:
+                first = first_difference( buffer, self.sent, start, end )
+                if first < 0:
+                    continue
+                last = last_difference( buffer, self.sent, start, end )
+            else:
+                first = 0
+                last = width - 1
+            frame_bytes += self.send_region( page, first, last, buffer )
+            regions += 1
+
+        self.sent_valid = True
+        self.frames += 1
+        self.bytes_last_frame = frame_bytes
+        self.regions_last_frame = regions
+        self.bytes_total += frame_bytes
+        return( frame_bytes )
+
+#
+# Point the controller at one page/column window and stream that slice of the buffer
+#
+    def send_region( self, page, first, last, buffer ):
+        oled = self.oled
+        oled.write_cmd( SET_COL_ADDR )
+        oled.write_cmd( first + self.column_offset )
+        oled.write_cmd( last + self.column_offset )
+        oled.write_cmd( SET_PAGE_ADDR )
+        oled.write_cmd( page )
+        oled.write_cmd( page )
+
+        start = page * self.width + first
+        end = page * self.width + last + 1
+        region = memoryview( buffer )[start:end]
+        oled.write_data( region )
+        self.sent[start:end] = region
+        return( 6 + end - start )
+
+# Screen template cache class
+class TemplateCache:
+
+    def __init__( self, oled, width, height, budget = 4096 ):
+        self.oled = oled
+        self.width = width
+        self.height = height
+        self.layer_size = ( height // 8 ) * width
+#
+# The budget is in bytes of RAM; each cached layer is one full frame (1 KB on 128x64).
+# The layers are allocated here, once; a miss draws into a free one or into the
+# least recently used one, so drawing never allocates a new buffer.
+#
+        self.capacity = max( 1, budget // self.layer_size )
+        self.free = [] # [ buffer, framebuffer, last use ] not holding any layer
+        for i in range( self.capacity ):
+            buffer = bytearray( self.layer_size )
+            self.free.append( [buffer, framebuf.FrameBuffer( buffer, width, height, framebuf.MONO_VLSB ), 0] )
+        self.layers = {} # key -> [ buffer, framebuffer, last use ]
+        self.uses = 0
+#
+# Counters
+#
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+#
+# Copy the static layer for key into the display buffer. On a miss the layer is
+# drawn once with builder( framebuffer, variant ) and kept for the next frames,
+# taking over the least recently used layer when none is free.
+#
+    def draw( self, key, builder, variant = 0 ):
+        entry = self.layers.get( key )
+        if entry is None:
+            self.misses += 1
+            if self.free:
+                entry = self.free.pop()
+            else:
+                entry = self.evict()
+            entry[1].fill( 0 )
+            builder( entry[1], variant )
+            self.layers[key] = entry
+        else:
+            self.hits += 1
+        self.uses += 1
+        entry[2] = self.uses
+#
+# Same result as oled.fill(0) followed by oled.blit(layer, 0, 0), as one memory copy
+#
+        self.oled.buffer[:] = entry[0]
+
+#
+# Remove the least recently used layer and return its entry for reuse
+#
+    def evict( self ):
+        oldest = None
+        for key in self.layers:
+            if oldest is None or self.layers[key][2] < self.layers[oldest][2]:
+                oldest = key
+        entry = self.layers.pop( oldest )
+        self.evictions += 1
+        return( entry )
+
+#
+# Drop every layer (e.g. after the text of a template changed)
+#
+    def clear( self ):
+        for key in self.layers:
+            self.free.append( self.layers[key] )
+        self.layers = {}
+
+    def report( self ):
+        return( "templates:{}/{} hits:{} misses:{} evictions:{}".format(
+            len( self.layers ), self.capacity, self.hits, self.misses, self.evictions ))
+
+#
+# Allocation free text: numbers are written as character codes into preallocated
+# bytearrays and drawn with GlyphText, so a frame creates no new string objects.
+#
+def put_number( buffer, position, value, digits ): # zero padded, returns the next position
+    end = position + digits
+    i = end - 1
+    while i >= position:
+        buffer[i] = 0x30 + value % 10
+        value //= 10
+        i -= 1
+    return( end )
+
+def put_int( buffer, position, value ): # no padding, like "%d" (0-999)
+    if value >= 100:
+        return( put_number( buffer, position, value, 3 ))
+    if value >= 10:
+        return( put_number( buffer, position, value, 2 ))
+    return( put_number( buffer, position, value, 1 ))
+
+def put_bytes( buffer, position, characters ): # characters is a bytes constant
+    for i in range( len( characters )):
+        buffer[position + i] = characters[i]
+    return( position + len( characters ))
+
+# Glyph text class
+class GlyphText:
+
+    def __init__( self, target, characters = " 0123456789:.-AMPSV" ):
+        self.target = target
+#
+# One 8x8 framebuffer per character, drawn once with the built in font.
+# Characters without a glyph are skipped.
+#
+        self.glyphs = [None] * 128
+        for character in characters:
+            layer = framebuf.FrameBuffer( bytearray( 8 ), 8, 8, framebuf.MONO_VLSB )
+            layer.text( character, 0, 0 )
+            self.glyphs[ord( character )] = layer
+
+#
+# Same pixels as target.text() for the first length codes of buffer.
+# Key 0 keeps the background, like text() does.
+#
+    def text( self, buffer, length, x, y ):
+        target = self.target
+        glyphs = self.glyphs
+        for i in range( length ):
+            glyph = glyphs[buffer[i] & 0x7F]
+            if glyph is not None:
+                target.blit( glyph, x, y, 0 )
+            x += 8
+
+    def char( self, code, x, y ):
+        glyph = self.glyphs[code & 0x7F]
+        if glyph is not None:
+            self.target.blit( glyph, x, y, 0 )
+
+#
+# Scrolling text line (e.g. RDS RadioText). Text that fits the width is drawn as it
+# is; longer text moves step pixels to the left on every advance() and starts over
+# after gap blank characters. Drawing clips at the screen edges, like text() does.
+#
+PRINTABLE_ASCII = "".join( [ chr( code ) for code in range( 0x20, 0x7F ) ] )
+
+# Marquee class
+class Marquee:
+
+    def __init__( self, glyphs, width = 128, step = 2, gap = 4 ):
+        self.glyphs = glyphs # a GlyphText with every character the text may hold
+        self.columns = width // 8
+        self.step = step
+        self.gap = gap
+        self.offset = 0 # pixels scrolled
+
+    def scrolling( self, length ):
+        return( length > self.columns )
+
+    def advance( self, length ):
+        if not self.scrolling( length ):
+            self.offset = 0
+            return
+        self.offset = ( self.offset + self.step ) % (( length + self.gap ) * 8 )
+
+    def draw( self, buffer, length, y ):
+        if not self.scrolling( length ):
+            self.glyphs.text( buffer, length, 0, y )
+            return
+        period = length + self.gap
+        offset = self.offset % ( period * 8 ) # the text may have got shorter
+        index = offset // 8
+        x = -( offset % 8 )
+        for i in range( self.columns + 1 ):
+            if index < length:
+                self.glyphs.char( buffer[index], x, y )
+            index += 1
+            if index == period:
+                index = 0
+            x += 8
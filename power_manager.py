@@ -0,0 +1,129 @@
+#
+# Low power idle mode for radio_alarm_clock.py
+# This file must be saved on the Pico next to radio_alarm_clock.py
+#
+# After dim_ms without a button press the display contrast drops, after off_ms
+# the panel is switched off (its memory keeps the picture, so switching it back
+# on shows it at once). Between ticks the clock can wait in machine.lightsleep
+# instead of the uasyncio loop when nothing else has work; the button
+# interrupts wake it.
+#
+# oled is the panel, or anything with contrast(), poweron() and poweroff(): in
+# dual core mode the clock passes its I/O worker, which sends them from core 1.
+#
+# The manager also keeps what it takes to report how much of the time the
+# Pico was awake (the duty cycle) and how long it took from the first button
+# edge until the panel showed a fresh frame again.
+#
+import machine
+import utime
+
+DISPLAY_ON = 0
+DISPLAY_DIM = 1
+DISPLAY_OFF = 2
+DISPLAY_NAMES = ( "on", "dim", "off" )
+
+# Power manager class
+class PowerManager:
+
+    def __init__( self, oled, dim_ms = 30000, off_ms = 120000, contrast = 0xFF,
+                  dim_contrast = 0x01, lightsleep = True ):
+        self.oled = oled
+        self.dim_ms = dim_ms
+        self.off_ms = off_ms
+        self.contrast = contrast
+        self.dim_contrast = dim_contrast
+        self.lightsleep = lightsleep
+        self.display = DISPLAY_ON
+        self.last_activity = utime.ticks_ms()
+        self.woken = 0 # ticks_ms of the edge that woke the panel, 0 when no wake is pending
+        oled.contrast( contrast )
+#
+# Counters
+#
+        self.started = utime.ticks_ms()
+        self.sleep_ms = 0 # time spent in lightsleep
+        self.sleeps = 0
+        self.wakes = 0 # presses that only woke the panel
+        self.wake_ms = 0 # edge to fresh frame, last wake
+        self.wake_max_ms = 0
+
+#
+# A button was pressed (since = ticks_ms of its first edge). Returns True when the
+# panel was off, in which case the press should only wake it.
+#
+    def activity( self, since ):
+        self.last_activity = utime.ticks_ms()
+        if self.display == DISPLAY_ON:
+            return( False )
+        was_off = self.display == DISPLAY_OFF
+        if was_off:
+            self.oled.poweron()
+            self.woken = since
+            self.wakes += 1
+        self.oled.contrast( self.contrast )
+        self.display = DISPLAY_ON
+        return( was_off )
+
+#
+# Called once the frame after a wake reached the panel (by the I/O worker, from
+# core 1 in dual core mode)
+#
+    def shown( self ):
+        if self.woken == 0:
+            return
+        self.wake_ms = utime.ticks_diff( utime.ticks_ms(), self.woken )
+        if self.wake_ms > self.wake_max_ms:
+            self.wake_max_ms = self.wake_ms
+        self.woken = 0
+
+#
+# Called every tick: dim and then switch the panel off once the buttons were left
+# alone long enough. keep_on holds it at full contrast (e.g. while the alarm rings).
+#
+    def update( self, keep_on = False ):
+        if keep_on:
+            self.activity( utime.ticks_ms() )
+            return
+        idle = utime.ticks_diff( utime.ticks_ms(), self.last_activity )
+        if self.display == DISPLAY_ON and idle >= self.dim_ms:
+            self.oled.contrast( self.dim_contrast )
+            self.display = DISPLAY_DIM
+        if self.display == DISPLAY_DIM and idle >= self.off_ms:
+            self.oled.poweroff()
+            self.display = DISPLAY_OFF
+
+    def blank( self ): # nothing drawn is visible, rendering can wait for the wake
+        return( self.display == DISPLAY_OFF )
+
+    def idle( self ): # dimmed or off: nobody has looked for a while, animations can stop
+        return( self.display != DISPLAY_ON )
+
+#
+# Wait ms in lightsleep. Only call it when no task has work before then: the
+# uasyncio loop does not run until a button interrupt or the time ends the sleep.
+#
+    def sleep( self, ms ):
+        if ms <= 0:
+            return
+        start = utime.ticks_ms()
+        machine.lightsleep( ms )
+        self.sleep_ms += utime.ticks_diff( utime.ticks_ms(), start )
+        self.sleeps += 1
+
+    def duty_cycle( self ): # percent of the time awake since start or reset()
+        total = utime.ticks_diff( utime.ticks_ms(), self.started )
+        if total <= 0:
+            return( 100 )
+        return( 100 - 100 * self.sleep_ms // total )
+
+    def reset( self ):
+        self.started = utime.ticks_ms()
+        self.sleep_ms = 0
+        self.sleeps = 0
+        self.wake_max_ms = 0
+
+    def report( self ):
+        return( "power display:{} duty:{}% sleeps:{} slept:{}ms wakes:{} wake:{}ms max:{}ms".format(
+            DISPLAY_NAMES[self.display], self.duty_cycle(), self.sleeps, self.sleep_ms,
+            self.wakes, self.wake_ms, self.wake_max_ms ))
@@ -0,0 +1,94 @@
+#
+# Hot path timing for radio_alarm_clock.py
+# This file must be saved on the Pico next to radio_alarm_clock.py
+#
+# Each channel (tick, render, SPI flush, I2C write) keeps the last few timings
+# in a ring buffer. begin() returns 0 and end() returns straight away while
+# profiling is off, so the instrumented code costs two short calls per use.
+#
+import utime
+from array import array
+
+PROFILE_TICK = 0
+PROFILE_RENDER = 1
+PROFILE_FLUSH = 2
+PROFILE_I2C = 3
+PROFILE_NAMES = ( "tick", "render", "flush", "i2c" )
+
+# Profiler class
+class Profiler:
+
+    def __init__( self, size = 32, enabled = False ):
+        self.enabled = enabled
+        self.size = size
+        channels = len( PROFILE_NAMES )
+        self.samples = [ array( 'L', [0] * size ) for i in range( channels ) ] # us
+        self.next = bytearray( channels ) # ring position per channel
+        self.counts = [0] * channels # samples recorded since reset()
+        self.max = [0] * channels
+
+    def reset( self ):
+        for channel in range( len( PROFILE_NAMES )):
+            self.next[channel] = 0
+            self.counts[channel] = 0
+            self.max[channel] = 0
+
+#
+# start = profiler.begin() ... profiler.end( PROFILE_RENDER, start )
+#
+    def begin( self ):
+        if self.enabled:
+            return( utime.ticks_us() )
+        return( 0 )
+
+    def end( self, channel, start ):
+        if not self.enabled or start == 0:
+            return
+        self.record( channel, utime.ticks_diff( utime.ticks_us(), start ))
+
+    def record( self, channel, us ):
+        position = self.next[channel]
+        self.samples[channel][position] = us
+        position += 1
+        if position == self.size:
+            position = 0
+        self.next[channel] = position
+        self.counts[channel] += 1
+        if us > self.max[channel]:
+            self.max[channel] = us
+
+#
+# Statistics over the samples in the ring
+#
+    def filled( self, channel ):
+        return( min( self.counts[channel], self.size ))
+
+    def last( self, channel ):
+        if self.counts[channel] == 0:
+            return( 0 )
+        return( self.samples[channel][( self.next[channel] - 1 ) % self.size] )
+
+    def mean( self, channel ):
+        filled = self.filled( channel )
+        if filled == 0:
+            return( 0 )
+        samples = self.samples[channel]
+        total = 0
+        for i in range( filled ):
+            total += samples[i]
+        return( total // filled )
+
+#
+# Print everything to the serial console, oldest sample first
+#
+    def dump( self, counters = () ):
+        print( "profile {}".format( "on" if self.enabled else "off" ))
+        for channel in range( len( PROFILE_NAMES )):
+            filled = self.filled( channel )
+            first = ( self.next[channel] - filled ) % self.size
+            values = [ self.samples[channel][( first + i ) % self.size] for i in range( filled ) ]
+            print( "{} n:{} mean:{}us max:{}us last:{}".format(
+                PROFILE_NAMES[channel], self.counts[channel], self.mean( channel ),
+                self.max[channel], values ))
+        for name, value in counters:
+            print( "{}: {}".format( name, value ))
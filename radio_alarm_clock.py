@@ -1,10 +1,38 @@
 from machine import Pin, SPI, I2C # SPI is a class associated with the machine library. 
 import machine
+import micropython
 import utime
+import struct
+import sys
+try:
+    import uasyncio as asyncio # event driven runtime, see the bottom of this file
+except ImportError:
+    import asyncio
 
 # The below specified libraries have to be included. Also, ssd1306.py must be saved on the Pico. 
 from ssd1306 import SSD1306_SPI # this is the driver library and the corresponding class
-import framebuf # this is another library for the display. 
+
+# The below project module must also be saved on the Pico. 
+from oled_render import DirtyPageDisplay, TemplateCache # sends only the changed parts of a frame, caches static screen parts
+from oled_render import GlyphText, put_number, put_int, put_bytes # numbers drawn without creating strings
+from oled_render import Marquee, PRINTABLE_ASCII # scrolling RDS text
+from gc_monitor import AllocationMonitor # heap use per frame and garbage collection pauses
+from profiler import Profiler, PROFILE_TICK, PROFILE_RENDER, PROFILE_FLUSH, PROFILE_I2C # hot path timings
+from settings_store import SettingsStore # settings kept in flash across power cycles
+from tick_scheduler import TickScheduler # keeps the one second tick free of drift
+from input_events import InputQueue, ButtonTimer, event_button, event_switch # button events queued by a timer
+from input_events import event_kind, event_speed, EVENT_PRESS, EVENT_RELEASE, EVENT_REPEAT
+from state_machine import StateMachine # menu states, button actions and screens as tables
+from alarm_scheduler import AlarmScheduler, KIND_SNOOZE # all alarms, ordered by when they fire next
+from alarm_scheduler import EVERY_DAY, WEEKDAYS, WEEKEND
+from serial_commands import SerialCommands # line commands on the USB serial console
+from io_worker import IOWorker # display and radio bus work on the second core
+from power_manager import PowerManager # display dimming, lightsleep between ticks
+from rds_decoder import RdsDecoder # station name and RadioText
+from volume_ramp import VolumeRamp, RAMP_LINEAR # alarm fade in
+from input_trace import TraceRecorder # button events recorded for replay
+
+micropython.alloc_emergency_exception_buf(100) # lets errors inside interrupt handlers be reported
     
 # Define columns and rows of the oled display. These numbers are the standard values. 
 SCREEN_WIDTH = 128 #number of columns
@@ -33,25 +61,138 @@ oled_spi = SPI( SPI_DEVICE, baudrate= 100000, sck= spi_sck, mosi= spi_sda )
 #
 oled = SSD1306_SPI( SCREEN_WIDTH, SCREEN_HEIGHT, oled_spi, spi_dc, spi_res, spi_cs, True )
 
-radio_frequency = 107.3
+#
+# Keeps the last transmitted frame so each flush only sends the pages/columns that changed
+# display.bytes_last_frame holds the number of SPI bytes the last flush cost
+#
+display = DirtyPageDisplay( oled, SCREEN_WIDTH, SCREEN_HEIGHT )
+
+#
+# Static parts of the screens (titles, button labels) are drawn once into cached
+# framebuffers and copied in as a whole; only the changing fields are drawn per frame.
+# There are 18 layers: 11 screens, some with a variant per switch level, alarm set
+# or mute (see the screen_layer() calls). The cache holds all of them (1 KB each,
+# allocated at start up), so moving around the menus never draws a layer twice.
+# With a smaller TEMPLATE_LAYERS the least recently used layer is redrawn instead.
+# Set USE_TEMPLATES to False to draw every string on every frame instead.
+#
+USE_TEMPLATES = True
+TEMPLATE_LAYERS = 18
+templates = TemplateCache( oled, SCREEN_WIDTH, SCREEN_HEIGHT, TEMPLATE_LAYERS * SCREEN_WIDTH * SCREEN_HEIGHT // 8 )
+
+#
+# The changing fields (time, volume/station, counters) are written as character codes
+# into these buffers and drawn glyph by glyph, so drawing a frame allocates nothing
+# and the garbage collector only runs where gc_idle() calls it.
+# Set ALLOC_FREE_RENDER to False to format the fields as strings instead.
+#
+ALLOC_FREE_RENDER = True
+glyphs = GlyphText( oled )
+time_chars = bytearray( 8 ) # "hh:mm AM"
+info_chars = bytearray( 12 ) # "V:vv S:fff.f"
+number_chars = bytearray( 3 ) # increment and snooze minutes
+text_glyphs = GlyphText( oled, PRINTABLE_ASCII ) # RDS text can hold any of them
+marquee = Marquee( text_glyphs ) # station name and RadioText under the clock
+alloc_monitor = AllocationMonitor()
+
+#
+# Timings of the last 32 ticks, frames, flushes and radio writes. Off until the hidden
+# diagnostics screen is opened (Format menu, button 4), then shown there and printed
+# to the serial console with button 3.
+#
+profiler = Profiler( 32 )
+
+radio_channel = 203 # 107.3 MHz (channel = ( MHz - 87.0 ) * 10, 100 kHz steps)
 radio_volume = 0
 mute_status = True
 
+#
+# Fields that can be requested from Radio.GetStatus()
+#
+STATUS_TUNING = 0x01 # frequency and stereo (register 0x0A)
+STATUS_SIGNAL = 0x02 # signal strength (register 0x0B, read together with 0x0A)
+STATUS_MUTE = 0x04 # register 0x02
+STATUS_VOLUME = 0x08 # register 0x05
+STATUS_ALL = 0x0F
+
+#
+# Radio I2C transaction settings
+#
+RADIO_QUEUE_SIZE = 4 # pending register images waiting for the bus
+RADIO_RETRY_BUDGET = 5 # failed attempts before the radio is reported offline
+RADIO_BACKOFF_MIN = 20 # ms to wait after the first failure, doubled on each retry
+RADIO_BACKOFF_MAX = 2000 # ms between attempts while the radio is offline
+
+#
+# Tuning works on whole channels. CHANNEL_TABLE holds the two bytes of register 03h
+# (channel number and TUNE bit) for every valid channel, so tuning is a table copy.
+#
+CHANNEL_MIN = 10 # 88.0 MHz
+CHANNEL_MAX = 210 # 108.0 MHz
+CHANNEL_TABLE = bytearray( 2 * ( CHANNEL_MAX - CHANNEL_MIN + 1 ))
+for channel in range( CHANNEL_MIN, CHANNEL_MAX + 1 ):
+    CHANNEL_TABLE[2 * ( channel - CHANNEL_MIN )] = ( channel >> 2 ) & 0xFF
+    CHANNEL_TABLE[2 * ( channel - CHANNEL_MIN ) + 1] = (( channel & 0x03 ) << 6 ) | 0x10 # TUNE
+
+def channel_tenths( channel ): # frequency in tenths of MHz, e.g. 203 -> 1073
+    return( 870 + channel )
+
+#
+# Radio power: with RADIO_POWER_SAVE the chip is powered down (ENABLE cleared) while
+# it is muted, and unmuting powers it up and tunes again
+#
+RADIO_POWER_SAVE = True
+
+#
+# Band scan settings
+#
+RDS_GROUP_MS = 88 # nominal time between RDS groups (104 bits at 1187.5 bit/s)
+RDS_POLL_MIN = 20 # ms, bounds for the RDS poll interval
+RDS_POLL_MAX = 100
+RDS_IDLE_MS = 1000 # how often rds_task looks again while RDS is off
+
+SCAN_FIRST_CHANNEL = CHANNEL_MIN
+SCAN_CHANNELS = CHANNEL_MAX - CHANNEL_MIN + 1 # 88.0 to 108.0 MHz in 0.1 MHz steps
+SCAN_STRONG_RSSI = 25 # weakest signal kept as a station
+SCAN_TUNE_TIMEOUT = 100 # ms to wait for tune complete before giving up on a channel
+SCAN_POLL_MS = 5 # ms between scan steps, leaves the rest of the time to the clock
+SCAN_STEREO = 0x80 # station index byte: stereo flag, RSSI in the low 7 bits
+SCAN_NONE = 0xFF # next/previous table entry when no station was found
+
+# radio status Class (one instance per radio, updated in place)
+class RadioStatus:
+
+    def __init__( self ):
+        self.Mute = True
+        self.Volume = 0
+        self.Frequency = 0.0
+        self.Channel = 0
+        self.Stereo = False
+        self.Rssi = 0
+#
+# Fields holds the STATUS_* bits read by the last transaction, Timestamp its utime.ticks_ms()
+#
+        self.Fields = 0
+        self.Timestamp = 0
+
 # radio Class       
 class Radio:
     
-    def __init__( self, NewFrequency, NewVolume, NewMute ):
+    def __init__( self, NewChannel, NewVolume, NewMute ):
 #
 # set the initial values of the radio
 #
+        self.Rds = RdsDecoder()
+        self.RdsStale = False # the decoder is reset by the next PollRds()
         self.Volume = radio_volume
-        self.Frequency = radio_frequency
+        self.Channel = radio_channel
         self.Mute = mute_status
+        self.PowerSave = RADIO_POWER_SAVE
 #
 # Update the values with the ones passed in the initialization code
 #
         self.SetVolume( NewVolume )
-        self.SetFrequency( NewFrequency )
+        self.SetChannel( NewChannel )
         self.SetMute( NewMute )    
       
 # Initialize I/O pins associated with the radio's I2C interface
@@ -66,9 +207,81 @@ class Radio:
         self.i2c_device = 1 
         self.i2c_device_address = 0x10
 #
+# Second address of the chip that allows reading any single register
+#
+        self.i2c_register_address = 0x11
+#
 # Array used to configure the radio
 #
         self.Settings = bytearray( 8 )
+#
+# Shadow copy of the bytes last written to the radio. A write that would send
+# the same bytes again is skipped.
+#
+        self.Shadow = bytearray( 8 )
+        self.ShadowValid = False
+        self.UpdateDepth = 0
+        self.WritesIssued = 0
+        self.WritesSkipped = 0
+#
+# Buffers for status reads. Sequential reads start at register 0x0A, so 2 bytes
+# give the tuning status and 4 bytes add the signal strength.
+#
+        self.Status = RadioStatus()
+        self.StatusBuffer = bytearray( 4 )
+        self.TuningBuffer = memoryview( self.StatusBuffer )[0:2]
+        self.RegisterBuffer = bytearray( 2 )
+        self.StatusReads = 0
+        self.StatusCacheHits = 0
+#
+# Queue of register images waiting to be written. ProgramRadio() only queues,
+# ServiceBus() (called from the main loop) does the I2C work one attempt at a time.
+#
+        self.WriteQueue = [ bytearray( 8 ) for i in range( RADIO_QUEUE_SIZE ) ]
+        self.QueueHead = 0
+        self.QueueCount = 0
+        self.QueueLock = None # a _thread lock in dual core mode
+        self.TxBuffer = bytearray( 8 )
+        self.Online = True
+        self.Attempts = 0
+        self.NextAttempt = 0
+        self.WritesCoalesced = 0
+        self.Retries = 0
+        self.ErrorCounts = {} # OSError errno -> number of times seen
+#
+# Band scan. ScanStep() does at most one I2C transaction per call, so the scan runs
+# in small pieces between the other tasks. StationIndex keeps the RSSI and stereo
+# flag of every channel, and StationNext/StationPrev hold for every channel the
+# index of the next/previous strong station, so jumping to one is a table lookup.
+#
+        self.Scanning = False
+        self.ScanChannel = 0 # index 0 = 88.0 MHz
+        self.ScanWaiting = False # tune started, waiting for STC
+        self.ScanTunedAt = 0
+        self.ScanImage = bytearray( 4 ) # registers 02h and 03h used while scanning
+        self.StationIndex = bytearray( SCAN_CHANNELS )
+        self.StationNext = bytearray( SCAN_CHANNELS )
+        self.StationPrev = bytearray( SCAN_CHANNELS )
+        for Index in range( SCAN_CHANNELS ):
+            self.StationNext[Index] = SCAN_NONE
+            self.StationPrev[Index] = SCAN_NONE
+        self.StationCount = 0
+        self.Scans = 0
+#
+# RDS. PollRds() reads registers 0Ah-0Fh (ready flag, block error levels and the
+# four blocks) in one transaction and hands a new group to the decoder. The poll
+# interval follows half the measured time between groups, so none is missed
+# and the bus is not read much more often than that. RdsVisible is cleared by
+# the clock while the panel is off: nothing shows the text then, so it is not
+# polled either.
+#
+        self.RdsVisible = True
+        self.RdsBuffer = bytearray( 12 )
+        self.RdsGroupMs = RDS_GROUP_MS
+        self.RdsPollMs = RDS_GROUP_MS // 2
+        self.RdsLastGroup = 0
+        self.RdsNextPoll = 0
+        self.RdsPolls = 0
         self.radio_i2c = I2C( self.i2c_device, scl=self.i2c_scl, sda=self.i2c_sda, freq=200000)
         self.ProgramRadio()
 
@@ -92,24 +305,27 @@ class Radio:
         self.Volume = NewVolume
         return( True )
 
-    def SetFrequency( self, NewFrequency ):
+    def SetChannel( self, NewChannel ):
+        if ( not isinstance( NewChannel, int )):
+            return( False )
+        if (( NewChannel < CHANNEL_MIN ) or ( NewChannel > CHANNEL_MAX )):
+            return( False )
+        if ( NewChannel != self.Channel ):
+            self.RdsStale = True
+        self.Channel = NewChannel
+        return( True )
+
 #
-# Convert the string into a floating point value
+# Frequency in MHz as a number or string (e.g. from the serial console), rounded to
+# the nearest channel
 #
+    def SetFrequency( self, NewFrequency ):
         try:
-            NewFrequency = float( NewFrequency )  
+            NewChannel = int( float( NewFrequency ) * 10 + 0.5 ) - 870 # inf and nan raise here
         except:
             return( False )
-#
-# validate the type and range check the frequency
-#
-        if ( not ( isinstance( NewFrequency, float ))):
-            return( False )
-        if (( NewFrequency < 88.0 ) or ( NewFrequency > 108.0 )):
-            return( False )
-        self.Frequency = NewFrequency
-        return True
-        
+        return( self.SetChannel( NewChannel ))
+
     def SetMute( self, NewMute ):
         try:
             self.Mute = bool( int( NewMute ))  
@@ -117,103 +333,499 @@ class Radio:
             return( False )
         
         return( True )
-#
-# convert the frequency to 10 bit value for the radio chip
-#
-    def ComputeChannelSetting( self, Frequency ):
-        Frequency = int( Frequency * 10 ) - 870
-        ByteCode = bytearray( 2 )
-#
-# split the 10 bits into 2 bytes
-#
-        ByteCode[0] = ( Frequency >> 2 ) & 0xFF
-        ByteCode[1] = (( Frequency & 0x03 ) << 6 ) & 0xC0
-        return( ByteCode )
+
 #
 # Configure the settings array with the mute, frequency and volume settings
 #
+    def UpdateSettings( self ):
         if ( self.Mute ):
             self.Settings[0] = 0x80
         else:
             self.Settings[0] = 0xC0
-        self.Settings[1] = 0x09 | 0x04
-        self.Settings[2:3] = self.ComputeChannelSetting( self.Frequency )
-        self.Settings[3] = self.Settings[3] | 0x10
+        if ( self.Mute and self.PowerSave ):
+            self.Settings[1] = 0x08 | 0x04 # ENABLE clear: the chip powers down, unmuting tunes again
+        else:
+            self.Settings[1] = 0x09 | 0x04
+        Offset = 2 * ( self.Channel - CHANNEL_MIN )
+        self.Settings[2] = CHANNEL_TABLE[Offset]
+        self.Settings[3] = CHANNEL_TABLE[Offset + 1]
         self.Settings[4] = 0x04
         self.Settings[5] = 0x00
         self.Settings[6] = 0x84
         self.Settings[7] = 0x80 + self.Volume
+#
+# Group several Set* calls into a single write. ProgramRadio() calls made between
+# BeginUpdate() and CommitUpdate() are deferred, and the commit writes once.
+#
+    def BeginUpdate( self ):
+        State = self.LockQueue()
+        self.UpdateDepth += 1
+        self.UnlockQueue( State )
+
+    def CommitUpdate( self ):
+        State = self.LockQueue()
+        if ( self.UpdateDepth > 0 ):
+            self.UpdateDepth -= 1
+        Depth = self.UpdateDepth
+        self.UnlockQueue( State )
+        if ( Depth == 0 ):
+            self.ProgramRadio()
 #        
-# Update the settings array and transmit it to the radio
+# Update the settings array and queue it for the radio. Nothing here touches the
+# I2C bus; the queue is shared with ServiceBus(), which may run on the other core.
+# Both cores call this (core 1 when a scan ends), so Settings, Shadow and
+# UpdateDepth only change under the queue lock.
 #
     def ProgramRadio( self ):        
-        try:
+        State = self.LockQueue()
+        if ( self.UpdateDepth == 0 ):
             self.UpdateSettings()
-            self.radio_i2c.writeto(self.i2c_device_address, self.Settings)
-        except OSError as e:
-            print("Error")
-            self.ProgramRadio()
+            self.QueueSettings()
+        self.UnlockQueue( State )
 
+    def QueueSettings( self ):
 #
-# Extract the settings from the radio registers
+# Nothing changed since the last queued (or written) image, leave the I2C bus alone
 #
-    def GetSettings( self ):
-#        
-# Need to read the entire register space. This is allow access to the mute and volume settings
-# After and address of 255 the 
+        if ( self.QueueCount > 0 ):
+            Newest = self.WriteQueue[( self.QueueHead + self.QueueCount - 1 ) % RADIO_QUEUE_SIZE]
+            if ( self.Settings == Newest ):
+                self.WritesSkipped += 1
+                return
+        elif ( self.ShadowValid and ( self.Settings == self.Shadow )):
+            self.WritesSkipped += 1
+            return
+#
+# Every image holds the complete settings, so when the queue is full the newest
+# pending image can simply be replaced
 #
-        self.RadioStatus = self.radio_i2c.readfrom( self.i2c_device_address, 256 )
+        if ( self.QueueCount == RADIO_QUEUE_SIZE ):
+            Slot = ( self.QueueHead + self.QueueCount - 1 ) % RADIO_QUEUE_SIZE
+            self.WritesCoalesced += 1
+        else:
+            Slot = ( self.QueueHead + self.QueueCount ) % RADIO_QUEUE_SIZE
+            self.QueueCount += 1
+        self.WriteQueue[Slot][:] = self.Settings
+
+#
+# The write queue is guarded by disabling interrupts, or by QueueLock when the
+# I/O worker services the bus from the second core (interrupts are per core)
+#
+    def LockQueue( self ):
+        if ( self.QueueLock is None ):
+            return( machine.disable_irq() )
+        self.QueueLock.acquire()
+        return( 0 )
 
-        if (( self.RadioStatus[0xF0] & 0x40 ) != 0x00 ):
-            MuteStatus = False
+    def UnlockQueue( self, State ):
+        if ( self.QueueLock is None ):
+            machine.enable_irq( State )
         else:
-            MuteStatus = True
-            
-        VolumeStatus = self.RadioStatus[0xF7] & 0x0F
+            self.QueueLock.release()
+
+#
+# Make at most one write attempt for the oldest queued image. Returns right away
+# while backing off after a failure, so the clock never waits on a broken bus.
+#
+    def ServiceBus( self ):
+        if ( self.QueueCount == 0 ):
+            return( False )
+        Now = utime.ticks_ms()
+        if (( self.Attempts > 0 ) and ( utime.ticks_diff( self.NextAttempt, Now ) > 0 )):
+            return( False )
+
+        IrqState = self.LockQueue()
+        self.TxBuffer[:] = self.WriteQueue[self.QueueHead]
+        self.UnlockQueue( IrqState )
+
+        Start = profiler.begin()
+        try:
+            self.radio_i2c.writeto(self.i2c_device_address, self.TxBuffer)
+        except OSError as e:
+            profiler.end( PROFILE_I2C, Start )
+            self.RecordError( e )
+            self.Attempts += 1
+            self.Retries += 1
+            if ( self.Attempts >= RADIO_RETRY_BUDGET ):
+#
+# Out of retries: report the radio offline and keep only the newest image,
+# which is retried at the slow rate until the radio answers again
+#
+                if ( self.Online ):
+                    print("Radio offline")
+                self.Online = False
+                IrqState = self.LockQueue()
+                self.QueueHead = ( self.QueueHead + self.QueueCount - 1 ) % RADIO_QUEUE_SIZE
+                self.QueueCount = 1
+                self.UnlockQueue( IrqState )
+                Backoff = RADIO_BACKOFF_MAX
+            else:
+                Backoff = min( RADIO_BACKOFF_MIN << ( self.Attempts - 1 ), RADIO_BACKOFF_MAX )
+            self.NextAttempt = utime.ticks_add( Now, Backoff )
+            return( False )
+        profiler.end( PROFILE_I2C, Start )
+
+        self.WritesIssued += 1
+        self.Attempts = 0
+        if ( not self.Online ):
+            print("Radio online")
+        self.Online = True
+
+        IrqState = self.LockQueue()
+        self.Shadow[:] = self.TxBuffer
+        self.ShadowValid = True
+        self.QueueHead = ( self.QueueHead + 1 ) % RADIO_QUEUE_SIZE
+        self.QueueCount -= 1
+        self.UnlockQueue( IrqState )
+        return( True )
+
+#
+# Count failed transactions per error number (e.g. 5 = EIO, 110 = ETIMEDOUT)
+#
+    def RecordError( self, Error ):
+        if ( len( Error.args ) > 0 ):
+            Code = Error.args[0]
+        else:
+            Code = 0
+        self.ErrorCounts[Code] = self.ErrorCounts.get( Code, 0 ) + 1
+
+#
+# Read only the registers needed for the requested STATUS_* fields.
+# With MaxAge (ms) a status read within that time is reused instead of touching the bus.
+# The same RadioStatus object is returned every time.
+#
+    def GetStatus( self, Fields = STATUS_ALL, MaxAge = 0 ):
+        Status = self.Status
+        Now = utime.ticks_ms()
+        if (( MaxAge > 0 ) and (( Status.Fields & Fields ) == Fields ) and
+            ( utime.ticks_diff( Now, Status.Timestamp ) <= MaxAge )):
+            self.StatusCacheHits += 1
+            return( Status )
+
+#
+# A failed read leaves the old values in place and marks them as not current
+#
+        try:
+            self.ReadStatus( Status, Fields )
+        except OSError as e:
+            self.RecordError( e )
+            Status.Fields = 0
+            return( Status )
+
+        self.StatusReads += 1
+        Status.Timestamp = Now
+        return( Status )
+
+    def ReadStatus( self, Status, Fields ):
+        if ( Fields & STATUS_SIGNAL ):
+            self.radio_i2c.readfrom_into( self.i2c_device_address, self.StatusBuffer )
+            Status.Rssi = self.StatusBuffer[2] >> 1
+        elif ( Fields & STATUS_TUNING ):
+            self.radio_i2c.readfrom_into( self.i2c_device_address, self.TuningBuffer )
  
  #
  # Convert the frequency 10 bit count into actual frequency in Mhz
  #
-        FrequencyStatus = (( self.RadioStatus[0x00] & 0x03 ) << 8 ) | ( self.RadioStatus[0x01] & 0xFF )
-        FrequencyStatus = ( FrequencyStatus * 0.1 ) + 87.0
-        
-        if (( self.RadioStatus[0x00] & 0x04 ) != 0x00 ):
-            StereoStatus = True
+        if ( Fields & ( STATUS_TUNING | STATUS_SIGNAL )):
+            Status.Channel = (( self.StatusBuffer[0] & 0x03 ) << 8 ) | ( self.StatusBuffer[1] & 0xFF )
+            Status.Frequency = channel_tenths( Status.Channel ) / 10
+            Status.Stereo = (( self.StatusBuffer[0] & 0x04 ) != 0x00 )
+            Fields |= STATUS_TUNING
+
+        if ( Fields & STATUS_MUTE ):
+            self.radio_i2c.readfrom_mem_into( self.i2c_register_address, 0x02, self.RegisterBuffer )
+            Status.Mute = (( self.RegisterBuffer[0] & 0x40 ) == 0x00 )
+
+        if ( Fields & STATUS_VOLUME ):
+            self.radio_i2c.readfrom_mem_into( self.i2c_register_address, 0x05, self.RegisterBuffer )
+            Status.Volume = self.RegisterBuffer[1] & 0x0F
+
+        Status.Fields = Fields
+
+#
+# RDS polling: one 12 byte read per call, at most one group decoded.
+# Returns True when the station name or RadioText changed. Only the core that
+# polls touches the decoder: a new channel or a scan just sets RdsStale and the
+# old text is dropped here.
+#
+    def RdsWanted( self ): # the chip is playing a station and the text can be seen
+        return(( not self.Mute ) and self.Online and ( not self.Scanning ) and self.RdsVisible )
+
+    def RdsRemaining( self ): # ms until the next poll is due
+        return( max( 0, utime.ticks_diff( self.RdsNextPoll, utime.ticks_ms() )))
+
+    def PollRds( self ):
+        Changed = False
+        if ( self.RdsStale ):
+            self.RdsStale = False
+            self.Rds.reset()
+            Changed = True
+        Now = utime.ticks_ms()
+        self.RdsNextPoll = utime.ticks_add( Now, self.RdsPollMs )
+        try:
+            self.radio_i2c.readfrom_into( self.i2c_device_address, self.RdsBuffer )
+        except OSError as e:
+            self.RecordError( e )
+            return( Changed )
+        self.RdsPolls += 1
+        Buffer = self.RdsBuffer
+        if (( Buffer[0] & 0x90 ) != 0x90 ): # RDSR (new group) and RDSS (decoder in sync)
+            return( Changed )
+#
+# Measure the group rate; long gaps (after a pause or lost sync) are left out
+#
+        Gap = utime.ticks_diff( Now, self.RdsLastGroup )
+        self.RdsLastGroup = Now
+        if ( Gap < 4 * RDS_GROUP_MS ):
+            self.RdsGroupMs = ( 3 * self.RdsGroupMs + Gap ) // 4
+            self.RdsPollMs = min( max( self.RdsGroupMs // 2, RDS_POLL_MIN ), RDS_POLL_MAX )
+        if ( self.Rds.feed(( Buffer[4] << 8 ) | Buffer[5], ( Buffer[6] << 8 ) | Buffer[7],
+                           ( Buffer[8] << 8 ) | Buffer[9], ( Buffer[10] << 8 ) | Buffer[11],
+                           ( Buffer[3] >> 2 ) & 0x03, Buffer[3] & 0x03 )):
+            Changed = True
+        return( Changed )
+
+#
+# Start scanning the band. The radio is muted while it steps through the channels
+# and goes back to the selected station when the scan is done or stopped.
+#
+    def StartScan( self ):
+        if ( self.Scanning ): # already running (a held button asks again and again)
+            return
+        self.RdsStale = True
+        self.Scanning = True
+        self.ScanChannel = 0
+        self.ScanWaiting = False
+
+    def StopScan( self ):
+        if ( self.Scanning ):
+            self.Scanning = False
+            State = self.LockQueue()
+            self.ShadowValid = False # the chip is tuned to a scan channel
+            self.UnlockQueue( State )
+            self.ProgramRadio()
+
+#
+# One scan step: either start tuning the next channel or check whether the tune
+# finished and record its signal. Returns False once the scan is over.
+#
+    def ScanStep( self ):
+        if ( not self.Scanning ):
+            return( False )
+        Now = utime.ticks_ms()
+        if ( not self.ScanWaiting ):
+            Channel = SCAN_FIRST_CHANNEL + self.ScanChannel
+            State = self.LockQueue()
+            self.ScanImage[0] = self.Settings[0] & ~0x40 # muted
+            self.ScanImage[1] = self.Settings[1] | 0x01 # powered up even when muted
+            self.UnlockQueue( State )
+            self.ScanImage[2] = ( Channel >> 2 ) & 0xFF
+            self.ScanImage[3] = (( Channel & 0x03 ) << 6 ) | 0x10 # TUNE
+            try:
+                self.radio_i2c.writeto( self.i2c_device_address, self.ScanImage )
+            except OSError as e:
+                self.RecordError( e )
+                return( True )
+            State = self.LockQueue()
+            self.Shadow[0:4] = self.ScanImage
+            self.UnlockQueue( State )
+            self.ScanWaiting = True
+            self.ScanTunedAt = Now
+            return( True )
+
+        try:
+            self.radio_i2c.readfrom_into( self.i2c_device_address, self.StatusBuffer )
+        except OSError as e:
+            self.RecordError( e )
+            return( True )
+        if ( self.StatusBuffer[0] & 0x40 ): # STC: tune complete
+            Signal = ( self.StatusBuffer[2] >> 1 ) & 0x7F
+            if ( self.StatusBuffer[0] & 0x04 ): # ST: stereo
+                Signal |= SCAN_STEREO
+            self.StationIndex[self.ScanChannel] = Signal
+        elif ( utime.ticks_diff( Now, self.ScanTunedAt ) < SCAN_TUNE_TIMEOUT ):
+            return( True )
         else:
-            StereoStatus = False
-        
-        return( MuteStatus, VolumeStatus, FrequencyStatus, StereoStatus )
+            self.StationIndex[self.ScanChannel] = 0
+        self.ScanWaiting = False
+        self.ScanChannel += 1
+        if ( self.ScanChannel < SCAN_CHANNELS ):
+            return( True )
+
+        self.BuildStationTables()
+        self.Scans += 1
+        self.StopScan()
+        return( False )
+
+#
+# A strong station is a channel at or above SCAN_STRONG_RSSI that is not weaker than
+# its neighbours (the signal of a station also shows up on the channels next to it).
+#
+    def IsStation( self, Index ):
+        Rssi = self.StationIndex[Index] & 0x7F
+        if ( Rssi < SCAN_STRONG_RSSI ):
+            return( False )
+        if (( Index > 0 ) and (( self.StationIndex[Index - 1] & 0x7F ) > Rssi )):
+            return( False )
+        if (( Index < SCAN_CHANNELS - 1 ) and (( self.StationIndex[Index + 1] & 0x7F ) >= Rssi )):
+            return( False )
+        return( True )
+
+    def BuildStationTables( self ):
+        First = SCAN_NONE
+        Last = SCAN_NONE
+        Count = 0
+        for Index in range( SCAN_CHANNELS ):
+            if ( self.IsStation( Index )):
+                if ( First == SCAN_NONE ):
+                    First = Index
+                Last = Index
+                Count += 1
+        self.StationCount = Count
+#
+# Walk down for the next table and up for the previous one, wrapping around the band
+#
+        Next = First
+        for Index in range( SCAN_CHANNELS - 1, -1, -1 ):
+            self.StationNext[Index] = Next
+            if ( Count and self.IsStation( Index )):
+                Next = Index
+        Previous = Last
+        for Index in range( SCAN_CHANNELS ):
+            self.StationPrev[Index] = Previous
+            if ( Count and self.IsStation( Index )):
+                Previous = Index
+
+#
+# Channel of the next strong station above (Up) or below the given one, -1 when
+# the band has not been scanned or no station was found
+#
+    def NextStation( self, Channel, Up ):
+        Index = min( max( Channel - SCAN_FIRST_CHANNEL, 0 ), SCAN_CHANNELS - 1 )
+        if ( Up ):
+            Station = self.StationNext[Index]
+        else:
+            Station = self.StationPrev[Index]
+        if ( Station == SCAN_NONE ):
+            return( -1 )
+        return( Station + SCAN_FIRST_CHANNEL )
+
+#
+# Extract the settings from the radio registers
+# Kept for callers that want the old ( mute, volume, frequency, stereo ) tuple
+#
+    def GetSettings( self ):
+        Status = self.GetStatus( STATUS_TUNING | STATUS_MUTE | STATUS_VOLUME )
+        return( Status.Mute, Status.Volume, Status.Frequency, Status.Stereo )
 
 # Custom variables
-hour = 11
-minute = 22 
-second = 50
-period = 'AM'  # set to 'AM' or 'PM'
+#
+# The time of day is one integer, seconds since midnight (0 - 86399). Ticks, button
+# changes, snooze and the alarm check are plain integer arithmetic on it; hours,
+# minutes and AM/PM are only worked out when a frame is drawn, in the selected format.
+#
+SECONDS_PER_DAY = 86400
+clock_seconds = 11*3600 + 22*60 + 50 # 11:22:50 AM
+clock_day = 0 # days since the clock was started (alarms use day * 86400 + clock_seconds)
 
-format = 12 # set to 12 or 24
+format = 12 # set to 12 or 24 (display only)
 
 increment = 1 # factor for our plus/minus in time and alarm states
 increment_pointer = 0 # rolling pointer for below array
 incremenet_list = [1, 2, 5, 10, 30] # possible values that can be assigned to increment
 
 alarm_set = False # alarm starts off
-alarm_hour = hour 
-alarm_minute = minute
-alarm_period = period
+alarm_seconds = clock_seconds - clock_seconds % 60 # alarm time of day, whole minutes
+
+#
+# Every alarm (the one set in the Alarm menu, snoozes, weekly alarms) lives in the
+# scheduler. primary_alarm is the id of the alarm the Alarm menu adds and edits.
+#
+alarms = AlarmScheduler(0) # day 0 is a Monday
+primary_alarm = -1
 snooze_minute = 5 # default snooze time (configurable)
 
+#
+# The alarm fades in: it unmutes at ALARM_RAMP_START and ramp_task raises the volume
+# one level at a time up to ALARM_RAMP_TARGET, one radio write per level. The ramp
+# never takes longer than ALARM_RAMP_MAX_MS, whatever ALARM_RAMP_MS is set to.
+#
+ALARM_RAMP_START = 1
+ALARM_RAMP_TARGET = 15
+ALARM_RAMP_MS = 30000
+ALARM_RAMP_MAX_MS = 120000
+alarm_ramp = VolumeRamp(ALARM_RAMP_START, ALARM_RAMP_TARGET, ALARM_RAMP_MS, RAMP_LINEAR, ALARM_RAMP_MAX_MS)
+
+#
+# Settings kept in flash: station (tenths of MHz), volume, flags, alarm (minute of the
+# day), snooze minutes and the weekday. They are loaded here, before the radio is set
+# up, and saved by settings_task a few seconds after the last button press. The time
+# itself is not kept; the Pico has no battery backed clock, so after a restart the
+# clock starts on the weekday it was on at the last save.
+#
+SETTINGS_VERSION = 2
+SETTINGS_FORMAT = "<HBBHBB"
+SETTING_MUTE = 0x01
+SETTING_24_HOUR = 0x02
+SETTING_ALARM = 0x04
+settings_store = SettingsStore( SETTINGS_VERSION, struct.calcsize( SETTINGS_FORMAT ))
+
+def pack_settings():
+    flags = 0
+    if mute_status == True:
+        flags |= SETTING_MUTE
+    if format == 24:
+        flags |= SETTING_24_HOUR
+    if alarm_set == True:
+        flags |= SETTING_ALARM
+    return( struct.pack( SETTINGS_FORMAT, channel_tenths( radio_channel ), radio_volume,
+                         flags, alarm_seconds // 60, snooze_minute, alarms.weekday( clock_day )))
+
+def apply_settings( payload ): # values out of range keep their defaults
+    global radio_channel
+    global radio_volume
+    global mute_status
+    global format
+    global alarm_seconds
+    global alarm_set
+    global primary_alarm
+    global snooze_minute
+    tenths, volume, flags, alarm_minute, snooze, weekday = struct.unpack( SETTINGS_FORMAT, payload )
+    if channel_tenths( CHANNEL_MIN ) <= tenths <= channel_tenths( CHANNEL_MAX ):
+        radio_channel = tenths - 870
+    if volume <= 15:
+        radio_volume = volume
+    mute_status = ( flags & SETTING_MUTE ) != 0
+    if flags & SETTING_24_HOUR:
+        format = 24
+    else:
+        format = 12
+    if alarm_minute < 24 * 60:
+        alarm_seconds = alarm_minute * 60
+    if 1 <= snooze <= 60:
+        snooze_minute = snooze
+    if weekday < 7:
+        alarms.start_weekday = ( weekday - clock_day ) % 7
+    if flags & SETTING_ALARM: # from the next minute on, so a restart does not set it off
+        primary_alarm = alarms.add_once( alarm_seconds, clock_day * SECONDS_PER_DAY + clock_seconds + 60 )
+        alarm_set = True
+
+saved_settings = settings_store.load()
+if saved_settings is not None:
+    apply_settings( saved_settings )
 
 #
 # initialize the FM radio (Also from ECE 299 Lab 3)
 #
-fm_radio = Radio( radio_frequency, radio_volume, mute_status )
+fm_radio = Radio( radio_channel, radio_volume, mute_status )
 
-state = 0
+# menu states (see the state table further down, menu.state holds the current one)
 # 0 = default (shows clock - change volume/radio freq)
 # 1 = format (pick 12 or 24 hours)
 # 2 = time (change hour, minute and (pm/am))
 # 3 = alarm (add, remove or edit alarm)
 # 4 = radio (station, sound, mute)
+# 5 = alarm ringing
 
 # Assign inputs and switches
 
@@ -224,33 +836,29 @@ button_4 = machine.Pin(5, machine.Pin.IN, machine.Pin.PULL_UP) # rightmost butto
 
 switch = machine.Pin(15, machine.Pin.IN, machine.Pin.PULL_DOWN)
 
-button_1_pressed = False # default state for button is unpressed
-button_2_pressed = False
-button_3_pressed = False
-button_4_pressed = False
-
 # Common functions
-def change_format(): # changes hours if format is changed
-    global format
-    global period
-    global hour
-    if	format == 12:
-        format = 24
-        if period == 'PM':
-            hour += 12
-    else:
-        format = 12
-        if hour > 12:
-            hour -=12
-    print(format)
-
-def alarm_set_notification(): # top right indicator for alarm being set
-    global alarm_set
-    if alarm_set == False:
+def alarm_set_notification(): # top right indicator for alarm being set (or snoozing)
+    if alarms.pending() == 0:
         oled.text("( )", 104, 0);
     else:
         oled.text("(A)", 104, 0);
         
+def radio_info_text(x, y): # volume/station line, or a notice while the radio does not answer
+    tenths = channel_tenths(radio_channel)
+    if fm_radio.Online == False:
+        oled.text("Radio offline", x, y);
+    elif ALLOC_FREE_RENDER:
+        position = put_bytes(info_chars, 0, b"V:")
+        position = put_number(info_chars, position, radio_volume, 2)
+        position = put_bytes(info_chars, position, b" S:")
+        position = put_number(info_chars, position, tenths // 10, 3)
+        info_chars[position] = 0x2E # "."
+        put_number(info_chars, position + 1, tenths % 10, 1)
+        glyphs.text(info_chars, 12, x, y)
+    else:
+        formatted_info = "V:{:02} S:{:03}.{}".format(radio_volume, tenths // 10, tenths % 10)
+        oled.text(formatted_info, x, y);
+
 def increment_function(): # how our increment function works
     global increment
     global increment_pointer
@@ -258,486 +866,1015 @@ def increment_function(): # how our increment function works
     increment = incremenet_list[increment_pointer % 5] # % 5 for rolling counter
             
 
-def button_1_handler(pin): # functions of button 1
-    global button_1_pressed
-    global state
-    global acounter
+# Button actions (one function per menu entry, wired up in the state table below)
+def clock_now(): # absolute time used by the alarm scheduler
+    return(clock_day * SECONDS_PER_DAY + clock_seconds)
+
+def update_alarm_set(): # the Alarm menu alarm can be gone after it fired once
     global alarm_set
+    global primary_alarm
+    if alarms.get(primary_alarm) is None:
+        primary_alarm = -1
+        alarm_set = False
+    else:
+        alarm_set = True
+
+def confirm_alarm(): # alarm - Add/Edit
+    global primary_alarm
+    if alarms.get(primary_alarm) is None:
+        primary_alarm = alarms.add_once(alarm_seconds, clock_now())
+    else:
+        alarms.edit(primary_alarm, alarm_seconds, clock_now())
+    update_alarm_set()
+
+def stop_alarm(): # silence the radio after the alarm
     global radio_volume
     global mute_status
-    if not button_1_pressed:
-        print("Button 1")
-        button_1_pressed = True
-        
-        if state == 0: # main menu
-            state = 1
-        
-        elif state == 1: # time format - Back
-            state = 0
-            
-        elif state == 2: # change time - Back
-            state = 0
-            
-        elif state == 3: # alarm - Back
-            state = 0
-            
-        elif state == 32: # alarm - Add/Edit
-            state = 0
-            alarm_set = True
-            
-        elif state == 33: # alarm - Snooze
-            state = 3
-            
-        elif state == 4: # radio - Back
-            state = 0
-        
-        elif state == 42: # radio - Station
-            state = 4
-        
-        elif state == 43: # radio - Vol
-            state = 4
-        elif state == 5: # alarm - accept
-            radio_volume = 0
-            if ( fm_radio.SetVolume( radio_volume ) == True ):
-                fm_radio.ProgramRadio()
-            mute_status = True
-            if ( fm_radio.SetMute( mute_status ) == True ):
-                fm_radio.ProgramRadio()
-            alarm_set = False
-            state = 0
-        
-            
-def button_2_handler(pin): # functions of button 2
-    global button_2_pressed
-    global state
+    alarm_ramp.cancel()
+    fm_radio.BeginUpdate()
+    radio_volume = 0
+    if ( fm_radio.SetVolume( radio_volume ) == True ):
+        fm_radio.ProgramRadio()
+    mute_status = True
+    if ( fm_radio.SetMute( mute_status ) == True ):
+        fm_radio.ProgramRadio()
+    fm_radio.CommitUpdate()
+
+def accept_alarm(): # alarm - accept
+    stop_alarm()
+    alarms.delete_kind(KIND_SNOOZE)
+    update_alarm_set()
+
+def snooze_alarm(): # alarm - snooze (a separate one time alarm, the alarm itself is not changed)
+    stop_alarm()
+    alarms.add_snooze(clock_now() + snooze_minute*60)
+    update_alarm_set()
+
+def delete_alarm(): # alarm - delete
+    alarms.delete(primary_alarm)
+    alarms.delete_kind(KIND_SNOOZE)
+    update_alarm_set()
+
+def select_12_hour(): # time format - change to 24 to 12 hour format
     global format
-    global hour
-    global period
-    global radio_frequency
-    global radio_volume
-    global mute_status
+    format = 12
+
+def select_24_hour(): # time format - change to from 12 to 24 hour format
+    global format
+    format = 24
+
+def open_diagnostics(): # time format - button 4 (not labelled, opens the diagnostics screen)
+    profiler.enabled = True
+
+def toggle_profiling(): # diagnostics
+    profiler.enabled = not profiler.enabled
+
+def dump_diagnostics(): # diagnostics - everything to the serial console
+    profiler.dump(diagnostics_counters())
+    print(tick_scheduler.report())
+    print(alarms.report())
+    print(alloc_monitor.report())
+    print(templates.report())
+    print(settings_store.report())
+    print(alarm_ramp.report())
+    print(power.report())
+    print(io_worker.report())
+    print(fm_radio.Rds.report())
+    print(serial.report())
+    print(trace.report())
+
+def reset_diagnostics(): # diagnostics
+    profiler.reset()
+    power.reset()
+
+def add_hours(seconds): # +/- increment hours, wrapping around midnight
+    if switch_level == False:
+        return((seconds + 3600*increment) % SECONDS_PER_DAY)
+    return((seconds - 3600*increment) % SECONDS_PER_DAY)
+
+def add_minutes(seconds): # +/- increment minutes, wrapping within the hour
+    minutes = (seconds // 60) % 60
+    if switch_level == False:
+        changed = (minutes + increment) % 60
+    else:
+        changed = (minutes - increment) % 60
+    return(seconds + (changed - minutes)*60)
+
+def set_clock(seconds): # new time of day; alarms are scheduled again from it
+    global clock_seconds
+    before = clock_now()
+    clock_seconds = seconds
+    alarms.reschedule(clock_now(), clock_now() - before)
+
+def change_hour(): # change time
+    set_clock(add_hours(clock_seconds))
+
+def change_minute(): # change time
+    set_clock(add_minutes(clock_seconds))
+
+def change_alarm_hour(): # alarm
+    global alarm_seconds
+    alarm_seconds = add_hours(alarm_seconds)
+
+def change_alarm_minute(): # alarm
+    global alarm_seconds
+    alarm_seconds = add_minutes(alarm_seconds)
+
+def snooze_up(): # alarm
     global snooze_minute
-    global alarm_hour
-    global alarm_period
-    global alarm_minute
+    snooze_minute = (snooze_minute + (1*increment))
+    if snooze_minute > 60:
+        snooze_minute -=60
+
+def snooze_down(): # alarm
     global snooze_minute
-    if not button_2_pressed:
-        print("Button 2")
-        button_2_pressed = True
-                
-        if state == 0: # main menu
-            state = 2
-        
-        elif state == 1: # time format - change to 24 to 12 hour format
-            if format == 24:
-                format = 12
-                if hour > 12:
-                    period = 'PM'
-                    hour -=12
-                else:
-                    period = 'AM'
-                    
-                if alarm_hour > 12:
-                    alarm_period = 'PM'
-                    alarm_hour -= 12
-                else:
-                    alarm_period = 'AM'
-                    
-                if hour == 0:
-                    hour = 12
-                if alarm_hour == 0:
-                    alarm_hour = 12
-            state = 0
-            
-        elif state == 2: # change time
-            if format == 24:
-                if switch.value() == False:
-                    hour = (hour + 1*increment) % 24
-                elif switch.value() == True:
-                    hour = (hour - 1*increment) % 24
-            else:
-                if	switch.value() == False:  # Increase time
-                    previous_hour = hour
-                    hour = (hour + 1*increment)
-
-                    if	previous_hour < 12 and hour >= 12:
-                        if	period == 'AM':
-                            period = 'PM'
-                        else:
-                            period = 'AM'
-                    if	hour > 12:
-                        hour -= 12
-                elif	switch.value() == True:  # Decrease time
-                    previous_hour = hour
-                    hour = (hour - 1*increment)
-
-                    if	(previous_hour > 1 and hour <= 0) or (previous_hour >= 12 and hour <= 11):
-                        if	period == 'AM':
-                            period = 'PM'
-                        else:
-                            period = 'AM'
-                    if	hour < 1:
-                        hour += 12
-                
-        elif state == 3: # alarm
-            state = 32
-            
-        elif state == 32: # alarm
-            if format == 24:
-                if switch.value() == False:
-                    alarm_hour = (alarm_hour + 1*increment) % 24
-                elif switch.value() == True:
-                    alarm_hour = (alarm_hour - 1*increment) % 24
+    snooze_minute = (snooze_minute - (1*increment))
+    if snooze_minute < 1:
+        snooze_minute += 60
+
+def tune(channel): # tune to a channel, clamped to the band
+    global radio_channel
+    channel = min(max(channel, CHANNEL_MIN), CHANNEL_MAX)
+    if ( fm_radio.SetChannel( channel ) == True ):
+        radio_channel = channel
+        fm_radio.ProgramRadio()
+
+def frequency_up(): # increase radio frequency (switch on -: next station found by the scan)
+    if switch_level == True:
+        station = fm_radio.NextStation( radio_channel, True )
+        if station < 0:
+            fm_radio.StartScan()
+        else:
+            tune(station)
+    else:
+        tune(radio_channel + increment)
+
+def frequency_down(): # decrease radio frequency (switch on -: previous station found by the scan)
+    if switch_level == True:
+        station = fm_radio.NextStation( radio_channel, False )
+        if station < 0:
+            fm_radio.StartScan()
+        else:
+            tune(station)
+    else:
+        tune(radio_channel - increment)
+
+def station_option(): # radio station - button 4: increment, or scan the band with the switch on -
+    if switch_level == True:
+        fm_radio.StartScan()
+    else:
+        increment_function()
+
+def volume_up(): # increase radio volume
+    global radio_volume
+    radio_volume = (radio_volume + (1*increment)) % 16
+
+    if ( fm_radio.SetVolume( radio_volume ) == True ):
+        fm_radio.ProgramRadio()
+
+def volume_down(): # decrease radio volume
+    global radio_volume
+    radio_volume = (radio_volume - (1*increment)) % 16
+
+    if ( fm_radio.SetVolume( radio_volume ) == True ):
+        fm_radio.ProgramRadio()
+
+def toggle_mute(): # radio
+    global mute_status
+    if mute_status == True:
+        mute_status = False
+    else:
+        mute_status = True
+
+    if ( fm_radio.SetMute( mute_status ) == True ):
+        fm_radio.ProgramRadio()
+
+# Screens, one function per state
+# contains the relevant information for said state
+#
+# Each screen is split in a static layer (title, labels; drawn once into a cached
+# framebuffer by the templates object) and the fields that change, drawn on top.
+# The *_layer functions draw into whatever framebuffer they are given.
+#
+def screen_layer(state, builder, variant = 0): # clears the buffer to the static part of a screen
+    if USE_TEMPLATES:
+        templates.draw(state * 4 + variant, builder, variant)
+    else:
+        oled.fill(0)
+        builder(oled, variant)
+
+def clock_text(seconds, y): # hh:mm of a time of day in the selected format, centred
+    h = seconds // 3600
+    m = (seconds // 60) % 60
+    if format == 12:
+        pm = h >= 12
+        h = h % 12
+        if h == 0:
+            h = 12
+    if ALLOC_FREE_RENDER:
+        put_number(time_chars, 0, h, 2)
+        time_chars[2] = 0x3A # ":"
+        put_number(time_chars, 3, m, 2)
+        if format == 12:
+            if pm:
+                put_bytes(time_chars, 5, b" PM")
             else:
-                if	switch.value() == False:  # Increase time
-                    previous_alarm_hour = alarm_hour
-                    alarm_hour = (alarm_hour + 1*increment)
-
-                    if	previous_alarm_hour < 12 and alarm_hour >= 12:
-                        if	alarm_period == 'AM':
-                            alarm_period = 'PM'
-                        else:
-                            alarm_period = 'AM'
-                    if	alarm_hour > 12:
-                        alarm_hour -= 12
-                elif	switch.value() == True:  # Decrease time
-                    previous_alarm_hour = alarm_hour
-                    alarm_hour = (alarm_hour - 1*increment)
-
-                    if	(previous_alarm_hour > 1 and alarm_hour <= 0) \
-                       or (previous_alarm_hour >= 12 and alarm_hour <= 11):
-                        if	alarm_period == 'AM':
-                            alarm_period = 'PM'
-                        else:
-                            alarm_period = 'AM'
-                    if	alarm_hour < 1:
-                        alarm_hour += 12
-                
-        elif state == 33: # alarm
-            snooze_minute = (snooze_minute + (1*increment))
-            if snooze_minute > 60:
-                snooze_minute -=60
-            
-        elif state == 4: # radio
-            state = 42
-        
-        elif state == 42: # increase radio frequency
-            radio_frequency = radio_frequency + (0.1*increment)
+                put_bytes(time_chars, 5, b" AM")
+            glyphs.text(time_chars, 8, 32, y)
+        elif format == 24:
+            glyphs.text(time_chars, 5, 44, y)
+    elif format == 12:
+        if pm:
+            formatted_time = "{:02}:{:02} PM".format(h, m)
+        else:
+            formatted_time = "{:02}:{:02} AM".format(h, m)
+        oled.text(formatted_time, 32, y);
+    elif format == 24:
+        formatted_time = "{:02}:{:02}".format(h, m)
+        oled.text(formatted_time, 44, y);
 
-            if ( fm_radio.SetFrequency( radio_frequency ) == True ):
-                fm_radio.ProgramRadio()
-                
-        elif state == 43: # increase radio volume
-            radio_volume = (radio_volume + (1*increment)) % 16
+def number_text(label, value, y): # "label<value>" at the left margin, e.g. "[4] Inc:5"
+    if ALLOC_FREE_RENDER:
+        oled.text(label, 12, y)
+        glyphs.text(number_chars, put_int(number_chars, 0, value), 12 + 8 * len(label), y)
+    else:
+        oled.text(label + "%d" %value, 12, y)
 
-            if ( fm_radio.SetVolume( radio_volume ) == True ):
-                fm_radio.ProgramRadio()
-                
-        elif state == 5: # alarm - snooze
-            radio_volume = 0
-            if ( fm_radio.SetVolume( radio_volume ) == True ):
-                fm_radio.ProgramRadio()
-            mute_status = True
-            if ( fm_radio.SetMute( mute_status ) == True ):
-                fm_radio.ProgramRadio()
-            alarm_minute += snooze_minute
-            if alarm_minute > 59:
-                alarm_hour += 1
-                alarm_minute -= 60
-            state = 0
-
-def button_3_handler(pin): # functions of button 3
-    global button_3_pressed
-    global state
+def plus_minus_text(fb, level): # +/- labels follow the switch
+    if level == False:
+        fb.text("[2] +Hour ", 12, 38);
+        fb.text("[3] +Min ", 12, 46);
+    elif level == True:
+        fb.text("[2] -Hour ", 12, 38);
+        fb.text("[3] -Min ", 12, 46);
+
+def main_layer(fb, variant):
+    fb.text("PST", 104, 16)
+    fb.text("[F] [T] [A] [R]", 4, 50);
+
+def render_main(): # 0 = default (shows clock - change volume/radio freq)
+    screen_layer(0, main_layer)
+    clock_text(clock_seconds, 16)
+    alarm_set_notification()
+    radio_info_text(12, 34)
+    if mute_status == False and fm_radio.Rds.length > 0:
+        marquee.draw(fm_radio.Rds.text, fm_radio.Rds.length, 42)
+
+def format_layer(fb, variant):
+    fb.text("Change Format", 12, 0);
+    fb.text("[1] Back ", 12, 30);
+    fb.text("[2] 12 ", 12, 38);
+    fb.text("[3] 24 ", 12, 46);
+    fb.text("[4] N/A ", 12, 54);
+
+def render_format(): # 1 = format (pick 12 or 24 hours)
+    screen_layer(1, format_layer)
+
+def time_layer(fb, variant): # variant = switch level
+    fb.text("Change Time", 12, 0);
+    fb.text("[1] Back ", 12, 30);
+    plus_minus_text(fb, variant)
+
+def render_time(): # 2 = time (change hour, minute and (pm/am))
+    screen_layer(2, time_layer, switch.value())
+    clock_text(clock_seconds, 16)
+    number_text("[4] Inc:", increment, 54)
+
+def alarm_menu_layer(fb, variant): # variant = 1 when an alarm is set
+    fb.text("Alarm Menu", 12, 0);
+    fb.text("[1] Back ", 12, 30);
+    if(variant == 1):
+        fb.text("[2] Edit Alarm", 12, 38);
+    else:
+        fb.text("[2] Add Alarm", 12, 38);
+    fb.text("[3] Snooze ", 12, 46);
+    fb.text("[4] Delete ", 12, 54);
+
+def render_alarm_menu(): # 3 = alarm (add, remove or edit alarm)
+    if(alarm_set == True):
+        screen_layer(3, alarm_menu_layer, 1)
+    else:
+        screen_layer(3, alarm_menu_layer, 0)
+    clock_text(alarm_seconds, 16)
+
+def alarm_edit_layer(fb, variant): # variant = 2 when an alarm is set, + switch level
+    if(variant >= 2):
+        fb.text("Edit Alarm", 12, 0);
+    else:
+        fb.text("Add Alarm", 12, 0);
+    fb.text("[1] Confirm ", 12, 30);
+    plus_minus_text(fb, variant & 1)
+
+def render_alarm_edit(): # 32 = add/edit the alarm time
+    if(alarm_set == True):
+        screen_layer(32, alarm_edit_layer, 2 + switch.value())
+    else:
+        screen_layer(32, alarm_edit_layer, switch.value())
+    clock_text(alarm_seconds, 16)
+    number_text("[4] Inc:", increment, 54)
+
+def snooze_layer(fb, variant):
+    fb.text("Edit Snooze", 12, 0);
+    fb.text("[1] Back ", 12, 30);
+    fb.text("[2] +Min ", 12, 38);
+    fb.text("[3] -Min ", 12, 46);
+
+def render_snooze(): # 33 = snooze length
+    screen_layer(33, snooze_layer)
+    number_text("Time: ", snooze_minute, 16)
+    number_text("[4] Inc:", increment, 54)
+
+def radio_layer(fb, variant): # variant = 1 while muted
+    fb.text("Radio Menu", 12, 0);
+    fb.text("[1] Back ", 12, 30);
+    fb.text("[2] Station ", 12, 38);
+    fb.text("[3] Sound ", 12, 46);
+    if(variant == 1):
+        fb.text("[4] Unmute ", 12, 54);
+    else:
+        fb.text("[4] Mute ", 12, 54);
+
+def render_radio(): # 4 = radio (station, sound, mute)
+    if(mute_status == True):
+        screen_layer(4, radio_layer, 1)
+    else:
+        screen_layer(4, radio_layer, 0)
+    radio_info_text(12, 16)
+
+def station_layer(fb, variant): # variant = switch level
+    fb.text("Radio Station", 12, 0);
+    fb.text("[1] Back ", 12, 30);
+    if variant == False:
+        fb.text("[2] +Freq ", 12, 38);
+        fb.text("[3] -Freq ", 12, 46);
+    else:
+        fb.text("[2] Next Stn ", 12, 38);
+        fb.text("[3] Prev Stn ", 12, 46);
+        fb.text("[4] Scan ", 12, 54);
+
+def render_station(): # 42 = radio station
+    screen_layer(42, station_layer, switch.value())
+    if fm_radio.Scanning:
+        length = put_int(number_chars, 0, fm_radio.ScanChannel * 100 // SCAN_CHANNELS)
+        oled.text("Scanning", 12, 16) # "Scanning  42%", the number right aligned
+        glyphs.text(number_chars, length, 12 + 8 * (12 - length), 16)
+        oled.text("%", 12 + 8 * 12, 16)
+    else:
+        radio_info_text(12, 16)
+    if switch.value() == False:
+        number_text("[4] Inc:", increment, 54)
+
+def sound_layer(fb, variant):
+    fb.text("Radio Sound", 12, 0);
+    fb.text("[1] Back ", 12, 30);
+    fb.text("[2] +Vol ", 12, 38);
+    fb.text("[3] -Vol ", 12, 46);
+
+def render_sound(): # 43 = radio volume
+    screen_layer(43, sound_layer)
+    radio_info_text(12, 16)
+    number_text("[4] Inc:", increment, 54)
+
+def alarm_layer(fb, variant):
+    fb.text("PST", 104, 16)
+    fb.text("ALARM", 48, 32);
+    fb.text("[1] Accept ", 12, 46);
+
+def render_alarm(): # 5 = screen once alarm is triggered
+    screen_layer(5, alarm_layer)
+    clock_text(clock_seconds, 16)
+    number_text("[2] Snooze:", snooze_minute, 54)
+def diagnostics_counters(): # ( name, value ) pairs for the diagnostics screen and dump
+    return(( ("irq", button_timer.edges), ("dropped", input_queue.dropped),
+             ("retries", fm_radio.Retries), ("gc", alloc_monitor.collections) ))
+
+def diagnostics_layer(fb, variant):
+    fb.text("tick", 0, 8)
+    fb.text("draw", 0, 16)
+    fb.text("spi", 0, 24)
+    fb.text("i2c", 0, 32)
+    fb.text("[2]Prof [3]Dump", 4, 56)
+
+def render_diagnostics(): # 6 = hidden diagnostics (mean/max us of the last 32 samples)
+    screen_layer(6, diagnostics_layer)
+    if profiler.enabled:
+        oled.text("Profile on", 0, 0)
+    else:
+        oled.text("Profile off", 0, 0)
+    y = 8
+    for channel in (PROFILE_TICK, PROFILE_RENDER, PROFILE_FLUSH, PROFILE_I2C):
+        oled.text("{:>6}{:>6}".format(profiler.mean(channel), profiler.max[channel]), 32, y)
+        y += 8
+    oled.text("irq{:>4} drop{:>3}".format(button_timer.edges, input_queue.dropped), 0, 40)
+    oled.text("rty{:>4} gc{:>5}".format(fm_radio.Retries, alloc_monitor.collections), 0, 48)
+
+#
+# State table: (state, button) -> action, next state
+# None as the action only changes the state, None as the next state stays put
+#
+menu = StateMachine(0)
+menu.add(0, 1, None, 1) # main menu
+menu.add(0, 2, None, 2)
+menu.add(0, 3, None, 3)
+menu.add(0, 4, None, 4)
+menu.add(1, 1, None, 0) # time format - Back
+menu.add(1, 2, select_12_hour, 0)
+menu.add(1, 3, select_24_hour, 0)
+menu.add(1, 4, open_diagnostics, 6) # hidden: the screen still says N/A
+menu.add(2, 1, None, 0) # change time - Back
+menu.add(2, 2, change_hour, repeat=1)
+menu.add(2, 3, change_minute, repeat=5)
+menu.add(2, 4, increment_function)
+menu.add(3, 1, None, 0) # alarm - Back
+menu.add(3, 2, None, 32)
+menu.add(3, 3, None, 33)
+menu.add(3, 4, delete_alarm, 0)
+menu.add(32, 1, confirm_alarm, 0) # alarm - Add/Edit
+menu.add(32, 2, change_alarm_hour, repeat=1)
+menu.add(32, 3, change_alarm_minute, repeat=5)
+menu.add(32, 4, increment_function)
+menu.add(33, 1, None, 3) # alarm - Snooze
+menu.add(33, 2, snooze_up, repeat=5)
+menu.add(33, 3, snooze_down, repeat=5)
+menu.add(33, 4, increment_function)
+menu.add(4, 1, None, 0) # radio - Back
+menu.add(4, 2, None, 42)
+menu.add(4, 3, None, 43)
+menu.add(4, 4, toggle_mute)
+menu.add(42, 1, None, 4) # radio - Station
+menu.add(42, 2, frequency_up, repeat=10)
+menu.add(42, 3, frequency_down, repeat=10)
+menu.add(42, 4, station_option)
+menu.add(43, 1, None, 4) # radio - Vol
+menu.add(43, 2, volume_up, repeat=1)
+menu.add(43, 3, volume_down, repeat=1)
+menu.add(43, 4, increment_function)
+menu.add(5, 1, accept_alarm, 0) # alarm ringing
+menu.add(5, 2, snooze_alarm, 0)
+menu.add(6, 1, None, 0) # diagnostics
+menu.add(6, 2, toggle_profiling)
+menu.add(6, 3, dump_diagnostics)
+menu.add(6, 4, reset_diagnostics)
+
+menu.add_screen(0, render_main)
+menu.add_screen(1, render_format)
+menu.add_screen(2, render_time)
+menu.add_screen(3, render_alarm_menu)
+menu.add_screen(32, render_alarm_edit)
+menu.add_screen(33, render_snooze)
+menu.add_screen(4, render_radio)
+menu.add_screen(42, render_station)
+menu.add_screen(43, render_sound)
+menu.add_screen(5, render_alarm)
+menu.add_screen(6, render_diagnostics)
+menu.add_entry(5) # entered by the alarm, not by a button
+
+#
+# Event driven runtime (uasyncio)
+#
+# clock_task  - counts seconds on drift free deadlines
+# alarm_task  - checks the alarm once per tick
+# input_task  - runs the button actions signalled by the interrupts below
+# render_task - redraws the screen whenever something visible changed
+# radio_task  - writes queued radio settings, retrying with backoff (dual core: wakes core 1 for it)
+# io_task     - redraws when the second core changed something (dual core)
+# ramp_task   - raises the alarm volume step by step while the alarm rings
+# rds_task    - polls RDS groups while the radio plays and the panel is on (dual core: wakes core 1 for it)
+# marquee_task - scrolls long RDS text on the main screen
+# serial_task - runs the commands typed on the serial console (and starts/stops traces)
+#
+render_event = asyncio.Event() # set when the screen has to be redrawn
+alarm_event = asyncio.Event() # set once per tick
+radio_event = asyncio.Event() # set when radio settings were queued
+settings_event = asyncio.Event() # set when a button may have changed a saved setting
+ramp_event = asyncio.Event() # set when the alarm volume ramp starts
+input_flag = asyncio.ThreadSafeFlag() # set from the button interrupts
+
+input_queue = InputQueue(32)
+switch_level = 0 # +/- switch level captured with the event being processed
+
+shown_minute = -1 # what the last frame showed, to know when a redraw is due
+shown_online = True
+
+# interrupts for directing button presses: the edges only start the button timer, which
+# debounces, queues one byte events and wakes the input task (hard interrupts: no allocation)
+button_timer = ButtonTimer(input_queue, (None, button_1, button_2, button_3, button_4), switch,
+                           input_flag.set) # 15 ms debounce, repeats after 400 ms
+
+def button_handler(pin):
+    button_timer.edge()
+
+def switch_handler(pin): # the +/- labels follow the switch right away
+    input_flag.set()
+
+BUTTON_EDGES = machine.Pin.IRQ_FALLING | machine.Pin.IRQ_RISING
+button_1.irq(trigger=BUTTON_EDGES, handler=button_handler, hard=True)
+button_2.irq(trigger=BUTTON_EDGES, handler=button_handler, hard=True)
+button_3.irq(trigger=BUTTON_EDGES, handler=button_handler, hard=True)
+button_4.irq(trigger=BUTTON_EDGES, handler=button_handler, hard=True)
+switch.irq(trigger=BUTTON_EDGES, handler=switch_handler, hard=True)
+
+tick_scheduler = TickScheduler(1000) # one tick per second, deadlines from utime.ticks_ms()
+
+#
+# Dual core: core 1 sends the frames to the OLED and does all radio I2C, core 0 keeps
+# the tick, the buttons and the menus. Falls back to one core without _thread. Off by
+# default: the host simulation has no second core, so only the single core path is
+# covered by its tests.
+#
+DUAL_CORE = False
+io_changed = asyncio.ThreadSafeFlag() # set from core 1
+io_worker = IOWorker(display, fm_radio, len(oled.buffer), io_changed, DUAL_CORE, SCAN_POLL_MS)
+
+#
+# Low power: the display dims after 30 s and switches off after 2 minutes without a
+# press (the first press then only wakes it). That part always runs.
+#
+# With LIGHTSLEEP the clock also waits for the next tick in machine.lightsleep
+# whenever no other task has work; any button interrupt wakes it. Lightsleep stops
+# the USB clock, so the serial console (commands, diagnostics dump, REPL) stops
+# working: it is off by default, turn it on only for a clock running from a plain
+# power supply. It also needs DUAL_CORE = False: core 1 never sleeps, so with the
+# second core running LIGHTSLEEP is ignored.
+#
+LIGHTSLEEP = False
+power = PowerManager(io_worker, 30000, 120000, 0xFF, 0x01, LIGHTSLEEP and not io_worker.dual)
+io_worker.on_shown = power.shown # the wake latency ends when the frame reached the panel
+
+def can_lightsleep(): # no task has anything to do before the next tick
+    return(power.lightsleep and not button_timer.running and input_queue.pending() == 0
+           and not render_event.is_set() and not alarm_ramp.active and not fm_radio.Scanning
+           and fm_radio.QueueCount == 0 and not settings_store.dirty and not fm_radio.RdsWanted()
+           and not serial.waiting())
+
+#
+# Serial commands (see serial_commands.py), e.g. "set time 06:30; set alarm 06:45".
+# The commands of one poll share a radio update and a redraw. Waiting input keeps
+# the clock out of lightsleep until serial_task has read it.
+#
+ALARM_KINDS = ("once", "weekly", "snooze")
+ALARM_DAYS = {"daily": EVERY_DAY, "weekdays": WEEKDAYS, "weekend": WEEKEND}
+WEEKDAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+#
+# Input traces (see input_trace.py): "set trace on" starts recording every button
+# event the clock acts on, from a snapshot of the state below; "set trace off" saves
+# them to TRACE_FILE for benchmarks/replay.py. Serial commands are not recorded, and
+# of the alarms only the one of the Alarm menu is part of the snapshot.
+#
+TRACE_FILE = "trace.bin"
+trace = TraceRecorder(512) # 7 bytes per event
+
+def trace_state(): # in the order of the input_trace.py header
+    return((clock_seconds, clock_day, alarms.weekday(clock_day), menu.state, format, radio_channel, radio_volume,
+            1 if mute_status else 0, increment_pointer % 5, alarm_seconds // 60,
+            1 if alarm_set else 0, snooze_minute))
+
+def restore_trace_state(state): # back to the snapshot a trace starts from (replay)
+    global clock_seconds
+    global clock_day
     global format
-    global hour
-    global minute
-    global radio_frequency
+    global radio_channel
     global radio_volume
+    global mute_status
+    global increment_pointer
+    global increment
+    global alarm_seconds
+    global primary_alarm
     global snooze_minute
-    global alarm_minute
-    if not button_3_pressed:
-        print("Button 3")
-        button_3_pressed = True
-        
-        if state == 0: # main menu
-            state = 3
-        
-        elif state == 1: # time format - change to from 12 to 24 hour format
-            if format == 12:
-                format = 24
-                if period == 'PM':
-                    hour += 12
-            state = 0
-            
-        elif state == 2: # change time
-            if switch.value() == False:
-                minute = (minute + 1*increment) % 60
-            elif switch.value() == True:
-                minute = (minute - 1*increment) % 60
-            
-        elif state == 3: # alarm
-            state = 33
-            
-        elif state == 32: # alarm
-            if switch.value() == False:
-                alarm_minute = (alarm_minute + 1*increment) % 60
-            elif switch.value() == True:
-                alarm_minute = (alarm_minute - 1*increment) % 60
-            
-        elif state == 33: # alarm
-            snooze_minute = (snooze_minute - (1*increment))
-            if snooze_minute < 1:
-                snooze_minute += 60
-            
-        elif state == 4: # radio
-            state = 43
-        
-        elif state == 42: # decrease radio frequency
-            radio_frequency = radio_frequency - (0.1*increment)
+    clock_seconds, clock_day = state[0:2]
+    alarms.start_weekday = (state[2] - clock_day) % 7
+    menu.state, format, radio_channel, radio_volume = state[3:7]
+    mute_status = state[7] == 1
+    increment_pointer = state[8]
+    increment = incremenet_list[increment_pointer]
+    alarm_seconds = state[9] * 60
+    snooze_minute = state[11]
+    for alarm_id in alarms.ids():
+        alarms.delete(alarm_id)
+    primary_alarm = -1
+    if state[10]:
+        primary_alarm = alarms.add_once(alarm_seconds, clock_now())
+    update_alarm_set()
+    alarm_ramp.cancel()
+    fm_radio.StopScan()
+    fm_radio.BeginUpdate()
+    if ( fm_radio.SetChannel( radio_channel ) == True ):
+        fm_radio.ProgramRadio()
+    if ( fm_radio.SetVolume( radio_volume ) == True ):
+        fm_radio.ProgramRadio()
+    if ( fm_radio.SetMute( mute_status ) == True ):
+        fm_radio.ProgramRadio()
+    fm_radio.CommitUpdate()
 
-            if ( fm_radio.SetFrequency( radio_frequency ) == True ):
-                fm_radio.ProgramRadio()
-                
-        elif state == 43: # decrease radio volume
-            radio_volume = (radio_volume - (1*increment)) % 16
+def parse_time(text): # "hh:mm" or "hh:mm:ss" -> seconds of the day
+    parts = text.split(":")
+    if len(parts) < 2 or len(parts) > 3:
+        raise ValueError("use hh:mm or hh:mm:ss")
+    hours = int(parts[0])
+    minutes = int(parts[1])
+    seconds = int(parts[2]) if len(parts) == 3 else 0
+    if hours > 23 or minutes > 59 or seconds > 59 or min(hours, minutes, seconds) < 0:
+        raise ValueError("no such time")
+    return(hours*3600 + minutes*60 + seconds)
 
-            if ( fm_radio.SetVolume( radio_volume ) == True ):
-                fm_radio.ProgramRadio()
-        
-            
-def button_4_handler(pin): # functions of button 3
-    global button_4_pressed
-    global state
-    global increment
-    global increment_pointer
+def time_text(seconds): # seconds of the day -> "hh:mm:ss" (24 hours)
+    return("%02d:%02d:%02d" % (seconds // 3600, (seconds // 60) % 60, seconds % 60))
+
+def on_off(text):
+    if text in ("1", "on"):
+        return(True)
+    if text in ("0", "off"):
+        return(False)
+    raise ValueError("use 1/on or 0/off")
+
+def get_time(argument):
+    return("time " + time_text(clock_seconds))
+
+def set_time(argument):
+    set_clock(parse_time(argument))
+
+def get_format(argument):
+    return("format %d" % format)
+
+def set_format(argument):
+    global format
+    if argument not in ("12", "24"):
+        raise ValueError("use 12 or 24")
+    format = int(argument)
+
+def get_day(argument):
+    return("day " + WEEKDAY_NAMES[alarms.weekday(clock_day)])
+
+def set_day(argument): # today's weekday; weekly alarms follow it
+    if argument not in WEEKDAY_NAMES:
+        raise ValueError("use " + "|".join(WEEKDAY_NAMES))
+    alarms.set_weekday(clock_day, WEEKDAY_NAMES.index(argument), clock_now())
+
+def get_alarms(argument): # "alarms <count>", then one line per alarm
+    lines = ["alarms %d" % alarms.pending()]
+    for alarm_id in alarms.ids():
+        kind, time, days, fire = alarms.get(alarm_id)
+        if kind == KIND_SNOOZE:
+            time = time % SECONDS_PER_DAY
+        primary = " primary" if alarm_id == primary_alarm else ""
+        lines.append("alarm %d %s %s days:%02X%s" % (alarm_id, ALARM_KINDS[kind], time_text(time)[0:5], days, primary))
+    return("\n".join(lines))
+
+def set_alarm(argument): # the alarm of the Alarm menu: "hh:mm" or "off"
+    global alarm_seconds
+    if argument == "off":
+        delete_alarm()
+        return
+    alarm_seconds = parse_time(argument) // 60 * 60
+    confirm_alarm()
+
+def add_alarm(argument): # weekly alarm: "hh:mm daily|weekdays|weekend|<day mask in hex>"
+    words = argument.split()
+    if len(words) != 2:
+        raise ValueError("use hh:mm and days")
+    days = ALARM_DAYS.get(words[1])
+    if days is None:
+        days = int(words[1], 16) & EVERY_DAY
+    alarm_id = alarms.add_weekly(parse_time(words[0]) // 60 * 60, days, clock_now())
+    update_alarm_set()
+    return("alarm %d" % alarm_id)
+
+def del_alarm(argument):
+    alarm_id = int(argument)
+    if alarms.get(alarm_id) is None:
+        raise ValueError("no such alarm")
+    alarms.delete(alarm_id)
+    update_alarm_set()
+
+def get_freq(argument):
+    tenths = channel_tenths(radio_channel)
+    return("freq %d.%d" % (tenths // 10, tenths % 10))
+
+def set_freq(argument): # MHz, rounded to the 0.1 MHz channel
+    global radio_channel
+    if ( fm_radio.SetFrequency( argument ) == False ):
+        raise ValueError("outside 88.0-108.0")
+    radio_channel = fm_radio.Channel
+    fm_radio.ProgramRadio()
+
+def get_vol(argument):
+    return("vol %d" % radio_volume)
+
+def set_vol(argument):
+    global radio_volume
+    volume = int(argument)
+    if volume < 0 or volume > 15:
+        raise ValueError("use 0-15")
+    radio_volume = volume
+    if ( fm_radio.SetVolume( radio_volume ) == True ):
+        fm_radio.ProgramRadio()
+
+def get_mute(argument):
+    return("mute %d" % mute_status)
+
+def set_mute(argument):
     global mute_status
-    global alarm_set
-    if not button_4_pressed:
-        print("Button 4")
-        button_4_pressed = True
-        
-        if state == 0: # main menu
-            state = 4
-        
-        elif state == 1: # time format
-            print("N/A") # No function assigned
-            
-        elif state == 2: # change time
-            increment_function()
-            
-        elif state == 3: # alarm
-            alarm_set = False
-            state = 0
-        
-        elif state == 32: # alarm
-            increment_function()
-            
-        elif state == 33: # alarm
-            increment_function()
-        
-        elif state == 4: # radio
-            if mute_status == True:
-                mute_status = False
-            else:
-                mute_status = True
-        
-            if ( fm_radio.SetMute( mute_status ) == True ):
-                fm_radio.ProgramRadio()
-        
-        elif state == 42: # trigger increment function to go up
-            increment_function()
-            
-        elif state == 43: # trigger increment function to go up
-            increment_function()
-
-# interrupts for directing button presses
-button_1.irq(trigger=machine.Pin.IRQ_FALLING, handler=button_1_handler)
-button_2.irq(trigger=machine.Pin.IRQ_FALLING, handler=button_2_handler)
-button_3.irq(trigger=machine.Pin.IRQ_FALLING, handler=button_3_handler)
-button_4.irq(trigger=machine.Pin.IRQ_FALLING, handler=button_4_handler)
-        
+    mute_status = on_off(argument)
+    if ( fm_radio.SetMute( mute_status ) == True ):
+        fm_radio.ProgramRadio()
 
+def get_trace(argument):
+    return(trace.report())
 
+def set_trace(argument): # "on" starts a new trace, "off" saves it
+    if on_off(argument):
+        trace.start(trace_state(), tick_scheduler.ticks)
+        return
+    trace.stop()
+    try:
+        size = trace.save(TRACE_FILE)
+    except OSError as e:
+        raise ValueError("cannot write %s (%s)" % (TRACE_FILE, e))
+    return("trace %s %d events %d bytes" % (TRACE_FILE, trace.count, size))
+
+def get_help(argument):
+    return(", ".join(serial.names()))
+
+def serial_begin(): # the radio settings of every command go out in one write
+    fm_radio.BeginUpdate()
+
+def serial_commit():
+    fm_radio.CommitUpdate()
+    render_event.set()
+    radio_event.set()
+    settings_store.touch()
+    settings_event.set()
+
+serial = SerialCommands(sys.stdin, serial_begin, serial_commit)
+serial.add("get", "time", get_time)
+serial.add("set", "time", set_time)
+serial.add("get", "format", get_format)
+serial.add("set", "format", set_format)
+serial.add("get", "day", get_day)
+serial.add("set", "day", set_day)
+serial.add("get", "alarms", get_alarms)
+serial.add("set", "alarm", set_alarm)
+serial.add("add", "alarm", add_alarm)
+serial.add("del", "alarm", del_alarm)
+serial.add("get", "freq", get_freq)
+serial.add("set", "freq", set_freq)
+serial.add("get", "vol", get_vol)
+serial.add("set", "vol", set_vol)
+serial.add("get", "mute", get_mute)
+serial.add("set", "mute", set_mute)
+serial.add("get", "trace", get_trace)
+serial.add("set", "trace", set_trace)
+serial.add("get", "help", get_help)
+
+def advance_clock(elapsed): # basic function of a running clock
+    global clock_seconds
+    global clock_day
+    clock_seconds += elapsed
+    if clock_seconds >= SECONDS_PER_DAY:
+        clock_day += clock_seconds // SECONDS_PER_DAY
+        clock_seconds = clock_seconds % SECONDS_PER_DAY
+
+def play_alarm(): # starting volume and unmute in one radio write, ramp_task does the rest
+    global radio_volume
+    global mute_status
+    fm_radio.StopScan()
+    alarm_ramp.begin()
+    fm_radio.BeginUpdate()
+    radio_volume = alarm_ramp.start
+    if ( fm_radio.SetVolume( radio_volume ) == True ):
+        fm_radio.ProgramRadio()
+    mute_status = False
+    if ( fm_radio.SetMute( mute_status ) == True ):
+        fm_radio.ProgramRadio()
+    fm_radio.CommitUpdate()
+
+def render_frame(): # draws the screen for the current state
+    global shown_minute
+    global shown_online
+    shown_minute = clock_seconds // 60
+    shown_online = fm_radio.Online
 
-            
-while ( True ):
-    
 #
-# Clear the buffer
+# Draw the screen of the current state (each screen starts from its static layer)
 #
-    oled.fill(0)
-    
-    utime.sleep(1); # tracks time by the second and allows for debouncing
-    second +=1 ;
-    
-# basic function of a running clock
-    if second >= 60:
-        minute += 1;
-        second = 0;
-        
-        if (hour == 11 or hour == 24) and minute == 60:
-            if period == 'AM':
-                period = 'PM'
-            else:
-                period = 'AM'
-        
-        if minute >= 60:
-            hour += 1
-            minute = 0;
-
-            if format == 12 and hour > 12:
-                hour = 1;
-            if format == 24 and hour > 23:
-                hour = 0;
-
-#screen once alarm is triggered
-    if (alarm_set == True) and (alarm_hour == hour) and (alarm_minute == minute) and (state != 32):
-        state = 5
-        if format == 12 and (alarm_period == period):
-            formatted_time = "{:02}:{:02} {}".format(hour, minute, period)
-            oled.text(formatted_time, 32, 16);
-            oled.text("PST", 104, 16)
-            oled.text("ALARM", 48, 32);
-            oled.text("[1] Accept ", 12, 46);
-            oled.text("[2] Snooze:%d " %snooze_minute, 12, 54);
-            # Play Alarm
-            radio_volume = 15
-            if ( fm_radio.SetVolume( radio_volume ) == True ):
-                fm_radio.ProgramRadio()
-            mute_status = False
-            if ( fm_radio.SetMute( mute_status ) == True ):
-                fm_radio.ProgramRadio()
-            # Mute/ stop radio
-        elif format == 24:
-            formatted_time = "{:02}:{:02}".format(hour, minute)
-            oled.text(formatted_time, 44, 16);
-            oled.text("PST", 104, 16)
-            oled.text("ALARM", 48, 32);
-            oled.text("[1] Accept ", 12, 46);
-            oled.text("[2] Snooze:%d " %snooze_minute, 12, 54);
-            # Play Alarm
-            radio_volume = 15
+    menu.render()
+
+def gc_idle(): # the tick's work is done and the next one is most of a second away
+    alloc_monitor.collect()
+
+async def clock_task():
+    while True:
+        if can_lightsleep():
+            power.sleep(tick_scheduler.remaining()) # a button press ends it early
+        else:
+            await asyncio.sleep_ms(tick_scheduler.remaining())
+        elapsed = tick_scheduler.advance()
+        if elapsed == 0:
+            continue
+        start = profiler.begin()
+        advance_clock(elapsed)
+        power.update(menu.state == 5)
+        fm_radio.RdsVisible = not power.blank()
+        alarm_event.set()
+        if clock_seconds // 60 != shown_minute or menu.state == 6: # diagnostics update every tick
+            render_event.set()
+        # let the tasks woken by this tick run, then note how long the tick took
+        await asyncio.sleep_ms(0)
+        tick_scheduler.finish()
+        profiler.end(PROFILE_TICK, start)
+        gc_idle()
+
+def check_alarm(): # True when an alarm went off
+    # one compare against the earliest alarm; an alarm due while one rings is dropped
+    if alarms.due(clock_now()) < 0 or menu.state == 5:
+        return(False)
+    menu.state = 5
+    power.activity(utime.ticks_ms()) # panel on and bright while it rings
+    play_alarm()
+    return(True)
+
+async def alarm_task():
+    while True:
+        await alarm_event.wait()
+        alarm_event.clear()
+        if check_alarm():
+            radio_event.set()
+            render_event.set()
+            ramp_event.set()
+
+REPEAT_INCREMENTS = (1, 2, 5, 10) # step per repeat speed, capped by the transition's repeat value
+
+def dispatch_event(code): # runs the action for one queued button event
+    global switch_level
+    global increment
+    trace.record(code, tick_scheduler.ticks) # returns right away unless recording
+    switch_level = event_switch(code)
+    button = event_button(code)
+    kind = event_kind(code)
+    if kind == EVENT_PRESS:
+        print("Button %d" % button)
+        menu.dispatch(button)
+    elif kind == EVENT_REPEAT: # held: only the +/- edits repeat, with bigger steps as it goes on
+        limit = menu.repeat_limit(button)
+        if limit == 0:
+            return
+        chosen = increment
+        increment = max(chosen, min(REPEAT_INCREMENTS[event_speed(code)], limit))
+        menu.dispatch(button)
+        increment = chosen
+
+wake_button = 0 # the button that woke the panel: ignored until it is released
+
+async def input_task():
+    global wake_button
+    while True:
+        await input_flag.wait()
+        code = input_queue.pop()
+        woken = code >= 0 and power.activity(button_timer.first_edge)
+        if woken:
+            wake_button = event_button(code)
+            fm_radio.RdsVisible = True
+        while code >= 0:
+            button = event_button(code)
+            kind = event_kind(code)
+            if button == wake_button and not woken and kind == EVENT_PRESS:
+                wake_button = 0 # pressed again, its release was lost
+            if button == wake_button: # a press on the dark panel only switches it on,
+                if kind == EVENT_RELEASE: # holding it on does not repeat either
+                    wake_button = 0
+            elif not woken:
+                dispatch_event(code)
+            code = input_queue.pop()
+        render_event.set()
+        radio_event.set()
+        settings_store.touch()
+        settings_event.set()
+
+async def render_task():
+    while True:
+        await render_event.wait()
+        render_event.clear()
+        if power.blank(): # redrawn when a press wakes the panel
+            continue
+        alloc_monitor.begin()
+        start = profiler.begin()
+        render_frame()
+        profiler.end(PROFILE_RENDER, start)
+        alloc_monitor.end()
+# Transfer the changed parts of the buffer to the screen (dual core: only the hand over)
+        start = profiler.begin()
+        io_worker.submit_frame(oled.buffer) # then power.shown() once it reached the panel
+        profiler.end(PROFILE_FLUSH, start)
+
+async def settings_task():
+    while True:
+        await settings_event.wait()
+        settings_event.clear()
+# Wait until the buttons were left alone for a while (presses keep moving this out)
+        while not settings_store.due():
+            await asyncio.sleep_ms(settings_store.remaining())
+        settings_store.save(pack_settings()) # skipped when nothing changed
+
+async def radio_task():
+    while True:
+# Dual core: core 1 does the bus work and the band scan, it only has to be woken
+        if io_worker.dual:
+            if fm_radio.Attempts > 0: # backing off after a failed write
+                await asyncio.sleep_ms(max(0, utime.ticks_diff(fm_radio.NextAttempt, utime.ticks_ms())))
+            io_worker.notify()
+            await radio_event.wait() # new settings, or core 1 changed something (io_task)
+            radio_event.clear()
+            continue
+# A band scan owns the bus until it is done; queued settings are written afterwards
+        if fm_radio.Scanning:
+            if fm_radio.ScanStep() == False or fm_radio.ScanChannel % 10 == 0:
+                render_event.set() # progress, or the station line once it is over
+            await asyncio.sleep_ms(SCAN_POLL_MS)
+            continue
+# Write any queued radio settings (one attempt, never blocks on a bad bus)
+        fm_radio.ServiceBus()
+        if fm_radio.Online != shown_online:
+            render_event.set()
+        if fm_radio.QueueCount == 0:
+            await radio_event.wait()
+            radio_event.clear()
+        elif fm_radio.Attempts > 0:
+            # backing off after a failed write
+            await asyncio.sleep_ms(max(0, utime.ticks_diff(fm_radio.NextAttempt, utime.ticks_ms())))
+        else:
+            await asyncio.sleep_ms(0)
+
+async def ramp_task():
+    global radio_volume
+    while True:
+        await ramp_event.wait()
+        ramp_event.clear()
+# Sleep until the next level is due; Accept/Snooze cancel the ramp in between
+        while alarm_ramp.active:
+            await asyncio.sleep_ms(alarm_ramp.remaining())
+            level = alarm_ramp.step()
+            if level < 0:
+                continue
+            radio_volume = level
             if ( fm_radio.SetVolume( radio_volume ) == True ):
                 fm_radio.ProgramRadio()
-            mute_status = False
-            if ( fm_radio.SetMute( mute_status ) == True ):
-                fm_radio.ProgramRadio()
-            # Mute/ stop radio
-# various screens that are displayed depending on the current state
-# contains the relevant information for said state
-    elif format == 12 and state == 0:
-        formatted_time = "{:02}:{:02} {}".format(hour, minute, period)
-        oled.text(formatted_time, 32, 16);
-        alarm_set_notification()
-        oled.text("PST", 104, 16)
-        formatted_info = "V:{:02} S:{:05.1f}".format(radio_volume, radio_frequency)
-        oled.text(formatted_info, 12, 34);
-        oled.text("[F] [T] [A] [R]", 4, 50);
-    elif format == 24 and state == 0:
-        formatted_time = "{:02}:{:02}".format(hour, minute)
-        oled.text(formatted_time, 44, 16);
-        alarm_set_notification()
-        oled.text("PST", 104, 16)
-        formatted_info = "V:{:02} S:{:05.1f}".format(radio_volume, radio_frequency)
-        oled.text(formatted_info, 12, 34);
-        oled.text("[F] [T] [A] [R]", 4, 50);
-    elif state == 1:
-        oled.text("Change Format", 12, 0);
-        oled.text("[1] Back ", 12, 30);
-        oled.text("[2] 12 ", 12, 38);
-        oled.text("[3] 24 ", 12, 46);
-        oled.text("[4] N/A ", 12, 54);
-    elif state == 2:
-        oled.text("Change Time", 12, 0);
-        if format == 12:
-            formatted_time = "{:02}:{:02} {}".format(hour, minute, period)
-            oled.text(formatted_time, 32, 16);
-        elif format == 24:
-            formatted_time = "{:02}:{:02}".format(hour, minute)
-            oled.text(formatted_time, 44, 16);
-        oled.text("[1] Back ", 12, 30);
-        if switch.value() == False:
-            oled.text("[2] +Hour ", 12, 38);
-            oled.text("[3] +Min ", 12, 46);
-        elif switch.value() == True:
-            oled.text("[2] -Hour ", 12, 38);
-            oled.text("[3] -Min ", 12, 46);
-        oled.text("[4] Inc:%d" %increment, 12, 54)
-    elif state == 3:
-        oled.text("Alarm Menu", 12, 0);
-        if format == 12:
-            formatted_time = "{:02}:{:02} {}".format(alarm_hour, alarm_minute, alarm_period)
-            oled.text(formatted_time, 32, 16);
-        elif format == 24:
-            formatted_time = "{:02}:{:02}".format(alarm_hour, alarm_minute)
-            oled.text(formatted_time, 44, 16);
-        oled.text("[1] Back ", 12, 30);
-        if(alarm_set == True):
-            oled.text("[2] Edit Alarm", 12, 38);
-        else:
-            oled.text("[2] Add Alarm", 12, 38);
-        oled.text("[3] Snooze ", 12, 46);
-        oled.text("[4] Delete ", 12, 54);
-    elif state == 32:
-        if(alarm_set == True):
-            oled.text("Edit Alarm", 12, 0);
+                radio_event.set()
+
+async def rds_task():
+    while True:
+        if fm_radio.RdsWanted():
+            wait = fm_radio.RdsRemaining()
+            if wait == 0 and io_worker.dual:
+                io_worker.notify() # core 1 polls
+                wait = fm_radio.RdsPollMs
+            elif wait == 0:
+                if fm_radio.PollRds():
+                    render_event.set()
+                wait = fm_radio.RdsRemaining()
+            await asyncio.sleep_ms(wait)
         else:
-            oled.text("Add Alarm", 12, 0);
-        if format == 12:
-            formatted_time = "{:02}:{:02} {}".format(alarm_hour, alarm_minute, alarm_period)
-            oled.text(formatted_time, 32, 16);
-        elif format == 24:
-            formatted_time = "{:02}:{:02}".format(alarm_hour, alarm_minute)
-            oled.text(formatted_time, 44, 16);
-        oled.text("[1] Confirm ", 12, 30);
-        if switch.value() == False:
-            oled.text("[2] +Hour ", 12, 38);
-            oled.text("[3] +Min ", 12, 46);
-        elif switch.value() == True:
-            oled.text("[2] -Hour ", 12, 38);
-            oled.text("[3] -Min ", 12, 46);
-        oled.text("[4] Inc:%d" %increment, 12, 54)
-    elif state == 33:
-        oled.text("Edit Snooze", 12, 0);
-        oled.text("Time: %d" %snooze_minute, 12, 16);
-        oled.text("[1] Back ", 12, 30);
-        oled.text("[2] +Min ", 12, 38);
-        oled.text("[3] -Min ", 12, 46);
-        oled.text("[4] Inc:%d" %increment, 12, 54)
-    elif state == 4:
-        oled.text("Radio Menu", 12, 0);
-        formatted_info = "V:{:02} S:{:05.1f}".format(radio_volume, radio_frequency)
-        oled.text(formatted_info, 12, 16);
-        oled.text("[1] Back ", 12, 30);
-        oled.text("[2] Station ", 12, 38);
-        oled.text("[3] Sound ", 12, 46);
-        if(mute_status == True):
-            oled.text("[4] Unmute ", 12, 54);
+            await asyncio.sleep_ms(RDS_IDLE_MS)
+
+MARQUEE_MS = 60 # 2 pixels per step, about 33 pixels a second; stops while the panel is dimmed
+
+async def marquee_task():
+    while True:
+        length = fm_radio.Rds.length
+        if menu.state == 0 and mute_status == False and not power.idle() and marquee.scrolling(length):
+            marquee.advance(length)
+            render_event.set()
+            await asyncio.sleep_ms(MARQUEE_MS)
         else:
-            oled.text("[4] Mute ", 12, 54);
-    elif state == 42:
-        oled.text("Radio Station", 12, 0);
-        formatted_info = "V:{:02} S:{:05.1f}".format(radio_volume, radio_frequency)
-        oled.text(formatted_info, 12, 16);
-        oled.text("[1] Back ", 12, 30);
-        oled.text("[2] +Freq ", 12, 38);
-        oled.text("[3] -Freq ", 12, 46);
-        oled.text("[4] Inc:%d" %increment, 12, 54)
-    elif state == 43:
-        oled.text("Radio Sound", 12, 0);
-        formatted_info = "V:{:02} S:{:05.1f}".format(radio_volume, radio_frequency)
-        oled.text(formatted_info, 12, 16);
-        oled.text("[1] Back ", 12, 30);
-        oled.text("[2] +Vol ", 12, 38);
-        oled.text("[3] -Vol ", 12, 46);
-        oled.text("[4] Inc:%d" %increment, 12, 54)
-       
-    # Reset button press flag
-    button_1_pressed = False
-    button_2_pressed = False
-    button_3_pressed = False
-    button_4_pressed = False
-
-# Transfer the buffer to the screen
-    oled.show()
+            await asyncio.sleep_ms(RDS_IDLE_MS)
+
+async def serial_task():
+    reader = asyncio.StreamReader(sys.stdin)
+    while True:
+        first = await reader.read(1) # sleeps until the host sends something
+        serial.poll(first) # then only what is already waiting, a few dozen characters at most
+
+async def io_task():
+    while True:
+        await io_changed.wait()
+        render_event.set()
+        radio_event.set() # radio_task times the retry when a write failed
+
+async def main():
+    if io_worker.dual:
+        io_worker.start()
+        asyncio.create_task(io_task())
+    asyncio.create_task(radio_task())
+    asyncio.create_task(rds_task())
+    asyncio.create_task(marquee_task())
+    asyncio.create_task(serial_task())
+    asyncio.create_task(render_task())
+    asyncio.create_task(input_task())
+    asyncio.create_task(alarm_task())
+    asyncio.create_task(settings_task())
+    asyncio.create_task(ramp_task())
+    render_event.set()
+    await clock_task()
+
+if __name__ == "__main__":
+    asyncio.run(main())
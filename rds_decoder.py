@@ -0,0 +1,165 @@
+#
+# Streaming RDS decoder for radio_alarm_clock.py
+# This file must be saved on the Pico next to radio_alarm_clock.py
+#
+# The radio hands over one RDS group (blocks A-D plus the chip's block error
+# levels) at a time and feed() folds it into the station name (PS, groups 0A/0B)
+# and RadioText (groups 2A/2B). Every call does a fixed amount of work into
+# preallocated buffers, so decoding never allocates and never takes long.
+#
+# Groups whose block B had more than max_bler corrected errors are dropped:
+# block B says what the group is and where its characters go, so a damaged
+# one would put good characters in the wrong place. Block A errors only stop
+# the PI code check. (The RDA5807M reports error levels for blocks A and B.)
+#
+# Text only reaches the display copy once a whole PS (all 4 segments) or a
+# whole RadioText (up to its end marker) has been received, so the screen
+# never shows half of an old and half of a new name.
+#
+PS_LENGTH = 8
+RT_LENGTH = 64
+RT_SEGMENTS = 16
+TEXT_GAP = 2 # spaces between PS and RadioText in text
+
+# RDS decoder class
+class RdsDecoder:
+
+    def __init__( self, max_bler = 1 ):
+        self.max_bler = max_bler
+        self.ps_work = bytearray( PS_LENGTH )
+        self.rt_work = bytearray( RT_LENGTH )
+        self.ps = bytearray( PS_LENGTH ) # last complete PS
+        self.rt = bytearray( RT_LENGTH ) # last complete RadioText
+        self.rt_length = 0
+        self.text = bytearray( PS_LENGTH + TEXT_GAP + RT_LENGTH ) # "PS  RadioText" for the display
+        self.length = 0
+#
+# Counters
+#
+        self.groups = 0
+        self.rejected = 0 # groups dropped for block errors
+        self.ps_updates = 0
+        self.rt_updates = 0
+        self.reset()
+
+#
+# Forget everything (after tuning to another channel)
+#
+    def reset( self ):
+        self.pi = -1
+        self.ps_mask = 0 # segments received, bit n = segment n
+        self.rt_mask = 0
+        self.rt_end = -1 # segment holding the end marker, -1 when not seen
+        self.rt_flag = -1 # text A/B flag, a change means new text
+        for i in range( PS_LENGTH ):
+            self.ps_work[i] = 0x20
+            self.ps[i] = 0x20
+        for i in range( RT_LENGTH ):
+            self.rt_work[i] = 0x20
+        self.rt_length = 0
+        self.length = 0
+
+#
+# Decode one group. Returns True when text changed.
+#
+    def feed( self, a, b, c, d, bler_a, bler_b ):
+        if bler_b > self.max_bler:
+            self.rejected += 1
+            return( False )
+        self.groups += 1
+        if bler_a <= self.max_bler:
+            if self.pi >= 0 and a != self.pi: # another station: start over
+                self.reset()
+            self.pi = a
+        group = b >> 12
+        version_b = b & 0x0800
+        if group == 0:
+            return( self.ps_segment( b & 0x03, d ))
+        if group == 2:
+            if version_b:
+                return( self.rt_segment( b, b & 0x0F, 2, d, d ))
+            return( self.rt_segment( b, b & 0x0F, 4, c, d ))
+        return( False )
+
+    def ps_segment( self, segment, d ):
+        self.ps_work[segment * 2] = printable( d >> 8 )
+        self.ps_work[segment * 2 + 1] = printable( d & 0xFF )
+        self.ps_mask |= 1 << segment
+        if self.ps_mask != 0x0F:
+            return( False )
+        self.ps_mask = 0
+        if self.ps_work == self.ps:
+            return( False )
+        self.ps[:] = self.ps_work
+        self.ps_updates += 1
+        self.compose()
+        return( True )
+
+    def rt_segment( self, b, segment, size, first, second ):
+        flag = ( b >> 4 ) & 1
+        if flag != self.rt_flag: # the station sends a new text
+            self.rt_flag = flag
+            self.rt_mask = 0
+            self.rt_end = -1
+            for i in range( RT_LENGTH ):
+                self.rt_work[i] = 0x20
+        position = segment * size
+        for i in range( size ):
+            if i < 2:
+                code = ( first >> ( 8 - 8 * i )) & 0xFF
+            else:
+                code = ( second >> ( 24 - 8 * i )) & 0xFF
+            if code == 0x0D: # end of text
+                self.rt_end = segment
+                for j in range( position + i, RT_LENGTH ):
+                    self.rt_work[j] = 0x20
+                break
+            self.rt_work[position + i] = printable( code )
+        self.rt_mask |= 1 << segment
+        last = self.rt_end
+        if last < 0:
+            last = RT_SEGMENTS - 1 # 4 bit address: 64 characters in 2A, 32 in 2B
+        if self.rt_mask & (( 2 << last ) - 1 ) != ( 2 << last ) - 1:
+            return( False )
+        self.rt_mask = 0
+        length = ( last + 1 ) * size
+        while length > 0 and self.rt_work[length - 1] == 0x20:
+            length -= 1
+        changed = length != self.rt_length
+        for i in range( length ):
+            if self.rt[i] != self.rt_work[i]:
+                self.rt[i] = self.rt_work[i]
+                changed = True
+        if not changed:
+            return( False )
+        self.rt_length = length
+        self.rt_updates += 1
+        self.compose()
+        return( True )
+
+#
+# Build the display text from the complete PS and RadioText
+#
+    def compose( self ):
+        length = PS_LENGTH
+        while length > 0 and self.ps[length - 1] == 0x20:
+            length -= 1
+        for i in range( length ):
+            self.text[i] = self.ps[i]
+        if self.rt_length > 0:
+            for i in range( TEXT_GAP ):
+                self.text[length + i] = 0x20
+            length += TEXT_GAP
+            for i in range( self.rt_length ):
+                self.text[length + i] = self.rt[i]
+            length += self.rt_length
+        self.length = length
+
+    def report( self ):
+        return( "rds pi:{:04X} groups:{} rejected:{} ps:{} rt:{}".format(
+            self.pi & 0xFFFF, self.groups, self.rejected, self.ps_updates, self.rt_updates ))
+
+def printable( code ): # RDS characters outside plain ASCII are shown as spaces
+    if code < 0x20 or code > 0x7E:
+        return( 0x20 )
+    return( code )
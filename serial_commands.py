@@ -0,0 +1,139 @@
+#
+# Serial command interface for radio_alarm_clock.py
+# This file must be saved on the Pico next to radio_alarm_clock.py
+#
+# Lines typed on the USB serial console (or sent by a script) are read without
+# blocking: poll() only takes the characters that are already waiting, at most
+# max_chars per call, so a slow or chatty host never holds up the tick. The
+# clock waits for the first character with a uasyncio StreamReader and hands it
+# to poll( first ), so nothing runs while the console is quiet.
+#
+# A line holds one or more commands separated by ";":
+#
+#   get vol                 ->  vol 7
+#   set vol 9; set freq 101.1; set mute 0
+#
+# Every command answers on its own line, "ok", a value, or "err <reason>".
+# All commands that arrive in one poll() form one transaction: begin() runs
+# before the first and commit() after the last, so the clock can collect their
+# radio settings into a single write and redraw the screen once.
+#
+# Commands are a table of ( verb, name ) -> handler( argument ). A handler
+# returns the reply text, or None for "ok", and raises ValueError for a bad
+# argument. Any exception a handler raises becomes an "err" reply for that
+# command; commit() runs even then, so a transaction is never left open.
+#
+try:
+    import uselect as select
+except ImportError:
+    import select
+
+# Serial command class
+class SerialCommands:
+
+    def __init__( self, stream, begin, commit, line_size = 128, max_chars = 64 ):
+        self.stream = stream
+        self.begin = begin
+        self.commit = commit
+        self.poller = select.poll()
+        self.poller.register( stream, select.POLLIN )
+        self.line = bytearray( line_size )
+        self.length = 0
+        self.overflow = False # the current line did not fit, it is dropped
+        self.max_chars = max_chars
+        self.handlers = {} # ( verb, name ) -> handler
+#
+# Counters
+#
+        self.lines = 0
+        self.commands = 0
+        self.errors = 0
+        self.transactions = 0
+
+    def waiting( self ): # characters are ready to be read
+        return( len( self.poller.poll( 0 )) > 0 )
+
+    def add( self, verb, name, handler ):
+        self.handlers[( verb, name )] = handler
+
+#
+# Take the characters that are waiting (after first, one already read) and run
+# every line they complete. Returns the number of lines run.
+#
+    def poll( self, first = None ):
+        lines = 0
+        try:
+            for i in range( self.max_chars ):
+                if first:
+                    char = first
+                    first = None
+                else:
+                    if not self.waiting():
+                        break
+                    char = self.stream.read( 1 )
+                    if not char:
+                        break
+                if char != "\n" and char != "\r":
+                    if self.length < len( self.line ):
+                        self.line[self.length] = ord( char ) & 0x7F
+                        self.length += 1
+                    else:
+                        self.overflow = True
+                    continue
+                if self.length == 0 and not self.overflow:
+                    continue # blank line, or the second half of "\r\n"
+                if lines == 0:
+                    self.begin()
+                lines += 1
+                overflow = self.overflow
+                self.overflow = False
+                length = self.length
+                self.length = 0
+                if overflow:
+                    self.reply( "err line too long" )
+                    self.errors += 1
+                else:
+                    self.execute( self.line[0:length].decode() )
+        finally:
+            if lines > 0:
+                self.transactions += 1
+                self.commit()
+        return( lines )
+
+#
+# Run one line of commands (also used directly by the benchmarks)
+#
+    def execute( self, text ):
+        self.lines += 1
+        for command in text.split( ";" ):
+            words = command.split()
+            if len( words ) == 0:
+                continue
+            self.commands += 1
+            handler = None
+            if len( words ) >= 2:
+                handler = self.handlers.get(( words[0], words[1] ))
+            if handler is None:
+                self.reply( "err unknown command: " + command.strip() )
+                self.errors += 1
+                continue
+            try:
+                answer = handler( " ".join( words[2:] ))
+            except Exception as e: # a bad argument, or a handler that failed
+                self.reply( "err {} {}: {}".format( words[0], words[1], e ))
+                self.errors += 1
+                continue
+            if answer is None:
+                self.reply( "ok" )
+            else:
+                self.reply( answer )
+
+    def reply( self, text ):
+        print( text )
+
+    def names( self ): # sorted "verb name" list for help
+        return( sorted( [ verb + " " + name for ( verb, name ) in self.handlers ] ))
+
+    def report( self ):
+        return( "serial lines:{} commands:{} errors:{} transactions:{}".format(
+            self.lines, self.commands, self.errors, self.transactions ))
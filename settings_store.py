@@ -0,0 +1,151 @@
+#
+# Persistent settings for radio_alarm_clock.py
+# This file must be saved on the Pico next to radio_alarm_clock.py
+#
+# The settings are one small binary record. Each save goes to the next of a few
+# slot files (settings0.bin, settings1.bin, ...) so the flash wear is spread over
+# them, and a save that is cut short by a power loss only damages its own slot.
+# Every record carries a sequence number and a CRC32; at boot the valid record
+# with the highest sequence number wins.
+#
+# Record layout (little endian):
+#   magic (1 byte) | version (1) | sequence (4) | payload (n) | crc32 of all before it (4)
+#
+# Saves are debounced: touch() marks the settings as changed, and due() only
+# becomes true once they have been left alone for debounce_ms (or max_delay_ms
+# after the first change, for settings that keep changing). Holding +Freq
+# therefore costs one write, not one per step.
+#
+import struct
+import utime
+try:
+    from binascii import crc32
+except ImportError:
+    from ubinascii import crc32
+
+RECORD_MAGIC = 0xA5
+HEADER = "<BBI"
+HEADER_SIZE = 6
+
+# Settings store class
+class SettingsStore:
+
+    def __init__( self, version, payload_size, slots = 4, prefix = "settings",
+                  debounce_ms = 5000, max_delay_ms = 60000 ):
+        self.version = version
+        self.payload_size = payload_size
+        self.record_size = HEADER_SIZE + payload_size + 4
+        self.slots = slots
+        self.names = [ "{}{}.bin".format( prefix, slot ) for slot in range( slots ) ]
+        self.debounce_ms = debounce_ms
+        self.max_delay_ms = max_delay_ms
+
+        self.sequence = 0 # sequence number of the newest record
+        self.slot = slots - 1 # slot of the newest record, the next save goes to the one after
+        self.saved = None # payload of the newest record
+        self.dirty = False
+        self.first_change = 0
+        self.last_change = 0
+#
+# Counters
+#
+        self.writes = 0
+        self.writes_skipped = 0 # saves that found nothing changed
+        self.write_errors = 0
+        self.bad_records = 0 # slots with a wrong CRC, size or version at load
+        self.load_us = 0
+
+#
+# Read every slot and return the payload of the newest valid record (None if there is none)
+#
+    def load( self ):
+        start = utime.ticks_us()
+        best = None
+        for slot in range( self.slots ):
+            record = self.read_slot( slot )
+            if record is None:
+                continue
+            sequence, payload = record
+            if best is None or sequence > self.sequence:
+                best = payload
+                self.sequence = sequence
+                self.slot = slot
+        self.saved = best
+        self.load_us = utime.ticks_diff( utime.ticks_us(), start )
+        return( best )
+
+    def read_slot( self, slot ):
+        try:
+            with open( self.names[slot], "rb" ) as f:
+                record = f.read( self.record_size + 1 )
+        except OSError: # slot never written
+            return( None )
+        if len( record ) != self.record_size:
+            self.bad_records += 1
+            return( None )
+        magic, version, sequence = struct.unpack_from( HEADER, record, 0 )
+        crc = struct.unpack_from( "<I", record, self.record_size - 4 )[0]
+        if magic != RECORD_MAGIC or version != self.version or \
+           crc != crc32( memoryview( record )[0:self.record_size - 4] ) & 0xFFFFFFFF:
+            self.bad_records += 1
+            return( None )
+        return( sequence, bytes( record[HEADER_SIZE:HEADER_SIZE + self.payload_size] ))
+
+#
+# Debouncing
+#
+    def touch( self ):
+        now = utime.ticks_ms()
+        if not self.dirty:
+            self.dirty = True
+            self.first_change = now
+        self.last_change = now
+
+    def remaining( self ): # ms until due() becomes true (0 when it already is)
+        if not self.dirty:
+            return( self.debounce_ms )
+        now = utime.ticks_ms()
+        quiet = self.debounce_ms - utime.ticks_diff( now, self.last_change )
+        forced = self.max_delay_ms - utime.ticks_diff( now, self.first_change )
+        return( max( 0, min( quiet, forced )))
+
+    def due( self ):
+        return( self.dirty and self.remaining() == 0 )
+
+#
+# Write payload to the next slot, unless it is what the newest record already holds.
+# Returns True when a record was written.
+#
+    def save( self, payload ):
+        self.dirty = False
+        if payload == self.saved:
+            self.writes_skipped += 1
+            return( False )
+        if len( payload ) != self.payload_size:
+            raise ValueError( "settings payload must be {} bytes".format( self.payload_size ))
+
+        sequence = self.sequence + 1
+        slot = ( self.slot + 1 ) % self.slots
+        record = bytearray( self.record_size )
+        struct.pack_into( HEADER, record, 0, RECORD_MAGIC, self.version, sequence )
+        record[HEADER_SIZE:HEADER_SIZE + self.payload_size] = payload
+        struct.pack_into( "<I", record, self.record_size - 4,
+                          crc32( memoryview( record )[0:self.record_size - 4] ) & 0xFFFFFFFF )
+        try:
+            with open( self.names[slot], "wb" ) as f:
+                f.write( record )
+        except OSError as e:
+            self.write_errors += 1
+            print( "Settings not saved:", e )
+            return( False )
+
+        self.sequence = sequence
+        self.slot = slot
+        self.saved = bytes( payload )
+        self.writes += 1
+        return( True )
+
+    def report( self ):
+        return( "settings seq:{} slot:{} writes:{} skipped:{} errors:{} bad:{} load:{}us".format(
+            self.sequence, self.slot, self.writes, self.writes_skipped, self.write_errors,
+            self.bad_records, self.load_us ))
@@ -0,0 +1,173 @@
+"""Host-side simulation of the radio alarm clock.
+
+Runs ``radio_alarm_clock.py`` unmodified on CPython by installing stand-in
+``machine``, ``utime``, ``ssd1306``, ``framebuf`` and ``micropython`` modules
+backed by a virtual clock. ``_thread`` is hidden, so the clock runs on one core,
+and ``sys.stdin`` is a scripted serial console::
+
+    from sim import Simulation
+
+    s = Simulation()
+    s.press(1, at_ms=5000)  # button 1 -> format menu
+    s.send("get time\n", at_ms=6000)  # serial command
+    s.snapshot_at(5500, "format")
+    s.run(seconds=10)
+    assert s.snapshots["format"].contains("Change Format")
+
+or from the shell: ``python -m sim --seconds 10 --press 1@5000 --snapshot 5500``.
+A simulated day runs in seconds: on a desktop PC under 2 s muted or with the
+radio playing, and about 6 s with a button press every hour (each press lights
+the panel, the station name then scrolls until it dims and RDS is polled until
+it goes off).
+"""
+
+import os
+import sys
+import tempfile
+
+from . import board as _board
+from . import framebuf, gc, machine, micropython, rda5807, ssd1306, uasyncio, uselect, utime
+from .clock import SimulationComplete
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(PROJECT_DIR, "radio_alarm_clock.py")
+
+FAKE_MODULES = {
+    "machine": machine,
+    "utime": utime,
+    "framebuf": framebuf,
+    "ssd1306": ssd1306,
+    "micropython": micropython,
+    "uasyncio": uasyncio,
+    "uselect": uselect,
+    "gc": gc,
+    "_thread": None,  # import fails: single core fallback
+}
+
+BUTTON_PINS = {1: 2, 2: 3, 3: 4, 4: 5}
+SWITCH_PIN = 15
+
+
+class Snapshot:
+    """What the panel showed at one instant."""
+
+    def __init__(self, time_ms, display):
+        self.time_ms = time_ms
+        self.gddram = bytes(display.gddram)
+        self.lines = display.panel_text()
+        self.display_on = display.display_on
+        self.contrast = display.contrast_level
+
+    def text(self):
+        out = []
+        for y in sorted(self.lines):
+            out.append(" | ".join(s for _, s in self.lines[y]))
+        return "\n".join(out)
+
+    def contains(self, needle):
+        return any(needle in s for runs in self.lines.values() for _, s in runs)
+
+    def ascii_art(self, width=128, height=64):
+        rows = []
+        for y in range(height):
+            row = []
+            for x in range(width):
+                byte = self.gddram[(y >> 3) * width + x]
+                row.append("#" if byte & (1 << (y & 7)) else ".")
+            rows.append("".join(row))
+        return "\n".join(rows)
+
+
+class Simulation:
+    def __init__(self, script=SCRIPT, stations=None, defines=None, flash_dir=None, cpu_time=False):
+        self.script = os.path.abspath(script)
+        # the Pico's flash filesystem; pass the flash_dir of an earlier run to power cycle
+        self.flash_dir = flash_dir or tempfile.mkdtemp(prefix="sim-flash-")
+        self.defines = dict(defines or {})  # globals set before the script runs
+        self.board = _board.Board()
+        self.board.clock.cpu_time = cpu_time  # charge host CPU time too (see VirtualClock)
+        self.radio = rda5807.RDA5807(stations)
+        self.board.attach_i2c(0x10, self.radio)
+        self.board.attach_i2c(0x11, self.radio)
+        self.namespace = None
+        self.snapshots = {}
+        self.completed = False
+
+    @property
+    def clock(self):
+        return self.board.clock
+
+    @property
+    def display(self):
+        return self.board.displays[0]
+
+    def pin(self, pin_id):
+        return self.board.pins[pin_id]
+
+    # scripted input
+    def at(self, at_ms, callback):
+        self.clock.schedule(at_ms, callback)
+
+    def press(self, button, at_ms, hold_ms=80, bounce=0):
+        """Press and release a button; ``bounce`` adds contact chatter."""
+        pin_id = BUTTON_PINS[button]
+        self.at(at_ms, lambda: self.pin(pin_id).drive(0))
+        for i in range(bounce):
+            self.at(at_ms + 0.2 + i * 0.4, lambda: self.pin(pin_id).drive(1))
+            self.at(at_ms + 0.4 + i * 0.4, lambda: self.pin(pin_id).drive(0))
+        self.at(at_ms + hold_ms, lambda: self.pin(pin_id).drive(1))
+
+    def send(self, text, at_ms):
+        """Type ``text`` on the serial console at a virtual time."""
+        self.at(at_ms, lambda: self.board.serial.feed(text))
+
+    def set_switch(self, level, at_ms):
+        self.at(at_ms, lambda: self.pin(SWITCH_PIN).drive(level))
+
+    def snapshot_at(self, at_ms, label):
+        def take():
+            self.snapshots[label] = Snapshot(at_ms, self.display)
+        self.at(at_ms, take)
+
+    def snapshot(self):
+        return Snapshot(self.clock.now_us // 1000, self.display)
+
+    # execution
+    def run(self, seconds):
+        self.clock.stop_us = self.clock.now_us + int(seconds * 1000000)
+        saved_modules = {name: sys.modules.get(name) for name in FAKE_MODULES}
+        saved_path = list(sys.path)
+        saved_cwd = os.getcwd()
+        saved_stdin = sys.stdin
+        before = set(sys.modules)
+        _board.install(self.board)
+        sys.modules.update(FAKE_MODULES)
+        sys.path.insert(0, PROJECT_DIR)
+        sys.path.insert(0, os.path.dirname(os.path.abspath(self.script)))
+        namespace = {"__name__": "__main__", "__file__": self.script}
+        namespace.update(self.defines)
+        self.namespace = namespace
+        try:
+            with open(self.script) as f:
+                code = compile(f.read(), self.script, "exec")
+            os.chdir(self.flash_dir)
+            sys.stdin = self.board.serial
+            self.clock.start_cpu()
+            exec(code, namespace)
+        except SimulationComplete:
+            self.completed = True
+        finally:
+            for name in set(sys.modules) - before:
+                module = sys.modules.get(name)
+                path = getattr(module, "__file__", None) or ""
+                if os.path.dirname(os.path.abspath(path)) == PROJECT_DIR:
+                    del sys.modules[name]
+            for name, module in saved_modules.items():
+                if module is None:
+                    sys.modules.pop(name, None)
+                else:
+                    sys.modules[name] = module
+            sys.path[:] = saved_path
+            sys.stdin = saved_stdin
+            os.chdir(saved_cwd)
+        return self
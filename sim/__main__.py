@@ -0,0 +1,61 @@
+"""Run the clock on the host: ``python -m sim --seconds 120 --press 3@5000``.
+
+Prints what the panel shows at every ``--snapshot`` time (and at the end).
+``--script`` runs another file instead, e.g. a benchmark; add ``--cpu-time``
+when it times code that does not use a bus.
+"""
+
+import argparse
+
+from . import SCRIPT, Simulation
+
+
+def parse_press(text):
+    button, _, at = text.partition("@")
+    return int(button), float(at)
+
+
+def parse_send(text):
+    line, _, at = text.rpartition("@")
+    return line, float(at)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m sim", description=__doc__)
+    parser.add_argument("--seconds", type=float, default=60.0,
+                        help="virtual seconds to run (default 60)")
+    parser.add_argument("--press", action="append", default=[], type=parse_press,
+                        metavar="BUTTON@MS", help="press a button (1-4) at a virtual time")
+    parser.add_argument("--switch", action="append", default=[], type=parse_press,
+                        metavar="LEVEL@MS", help="set the +/- switch at a virtual time")
+    parser.add_argument("--send", action="append", default=[], type=parse_send,
+                        metavar="LINE@MS", help="type a serial command line at a virtual time")
+    parser.add_argument("--snapshot", action="append", default=[], type=float,
+                        metavar="MS", help="capture the panel at a virtual time")
+    parser.add_argument("--ascii", action="store_true", help="print the pixels, not just the text")
+    parser.add_argument("--script", default=SCRIPT, help="file to run (default radio_alarm_clock.py)")
+    parser.add_argument("--cpu-time", action="store_true",
+                        help="charge host CPU time to the virtual clock")
+    args = parser.parse_args(argv)
+
+    sim = Simulation(args.script, cpu_time=args.cpu_time)
+    for button, at in args.press:
+        sim.press(button, at)
+    for level, at in args.switch:
+        sim.set_switch(level, at)
+    for line, at in args.send:
+        sim.send(line + "\n", at)
+    for at in args.snapshot:
+        sim.snapshot_at(at, "%g ms" % at)
+    sim.run(args.seconds)
+    sim.snapshots["end"] = sim.snapshot()
+
+    for label, snap in sim.snapshots.items():
+        print("== %s ==" % label)
+        print(snap.ascii_art() if args.ascii else snap.text())
+    print("== bus ==")
+    print(sim.board.summary())
+
+
+if __name__ == "__main__":
+    main()
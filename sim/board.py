@@ -0,0 +1,79 @@
+"""The simulated Pico: one virtual clock plus the devices wired to it."""
+
+from .clock import VirtualClock
+
+
+class SerialConsole:
+    """The USB serial input: text scripted by the test, read like ``sys.stdin``."""
+
+    def __init__(self):
+        self._pending = ""
+        self.received = 0
+        self.readers = []  # called when text arrives (uasyncio.StreamReader)
+
+    def feed(self, text):
+        self._pending += text
+        for wake in self.readers:
+            wake()
+
+    def any(self):
+        return len(self._pending)
+
+    def read(self, n=-1):
+        if n < 0:
+            n = len(self._pending)
+        text, self._pending = self._pending[:n], self._pending[n:]
+        self.received += len(text)
+        return text
+
+    def readline(self):
+        end = self._pending.find("\n")
+        return self.read(len(self._pending) if end < 0 else end + 1)
+
+
+class Board:
+    """State shared by the fake ``machine``/``utime``/``ssd1306`` modules.
+
+    A fresh board is installed for every :class:`sim.Simulation`, so nothing
+    leaks between runs.
+    """
+
+    def __init__(self):
+        self.clock = VirtualClock()
+        self.pins = {}
+        self.i2c_devices = {}
+        self.spi_buses = []
+        self.i2c_buses = []
+        self.displays = []
+        self.timers = []
+        self.irq_enabled = True
+        self.lightsleeps = 0
+        self.scheduled = 0
+        self.files = None
+        self.serial = SerialConsole()
+
+    def pin(self, pin_id):
+        return self.pins[pin_id]
+
+    def attach_i2c(self, address, device):
+        self.i2c_devices[address] = device
+
+    def summary(self):
+        """One line per bus: traffic since the board was created."""
+        lines = []
+        for i, spi in enumerate(self.spi_buses):
+            lines.append("spi%d: %d bytes in %d transfers" % (i, spi.bytes_written, spi.transfers))
+        for i, i2c in enumerate(self.i2c_buses):
+            lines.append("i2c%d: %d transactions, %d bytes, %d errors"
+                         % (i, i2c.transactions, i2c.bytes, i2c.errors))
+        lines.append("virtual time: %.3f s" % (self.clock.now_us / 1e6))
+        return "\n".join(lines)
+
+
+current = Board()
+
+
+def install(board):
+    global current
+    current = board
+    return board
@@ -0,0 +1,120 @@
+"""Virtual time base shared by every fake device in the simulation."""
+
+import heapq
+import time
+
+TICKS_PERIOD = 1 << 30  # MicroPython ticks_* wrap at 2**30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+
+class SimulationComplete(BaseException):
+    """Raised from inside the script once the simulated time budget is spent.
+
+    Derives from BaseException so a bare ``except:`` in the script under test
+    cannot swallow it by accident.
+    """
+
+
+class VirtualClock:
+    """Microsecond clock that only moves when the script sleeps or uses a bus.
+
+    Scheduled callbacks (button presses, fault injection, timers) fire in time
+    order while the clock is advanced, the same way an interrupt would land in
+    the middle of a ``sleep`` on the real board.
+
+    With ``cpu_time`` set, the host CPU time the script spends between two
+    reads of the clock is charged to it as well, so code that only computes
+    takes time too. Runs are then no longer identical, and the figures are
+    CPython speeds on this machine: compare them only with each other.
+    """
+
+    def __init__(self, cpu_time=False):
+        self.now_us = 0
+        self.stop_us = None
+        self._events = []
+        self._seq = 0
+        self.busy_us = 0  # time charged to bus transfers
+        self.sleep_us = 0  # time spent in sleep/lightsleep
+        self.cpu_time = cpu_time
+        self.cpu_us = 0  # host CPU time charged (cpu_time only)
+        self._cpu_mark = None
+
+    def schedule(self, at_ms, callback):
+        self.schedule_us(int(at_ms * 1000), callback)
+
+    def schedule_us(self, at_us, callback):
+        self._seq += 1
+        heapq.heappush(self._events, (at_us, self._seq, callback))
+
+    def next_event_us(self):
+        if self._events:
+            return self._events[0][0]
+        return None
+
+    def advance(self, us):
+        target = self.now_us + max(0, int(us))
+        while self._events and self._events[0][0] <= target:
+            at_us, _, callback = heapq.heappop(self._events)
+            if at_us > self.now_us:
+                self.now_us = at_us
+            self._check_stop()
+            callback()
+        self.now_us = target
+        self._check_stop()
+
+    def charge(self, us):
+        """Account for time spent blocked in a bus transfer."""
+        self.charge_cpu()
+        self.busy_us += int(us)
+        self.advance(us)
+
+    def sleep(self, us):
+        self.charge_cpu()
+        self.sleep_us += int(us)
+        self.advance(us)
+
+    def start_cpu(self):
+        """Start counting host CPU time from now (the script starts running)."""
+        self._cpu_mark = time.process_time()
+
+    def charge_cpu(self):
+        """Advance by the host CPU time used since the last call."""
+        if not self.cpu_time or self._cpu_mark is None:
+            return
+        now = time.process_time()
+        us = int((now - self._cpu_mark) * 1000000)
+        if us <= 0:
+            return
+        self._cpu_mark += us / 1000000
+        self.cpu_us += us
+        self.advance(us)
+
+    def sleep_until_event(self, max_us):
+        """Sleep like ``machine.lightsleep``: wake early for the next event."""
+        target = self.now_us + max(0, int(max_us))
+        nxt = self.next_event_us()
+        if nxt is not None and nxt < target:
+            target = max(nxt, self.now_us)
+        self.sleep(target - self.now_us)
+
+    def _check_stop(self):
+        if self.stop_us is not None and self.now_us >= self.stop_us:
+            raise SimulationComplete()
+
+    # MicroPython style tick counters
+    def ticks_us(self):
+        self.charge_cpu()
+        return self.now_us & TICKS_MAX
+
+    def ticks_ms(self):
+        self.charge_cpu()
+        return (self.now_us // 1000) & TICKS_MAX
+
+
+def ticks_diff(end, start):
+    return ((end - start + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & TICKS_MAX
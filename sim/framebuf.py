@@ -0,0 +1,264 @@
+"""Stand-in for MicroPython's ``framebuf`` (MONO_VLSB only).
+
+Glyphs come from a deterministic pseudo font rather than the real 8x8 ROM
+font, so pixel snapshots are stable but not pixel-identical to the device.
+Every character drawn with :meth:`FrameBuffer.text` is also tracked as a
+text cell, which lets assertions ask "what does the screen say" instead of
+comparing bitmaps.
+"""
+
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+RGB565 = 1
+GS2_HMSB = 5
+GS4_HMSB = 2
+GS8 = 6
+
+import weakref
+
+_glyphs = {}
+_owners = {}  # id(buffer) -> weakref to the FrameBuffer drawing into it
+
+
+def owner_of(buffer):
+    ref = _owners.get(id(buffer))
+    fb = ref() if ref is not None else None
+    if fb is not None and fb.buf is buffer:
+        return fb
+    return None
+
+
+# byte -> the part of it that stays in its page / spills into the next one,
+# when it is moved down by 0-7 rows
+_SHIFT_LOW = [bytes((b << shift) & 0xFF for b in range(256)) for shift in range(8)]
+_SHIFT_HIGH = [bytes((b << shift) >> 8 for b in range(256)) for shift in range(8)]
+
+
+def _or_into(mem, start, data):
+    end = start + len(data)
+    mem[start:end] = (int.from_bytes(mem[start:end], "little")
+                      | int.from_bytes(data, "little")).to_bytes(len(data), "little")
+
+
+class TrackedBuffer(bytearray):
+    """Display buffer that notices whole-frame copies from another framebuffer.
+
+    ``target[:] = layer_buffer`` is a plain memory copy on the device; here it
+    also carries the text cells of the framebuffer that drew ``layer_buffer``.
+    """
+
+    def __setitem__(self, key, value):
+        bytearray.__setitem__(self, key, value)
+        if isinstance(key, slice) and key.start is None and key.stop is None:
+            target = owner_of(self)
+            source = owner_of(value)
+            if target is not None:
+                target.cells = dict(source.cells) if source is not None else {}
+
+
+def glyph(code):
+    """Eight column bytes for a character code (bit 0 is the top row)."""
+    cols = _glyphs.get(code)
+    if cols is None:
+        if code == 0x20:
+            cols = bytes(8)
+        else:
+            seed = (code * 2654435761) & 0xFFFFFFFF
+            out = bytearray(8)
+            for i in range(1, 7):
+                seed = (seed * 1103515245 + 12345) & 0xFFFFFFFF
+                out[i] = ((seed >> 16) & 0x7E) | 0x01
+            cols = bytes(out)
+        _glyphs[code] = cols
+    return cols
+
+
+def _codes(s):
+    if isinstance(s, str):
+        return [ord(ch) for ch in s]
+    return list(bytes(s))
+
+
+class FrameBuffer:
+    def __init__(self, buffer, width, height, format=MONO_VLSB, stride=None):
+        if format != MONO_VLSB:
+            raise ValueError("only MONO_VLSB is simulated")
+        self.buf = buffer
+        # writes go through a memoryview so TrackedBuffer hooks only see
+        # whole-buffer copies made by the code under test
+        self._mem = memoryview(buffer).cast("B") if not isinstance(buffer, memoryview) else buffer
+        _owners[id(buffer)] = weakref.ref(self)
+        self.width = width
+        self.height = height
+        self.stride = stride or width
+        self.cells = {}
+
+    # pixel access
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None if c is None else None
+        index = (y >> 3) * self.stride + x
+        bit = 1 << (y & 7)
+        if c is None:
+            return 1 if self._mem[index] & bit else 0
+        if c:
+            self._mem[index] |= bit
+        else:
+            self._mem[index] &= ~bit & 0xFF
+        return None
+
+    def fill(self, c):
+        value = 0xFF if c else 0x00
+        pages = (self.height + 7) >> 3
+        self._mem[: pages * self.stride] = bytes([value]) * (pages * self.stride)
+        self.cells.clear()
+
+    def fill_rect(self, x, y, w, h, c):
+        x0 = max(0, x)
+        y0 = max(0, y)
+        x1 = min(self.width, x + w)
+        y1 = min(self.height, y + h)
+        if x0 >= x1 or y0 >= y1:
+            return
+        for yy in range(y0, y1):
+            bit = 1 << (yy & 7)
+            row = (yy >> 3) * self.stride
+            if c:
+                for xx in range(x0, x1):
+                    self._mem[row + xx] |= bit
+            else:
+                mask = ~bit & 0xFF
+                for xx in range(x0, x1):
+                    self._mem[row + xx] &= mask
+        self._forget(x0, y0, x1, y1)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def hline(self, x, y, w, c):
+        for xx in range(x, x + w):
+            self.pixel(xx, y, c)
+
+    def vline(self, x, y, h, c):
+        for yy in range(y, y + h):
+            self.pixel(x, yy, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        dx = abs(x2 - x1)
+        dy = -abs(y2 - y1)
+        sx = 1 if x1 < x2 else -1
+        sy = 1 if y1 < y2 else -1
+        err = dx + dy
+        while True:
+            self.pixel(x1, y1, c)
+            if x1 == x2 and y1 == y2:
+                return
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x1 += sx
+            if e2 <= dx:
+                err += dx
+                y1 += sy
+
+    def text(self, s, x, y, c=1):
+        for code in _codes(s):
+            self._draw_glyph(code, x, y, c)
+            if c:
+                self.cells[(x, y)] = chr(code)
+            x += 8
+
+    def _draw_glyph(self, code, x, y, c):
+        cols = glyph(code)
+        if c and (y & 7) == 0 and 0 <= y < self.height and 0 <= x and x + 8 <= self.width:
+            base = (y >> 3) * self.stride + x
+            buf = self._mem
+            for i in range(8):
+                buf[base + i] |= cols[i]
+            return
+        for i in range(8):
+            bits = cols[i]
+            col = 0
+            while bits:
+                if bits & 1:
+                    self.pixel(x + i, y + col, c)
+                bits >>= 1
+                col += 1
+
+    def scroll(self, dx, dy):
+        old = bytes(self.buf)
+        src = FrameBuffer(bytearray(old), self.width, self.height, MONO_VLSB, self.stride)
+        pages = (self.height + 7) >> 3
+        for i in range(pages * self.stride):
+            self._mem[i] = 0
+        for yy in range(self.height):
+            for xx in range(self.width):
+                if src.pixel(xx, yy):
+                    self.pixel(xx + dx, yy + dy, 1)
+        cells = {}
+        for (cx, cy), ch in self.cells.items():
+            cells[(cx + dx, cy + dy)] = ch
+        self.cells = cells
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        src_w = fbuf.width
+        src_h = fbuf.height
+        x0 = max(0, x)
+        y0 = max(0, y)
+        x1 = min(self.width, x + src_w)
+        y1 = min(self.height, y + src_h)
+        if x0 >= x1 or y0 >= y1:
+            return
+        if key == -1:
+            self._forget(x0, y0, x1, y1)
+        if (key == -1 and (y & 7) == 0 and y >= 0 and (src_h & 7) == 0
+                and isinstance(fbuf, FrameBuffer)):
+            for page in range((y1 - y) >> 3):
+                dst_row = ((y >> 3) + page) * self.stride
+                src_row = page * fbuf.stride - x
+                self._mem[dst_row + x0:dst_row + x1] = fbuf._mem[src_row + x0:src_row + x1]
+        elif (key == 0 and (src_h & 7) == 0 and 0 <= y and y + src_h <= self.height
+                and isinstance(fbuf, FrameBuffer)):
+            # set pixels only (glyphs): OR the columns in, shifted to any row
+            shift = y & 7
+            for page in range(src_h >> 3):
+                dst_row = ((y >> 3) + page) * self.stride
+                src_row = page * fbuf.stride - x
+                cols = bytes(fbuf._mem[src_row + x0:src_row + x1])
+                _or_into(self._mem, dst_row + x0, cols.translate(_SHIFT_LOW[shift]))
+                if shift:
+                    _or_into(self._mem, dst_row + self.stride + x0, cols.translate(_SHIFT_HIGH[shift]))
+        else:
+            for yy in range(y0, y1):
+                for xx in range(x0, x1):
+                    value = fbuf.pixel(xx - x, yy - y)
+                    if value != key:
+                        self.pixel(xx, yy, value)
+        for (cx, cy), ch in fbuf.cells.items():
+            self.cells[(cx + x, cy + y)] = ch
+
+    def _forget(self, x0, y0, x1, y1):
+        if not self.cells:
+            return
+        for key in [k for k in self.cells
+                    if k[0] < x1 and k[0] + 8 > x0 and k[1] < y1 and k[1] + 8 > y0]:
+            del self.cells[key]
+
+    # simulation helpers
+    def text_lines(self):
+        """Group text cells into ``{y: [(x, "string"), ...]}`` runs."""
+        rows = {}
+        for (x, y), ch in sorted(self.cells.items(), key=lambda item: (item[0][1], item[0][0])):
+            runs = rows.setdefault(y, [])
+            if runs and runs[-1][0] + 8 * len(runs[-1][1]) == x:
+                runs[-1] = (runs[-1][0], runs[-1][1] + ch)
+            else:
+                runs.append((x, ch))
+        return rows
@@ -0,0 +1,56 @@
+"""Stand-in for MicroPython's ``gc``.
+
+CPython has no fixed-size heap. ``mem_alloc`` reports the bytes traced by
+:mod:`tracemalloc` while it is running (CPython allocations, only a proxy
+for the MicroPython heap) and 0 otherwise. ``collect`` only counts calls and
+charges a nominal pause to the virtual clock so GC instrumentation sees
+something plausible.
+"""
+
+import tracemalloc
+
+from . import board
+
+HEAP_SIZE = 192 * 1024
+COLLECT_PAUSE_US = 1500
+
+_threshold = -1
+_enabled = True
+
+
+def collect():
+    current = board.current
+    current.gc_collections = getattr(current, "gc_collections", 0) + 1
+    current.clock.charge(COLLECT_PAUSE_US)
+    return 0
+
+
+def mem_alloc():
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0]
+    return 0
+
+
+def mem_free():
+    return HEAP_SIZE - mem_alloc()
+
+
+def threshold(amount=None):
+    global _threshold
+    if amount is None:
+        return _threshold
+    _threshold = amount
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def isenabled():
+    return _enabled
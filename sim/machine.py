@@ -0,0 +1,243 @@
+"""Stand-in for MicroPython's ``machine`` module on the RP2040.
+
+Only the surface used by the clock is modelled, but the pieces that matter
+for timing are honest: SPI and I2C transfers cost bus time on the virtual
+clock, pin interrupts fire on edges, and ``lightsleep`` wakes on the next
+scheduled event.
+"""
+
+import errno
+
+from . import board
+
+_EIO = errno.EIO
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, pin_id, mode=-1, pull=-1, value=None):
+        self.id = pin_id
+        self.mode = mode
+        self.pull = pull
+        self._level = 1 if pull == Pin.PULL_UP else 0
+        if value is not None:
+            self._level = 1 if value else 0
+        self._handler = None
+        self._trigger = 0
+        self.irq_count = 0
+        board.current.pins[pin_id] = self
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if mode != -1:
+            self.mode = mode
+        if value is not None:
+            self._level = 1 if value else 0
+
+    def value(self, level=None):
+        if level is None:
+            return self._level
+        self._level = 1 if level else 0
+        return None
+
+    def __call__(self, level=None):
+        return self.value(level)
+
+    def on(self):
+        self._level = 1
+
+    def off(self):
+        self._level = 0
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False, wake=None):
+        self._handler = handler
+        self._trigger = trigger
+        return self
+
+    # simulation side
+    def drive(self, level):
+        """Change the external level of the pin, firing the IRQ on an edge."""
+        level = 1 if level else 0
+        previous = self._level
+        self._level = level
+        if previous == level or self._handler is None:
+            return
+        edge = Pin.IRQ_RISING if level else Pin.IRQ_FALLING
+        if self._trigger & edge:
+            self.irq_count += 1
+            self._handler(self)
+
+
+class SPI:
+    MSB = 0
+    LSB = 1
+
+    def __init__(self, spi_id, baudrate=1000000, polarity=0, phase=0, bits=8,
+                 firstbit=MSB, sck=None, mosi=None, miso=None):
+        self.id = spi_id
+        self.baudrate = baudrate
+        self.bytes_written = 0
+        self.transfers = 0
+        board.current.spi_buses.append(self)
+
+    def init(self, baudrate=None, polarity=0, phase=0, **kwargs):
+        if baudrate is not None:
+            self.baudrate = baudrate
+
+    def deinit(self):
+        pass
+
+    def write(self, buf):
+        n = len(buf)
+        self.bytes_written += n
+        self.transfers += 1
+        board.current.clock.charge(n * 8 * 1000000 // self.baudrate)
+
+    def read(self, n, write=0x00):
+        self.write(bytes(n))
+        return bytes(n)
+
+    def write_readinto(self, write_buf, read_buf):
+        self.write(write_buf)
+        for i in range(len(read_buf)):
+            read_buf[i] = 0
+
+
+class I2C:
+    def __init__(self, i2c_id, scl=None, sda=None, freq=400000, timeout=50000):
+        self.id = i2c_id
+        self.freq = freq
+        self.transactions = 0
+        self.bytes = 0
+        self.errors = 0
+        self.fault = None  # callable(op, address) -> errno or None
+        board.current.i2c_buses.append(self)
+
+    def _begin(self, address, nbytes, op):
+        self.transactions += 1
+        self.bytes += nbytes
+        # address byte + payload, 9 clocks per byte including ACK
+        board.current.clock.charge((nbytes + 1) * 9 * 1000000 // self.freq)
+        if self.fault is not None:
+            code = self.fault(op, address)
+            if code:
+                self.errors += 1
+                raise OSError(code)
+        device = board.current.i2c_devices.get(address)
+        if device is None:
+            self.errors += 1
+            raise OSError(_EIO)
+        return device
+
+    def scan(self):
+        return sorted(board.current.i2c_devices)
+
+    def writeto(self, address, buf, stop=True):
+        device = self._begin(address, len(buf), "write")
+        device.i2c_write(address, bytes(buf))
+        return len(buf)
+
+    def readfrom(self, address, nbytes, stop=True):
+        device = self._begin(address, nbytes, "read")
+        return bytes(device.i2c_read(address, nbytes))
+
+    def readfrom_into(self, address, buf, stop=True):
+        device = self._begin(address, len(buf), "read")
+        data = device.i2c_read(address, len(buf))
+        buf[:] = data
+
+    def readfrom_mem(self, address, memaddr, nbytes, addrsize=8):
+        device = self._begin(address, nbytes + 1, "read")
+        return bytes(device.i2c_read_mem(address, memaddr, nbytes))
+
+    def readfrom_mem_into(self, address, memaddr, buf, addrsize=8):
+        device = self._begin(address, len(buf) + 1, "read")
+        buf[:] = device.i2c_read_mem(address, memaddr, len(buf))
+
+    def writeto_mem(self, address, memaddr, buf, addrsize=8):
+        device = self._begin(address, len(buf) + 1, "write")
+        device.i2c_write_mem(address, memaddr, bytes(buf))
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, timer_id=-1, mode=PERIODIC, period=-1, freq=-1, callback=None):
+        self._generation = 0
+        self._active = False
+        board.current.timers.append(self)
+        if callback is not None:
+            self.init(mode=mode, period=period, freq=freq, callback=callback)
+
+    def init(self, mode=PERIODIC, period=-1, freq=-1, callback=None):
+        self.deinit()
+        if freq > 0:
+            period = 1000 // freq
+        self._mode = mode
+        self._period = max(1, period)
+        self._callback = callback
+        self._active = True
+        self._arm()
+
+    def _arm(self):
+        generation = self._generation
+        clock = board.current.clock
+        clock.schedule_us(clock.now_us + self._period * 1000, lambda: self._fire(generation))
+
+    def _fire(self, generation):
+        if generation != self._generation or not self._active:
+            return
+        if self._mode == Timer.PERIODIC:
+            self._arm()
+        else:
+            self._active = False
+        self._callback(self)
+
+    def deinit(self):
+        self._generation += 1
+        self._active = False
+
+
+def lightsleep(ms=None):
+    clock = board.current.clock
+    board.current.lightsleeps += 1
+    if ms is None:
+        ms = 24 * 3600 * 1000
+    clock.sleep_until_event(ms * 1000)
+
+
+def deepsleep(ms=None):
+    lightsleep(ms)
+
+
+def idle():
+    board.current.clock.sleep_until_event(1000)
+
+
+def disable_irq():
+    state = board.current.irq_enabled
+    board.current.irq_enabled = False
+    return state
+
+
+def enable_irq(state=True):
+    board.current.irq_enabled = state
+
+
+def freq(hz=None):
+    return 125000000
+
+
+def unique_id():
+    return b"\xe6\x61\x41\x04\x03\x30\x2a\x2f"
+
+
+def reset():
+    raise SystemExit("machine.reset()")
@@ -0,0 +1,42 @@
+"""Stand-in for the ``micropython`` module."""
+
+from . import board
+
+
+def const(value):
+    return value
+
+
+def native(func):
+    return func
+
+
+def viper(func):
+    return func
+
+
+def schedule(func, arg):
+    """Run a soft-IRQ callback. The simulation has no bytecode boundary to
+    wait for, so the callback runs immediately."""
+    board.current.scheduled += 1
+    func(arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def heap_lock():
+    pass
+
+
+def heap_unlock():
+    return 0
+
+
+def kbd_intr(char):
+    pass
+
+
+def mem_info(verbose=False):
+    print("mem: simulated")
@@ -0,0 +1,209 @@
+"""Register-level model of the RDA5807M FM tuner used by the clock.
+
+Two I2C personalities are modelled, as on the real part:
+
+* ``0x10`` sequential access: writes start at register 02h, reads start at
+  register 0Ah, and both wrap at 40h.
+* ``0x11`` random access: ``readfrom_mem``/``writeto_mem`` on any register.
+
+Stations are a ``{channel: Station}`` map where ``channel`` counts 100 kHz
+steps above 87.0 MHz. Tune and seek completion (STC) and RDS group arrival
+follow the virtual clock.
+"""
+
+from . import board
+
+REG_COUNT = 0x40
+WRITE_BASE = 0x02
+READ_BASE = 0x0A
+
+TUNE_US = 10000  # time for a tune to settle
+SEEK_STEP_US = 8000  # time spent per channel while seeking
+RDS_GROUP_US = 87600  # 1187.5 bit/s, 104 bits per group
+CHANNEL_COUNT = 211  # 87.0 .. 108.0 MHz
+
+
+class Station:
+    def __init__(self, rssi=50, stereo=True, ps="", rt="", pi=0x1000):
+        self.rssi = rssi
+        self.stereo = stereo
+        self.ps = (ps + " " * 8)[:8]
+        self.rt = (rt + " " * 64)[:64]
+        self.pi = pi
+
+
+def default_stations():
+    return {
+        203: Station(58, True, "CLASSIC", "Now playing: Pachelbel - Canon in D", 0xC203),
+        141: Station(47, True, "CBC 101", "News at the top of the hour", 0xC141),
+        120: Station(40, False, "TALK", "Call in now", 0xC120),
+        30: Station(30, False, "", "", 0xC030),
+        180: Station(52, True, "JACK FM", "Playing what we want", 0xC180),
+    }
+
+
+class RDA5807:
+    def __init__(self, stations=None):
+        self.regs = [0] * REG_COUNT
+        self.regs[0x00] = 0x5804  # chip id
+        self.stations = default_stations() if stations is None else stations
+        self.readchan = 0
+        self.stc_at_us = 0
+        self.sf = False
+        self.tuned_at_us = 0
+        self.rds_consumed = -1
+        self.rds_error_every = 0  # every Nth group arrives corrupted (0: never)
+        self.writes = 0
+        self.reads = 0
+        self.powered = False
+        self.history = []  # (time_us, channel, volume, muted, powered)
+
+    # decoded view
+    @property
+    def volume(self):
+        return self.regs[0x05] & 0x0F
+
+    @property
+    def muted(self):
+        return not (self.regs[0x02] & 0x4000)
+
+    @property
+    def frequency_tenths(self):
+        return 870 + self.readchan
+
+    # I2C personalities
+    def i2c_write(self, address, data):
+        if address == 0x11:
+            if data:
+                self.i2c_write_mem(address, data[0], data[1:])
+            return
+        self.writes += 1
+        reg = WRITE_BASE
+        for i in range(0, len(data) - 1, 2):
+            self.regs[reg] = (data[i] << 8) | data[i + 1]
+            reg = (reg + 1) % REG_COUNT
+        self._apply()
+
+    def i2c_write_mem(self, address, memaddr, data):
+        self.writes += 1
+        reg = memaddr
+        for i in range(0, len(data) - 1, 2):
+            self.regs[reg] = (data[i] << 8) | data[i + 1]
+            reg = (reg + 1) % REG_COUNT
+        self._apply()
+
+    def i2c_read(self, address, nbytes):
+        if address == 0x11:
+            return self.i2c_read_mem(address, 0x00, nbytes)
+        return self._read(READ_BASE, nbytes)
+
+    def i2c_read_mem(self, address, memaddr, nbytes):
+        return self._read(memaddr, nbytes)
+
+    def _read(self, reg, nbytes):
+        self.reads += 1
+        self._refresh_status()
+        out = bytearray(nbytes)
+        touched_rds = False
+        for i in range(0, nbytes, 2):
+            value = self.regs[reg]
+            if 0x0C <= reg <= 0x0F:
+                touched_rds = True
+            out[i] = value >> 8
+            if i + 1 < nbytes:
+                out[i + 1] = value & 0xFF
+            reg = (reg + 1) % REG_COUNT
+        if touched_rds:
+            self.rds_consumed = self._group_number()
+        return bytes(out)
+
+    # chip behaviour
+    def _apply(self):
+        now = board.current.clock.now_us
+        r2 = self.regs[0x02]
+        r3 = self.regs[0x03]
+        self.powered = bool(r2 & 0x0001)
+        if self.powered and r2 & 0x0100:  # SEEK
+            self._seek(bool(r2 & 0x0200), not (r2 & 0x0080), now)
+        elif self.powered and r3 & 0x0010:  # TUNE
+            channel = r3 >> 6
+            if channel != self.readchan or self.stc_at_us == 0:
+                self.readchan = channel
+                self.tuned_at_us = now
+                self.rds_consumed = -1
+            self.sf = False
+            self.stc_at_us = now + TUNE_US
+            self.regs[0x03] = r3 & ~0x0010
+        self.history.append((now, self.readchan, self.volume, self.muted, self.powered))
+
+    def _seek(self, up, wrap, now):
+        threshold = (self.regs[0x05] >> 8) & 0x0F
+        channel = self.readchan
+        for step in range(1, CHANNEL_COUNT):
+            channel = channel + 1 if up else channel - 1
+            if channel >= CHANNEL_COUNT or channel < 0:
+                if not wrap:
+                    break
+                channel %= CHANNEL_COUNT
+            station = self.stations.get(channel)
+            if station is not None and station.rssi >= threshold * 2:
+                self.readchan = channel
+                self.sf = False
+                self.tuned_at_us = now
+                self.rds_consumed = -1
+                self.stc_at_us = now + step * SEEK_STEP_US
+                self.regs[0x02] &= ~0x0100
+                return
+        self.sf = True
+        self.stc_at_us = now + CHANNEL_COUNT * SEEK_STEP_US
+        self.regs[0x02] &= ~0x0100
+
+    def _group_number(self):
+        return (board.current.clock.now_us - self.tuned_at_us) // RDS_GROUP_US
+
+    def _refresh_status(self):
+        now = board.current.clock.now_us
+        station = self.stations.get(self.readchan) if self.powered else None
+        settled = now >= self.stc_at_us
+        status = self.readchan & 0x03FF
+        if settled and self.stc_at_us:
+            status |= 0x4000
+        if self.sf:
+            status |= 0x2000
+        if station is not None and station.stereo and settled:
+            status |= 0x0400
+        blera = blerb = 0
+        rds_enabled = self.regs[0x02] & 0x0008
+        if station is not None and settled and rds_enabled and station.ps.strip():
+            group = self._group_number()
+            if group > self.rds_consumed:
+                status |= 0x8000 | 0x1000
+            blocks, corrupt = self._group_blocks(station, group)
+            self.regs[0x0C], self.regs[0x0D], self.regs[0x0E], self.regs[0x0F] = blocks
+            if corrupt:
+                blerb = 3
+        self.regs[0x0A] = status
+        rssi = station.rssi if station is not None else 5
+        signal = (rssi & 0x7F) << 9
+        if station is not None:
+            signal |= 0x0100 | 0x0080  # FM_TRUE, FM_READY
+        self.regs[0x0B] = signal | (blera << 2) | blerb
+
+    def _group_blocks(self, station, group):
+        corrupt = self.rds_error_every and group % self.rds_error_every == self.rds_error_every - 1
+        pi = station.pi
+        if group % 3 != 2:  # 0A: programme service name
+            segment = (group - group // 3) % 4
+            b = (0x0 << 12) | (segment & 0x03)
+            c = 0xE0CD
+            d = (ord(station.ps[segment * 2]) << 8) | ord(station.ps[segment * 2 + 1])
+        else:  # 2A: radiotext
+            segment = (group // 3) % 16
+            b = (0x2 << 12) | (segment & 0x0F)
+            text = station.rt[segment * 4:segment * 4 + 4]
+            c = (ord(text[0]) << 8) | ord(text[1])
+            d = (ord(text[2]) << 8) | ord(text[3])
+        if corrupt:
+            b ^= 0x5A5A
+            d ^= 0x2121
+        return (pi, b, c, d), corrupt
@@ -0,0 +1,233 @@
+"""Stand-in for the MicroPython ``ssd1306`` driver with a modelled panel.
+
+The driver half mirrors the stock ``ssd1306.py`` (same command stream, same
+``show()``), so byte counts match the device. The panel half decodes that
+stream into GDDRAM, so a snapshot reflects what was actually transmitted
+rather than what happens to sit in the framebuffer.
+"""
+
+from .micropython import const
+
+from . import board
+from . import framebuf
+from . import utime
+
+SET_CONTRAST = const(0x81)
+SET_ENTIRE_ON = const(0xA4)
+SET_NORM_INV = const(0xA6)
+SET_DISP = const(0xAE)
+SET_MEM_ADDR = const(0x20)
+SET_COL_ADDR = const(0x21)
+SET_PAGE_ADDR = const(0x22)
+SET_DISP_START_LINE = const(0x40)
+SET_SEG_REMAP = const(0xA0)
+SET_MUX_RATIO = const(0xA8)
+SET_COM_OUT_DIR = const(0xC0)
+SET_DISP_OFFSET = const(0xD3)
+SET_COM_PIN_CFG = const(0xDA)
+SET_DISP_CLK_DIV = const(0xD5)
+SET_PRECHARGE = const(0xD9)
+SET_VCOM_DESEL = const(0xDB)
+SET_CHARGE_PUMP = const(0x8D)
+
+# commands followed by argument bytes
+_ARGS = {
+    SET_CONTRAST: 1, SET_MEM_ADDR: 1, SET_COL_ADDR: 2, SET_PAGE_ADDR: 2,
+    SET_MUX_RATIO: 1, SET_DISP_OFFSET: 1, SET_COM_PIN_CFG: 1,
+    SET_DISP_CLK_DIV: 1, SET_PRECHARGE: 1, SET_VCOM_DESEL: 1,
+    SET_CHARGE_PUMP: 1,
+}
+
+
+class SSD1306(framebuf.FrameBuffer):
+    def __init__(self, width, height, external_vcc):
+        self.width = width
+        self.height = height
+        self.external_vcc = external_vcc
+        self.pages = self.height // 8
+        self.buffer = framebuf.TrackedBuffer(self.pages * self.width)
+        super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
+        # panel model
+        self.gddram = bytearray(self.pages * self.width)
+        self.panel_cells = {}
+        self.display_on = False
+        self.contrast_level = 0x7F
+        self.cmd_bytes = 0
+        self.data_bytes = 0
+        self.show_calls = 0
+        self._pending = None
+        self._args = []
+        self._col = (0, width - 1)
+        self._page = (0, self.pages - 1)
+        self._cursor = (0, 0)
+        board.current.displays.append(self)
+        self.init_display()
+
+    def init_display(self):
+        for cmd in (
+            SET_DISP,
+            SET_MEM_ADDR, 0x00,
+            SET_DISP_START_LINE,
+            SET_SEG_REMAP | 0x01,
+            SET_MUX_RATIO, self.height - 1,
+            SET_COM_OUT_DIR | 0x08,
+            SET_DISP_OFFSET, 0x00,
+            SET_COM_PIN_CFG, 0x02 if self.width > 2 * self.height else 0x12,
+            SET_DISP_CLK_DIV, 0x80,
+            SET_PRECHARGE, 0x22 if self.external_vcc else 0xF1,
+            SET_VCOM_DESEL, 0x30,
+            SET_CONTRAST, 0xFF,
+            SET_ENTIRE_ON,
+            SET_NORM_INV,
+            SET_CHARGE_PUMP, 0x10 if self.external_vcc else 0x14,
+            SET_DISP | 0x01,
+        ):
+            self.write_cmd(cmd)
+        self.fill(0)
+        self.show()
+
+    def poweroff(self):
+        self.write_cmd(SET_DISP)
+
+    def poweron(self):
+        self.write_cmd(SET_DISP | 0x01)
+
+    def contrast(self, contrast):
+        self.write_cmd(SET_CONTRAST)
+        self.write_cmd(contrast)
+
+    def invert(self, invert):
+        self.write_cmd(SET_NORM_INV | (invert & 1))
+
+    def rotate(self, rotate):
+        self.write_cmd(SET_COM_OUT_DIR | ((rotate & 1) << 3))
+        self.write_cmd(SET_SEG_REMAP | (rotate & 1))
+
+    def show(self):
+        self.show_calls += 1
+        x0 = 0
+        x1 = self.width - 1
+        if self.width != 128:
+            col_offset = (128 - self.width) // 2
+            x0 += col_offset
+            x1 += col_offset
+        self.write_cmd(SET_COL_ADDR)
+        self.write_cmd(x0)
+        self.write_cmd(x1)
+        self.write_cmd(SET_PAGE_ADDR)
+        self.write_cmd(0)
+        self.write_cmd(self.pages - 1)
+        self.write_data(self.buffer)
+
+    # panel side
+    def _panel_cmd(self, byte):
+        self.cmd_bytes += 1
+        if self._pending is not None:
+            self._args.append(byte)
+            if len(self._args) < _ARGS[self._pending]:
+                return
+            cmd, args = self._pending, self._args
+            self._pending = None
+            self._args = []
+            if cmd == SET_COL_ADDR:
+                self._col = (args[0], args[1])
+                self._cursor = (self._page[0], args[0])
+            elif cmd == SET_PAGE_ADDR:
+                self._page = (args[0], args[1])
+                self._cursor = (args[0], self._col[0])
+            elif cmd == SET_CONTRAST:
+                self.contrast_level = args[0]
+            return
+        if byte in _ARGS:
+            self._pending = byte
+            self._args = []
+        elif byte & 0xFE == SET_DISP:
+            self.display_on = bool(byte & 0x01)
+
+    def _panel_data(self, buf):
+        data = bytes(buf)
+        self.data_bytes += len(data)
+        page, col = self._cursor
+        first, last = self._col
+        touched = {}  # page -> [first, last] column written
+        i = 0
+        while i < len(data):
+            n = min(len(data) - i, max(1, last + 1 - col))
+            start = page * self.width + col
+            self.gddram[start:start + n] = data[i:i + n]
+            span = touched.setdefault(page, [col, col + n - 1])
+            span[0] = min(span[0], col)
+            span[1] = max(span[1], col + n - 1)
+            i += n
+            col += n
+            if col > last:
+                col = first
+                page += 1
+                if page > self._page[1]:
+                    page = self._page[0]
+        self._cursor = (page, col)
+
+        def hit(key):  # the 8x8 cell at key overlaps a written span
+            x, y = key
+            for page in (y >> 3, (y + 7) >> 3):
+                span = touched.get(page)
+                if span is not None and x <= span[1] and x + 8 > span[0]:
+                    return True
+            return False
+        for key in [k for k in self.panel_cells if hit(k)]:
+            del self.panel_cells[key]
+        for key, ch in self.cells.items():
+            if hit(key):
+                self.panel_cells[key] = ch
+
+    def panel_text(self):
+        """Text visible on the panel as ``{y: [(x, "string"), ...]}``."""
+        rows = {}
+        for (x, y), ch in sorted(self.panel_cells.items(), key=lambda item: (item[0][1], item[0][0])):
+            runs = rows.setdefault(y, [])
+            if runs and runs[-1][0] + 8 * len(runs[-1][1]) == x:
+                runs[-1] = (runs[-1][0], runs[-1][1] + ch)
+            else:
+                runs.append((x, ch))
+        # blank glyphs leave no pixels behind, so trailing spaces are not reliable
+        for y in list(rows):
+            rows[y] = [(x, text.rstrip()) for x, text in rows[y] if text.strip()]
+            if not rows[y]:
+                del rows[y]
+        return rows
+
+
+class SSD1306_SPI(SSD1306):
+    def __init__(self, width, height, spi, dc, res, cs, external_vcc=False):
+        self.rate = 10 * 1024 * 1024
+        dc.init(dc.OUT, value=0)
+        res.init(res.OUT, value=0)
+        cs.init(cs.OUT, value=1)
+        self.spi = spi
+        self.dc = dc
+        self.res = res
+        self.cs = cs
+        self.res(1)
+        utime.sleep_ms(1)
+        self.res(0)
+        utime.sleep_ms(10)
+        self.res(1)
+        super().__init__(width, height, external_vcc)
+
+    def write_cmd(self, cmd):
+        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+        self.cs(1)
+        self.dc(0)
+        self.cs(0)
+        self.spi.write(bytearray([cmd]))
+        self.cs(1)
+        self._panel_cmd(cmd)
+
+    def write_data(self, buf):
+        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+        self.cs(1)
+        self.dc(1)
+        self.cs(0)
+        self.spi.write(buf)
+        self.cs(1)
+        self._panel_data(buf)
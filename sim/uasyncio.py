@@ -0,0 +1,332 @@
+"""Stand-in for MicroPython's ``uasyncio`` running on the virtual clock.
+
+A small cooperative kernel: tasks are plain coroutines, sleeping tasks wait
+in a heap keyed on virtual wake-up time, and when nothing is runnable the
+clock jumps straight to the next wake-up or scheduled interrupt. A
+``ThreadSafeFlag`` set from a (simulated) IRQ wakes its waiter immediately,
+just like the real ``ipoll`` based loop.
+"""
+
+import heapq
+from collections import deque
+
+from . import board
+
+
+class CancelledError(BaseException):
+    pass
+
+
+class TimeoutError(Exception):
+    pass
+
+
+class _Sleep:
+    __slots__ = ("us",)
+
+    def __init__(self, us):
+        self.us = us
+
+    def __await__(self):
+        yield ("sleep", self.us)
+
+
+class _Wait:
+    __slots__ = ("waitable",)
+
+    def __init__(self, waitable):
+        self.waitable = waitable
+
+    def __await__(self):
+        yield ("wait", self.waitable)
+
+
+def sleep_ms(ms):
+    return _Sleep(max(0, int(ms * 1000)))
+
+
+def sleep(seconds):
+    return _Sleep(max(0, int(seconds * 1000000)))
+
+
+class Task:
+    def __init__(self, coro):
+        self.coro = coro
+        self.done = False
+        self.result = None
+        self.exception = None
+        self.waiters = []
+        self._throw = None
+        self._waiting_on = None
+        self._sleep_seq = None
+
+    def __await__(self):
+        if not self.done:
+            yield ("wait", self)
+        if self.exception is not None:
+            raise self.exception
+        return self.result
+
+    def cancel(self):
+        if self.done:
+            return False
+        self._throw = CancelledError()
+        _kernel.wake(self)
+        return True
+
+    def _finish(self, result=None, exception=None):
+        self.done = True
+        self.result = result
+        self.exception = exception
+        for waiter in self.waiters:
+            _kernel.wake(waiter)
+        self.waiters = []
+
+
+class Event:
+    def __init__(self):
+        self.state = False
+        self.waiters = []
+
+    def is_set(self):
+        return self.state
+
+    def set(self):
+        self.state = True
+        for waiter in self.waiters:
+            _kernel.wake(waiter)
+        self.waiters = []
+
+    def clear(self):
+        self.state = False
+
+    async def wait(self):
+        if not self.state:
+            await _Wait(self)
+        return True
+
+
+class ThreadSafeFlag:
+    """Set from interrupt context, waited on by a single task."""
+
+    def __init__(self):
+        self.state = False
+        self.waiters = []
+
+    def set(self):
+        self.state = True
+        for waiter in self.waiters:
+            _kernel.wake(waiter)
+        self.waiters = []
+
+    def clear(self):
+        self.state = False
+
+    async def wait(self):
+        if not self.state:
+            await _Wait(self)
+        self.state = False
+
+
+class Lock:
+    def __init__(self):
+        self.locked_ = False
+        self.waiters = []
+
+    def locked(self):
+        return self.locked_
+
+    async def acquire(self):
+        while self.locked_:
+            await _Wait(self)
+        self.locked_ = True
+        return True
+
+    def release(self):
+        self.locked_ = False
+        waiters, self.waiters = self.waiters, []
+        for waiter in waiters:
+            _kernel.wake(waiter)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *args):
+        self.release()
+
+
+class Stream:
+    """Reads a stream such as the serial console; a read waits while it is empty.
+
+    Like the real loop's ``ipoll`` on the stream, the waiting task costs
+    nothing until text arrives.
+    """
+
+    def __init__(self, stream):
+        self.s = stream
+        self._readable = ThreadSafeFlag()
+        stream.readers.append(self._readable.set)
+
+    async def read(self, n=-1):
+        while not self.s.any():
+            await self._readable.wait()
+        return self.s.read(n)
+
+    async def readline(self):
+        line = ""
+        while not line.endswith("\n"):
+            while not self.s.any():
+                await self._readable.wait()
+            line += self.s.readline()
+        return line
+
+
+StreamReader = Stream
+
+
+class _Kernel:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.ready = deque()
+        self.sleepers = []
+        self.seq = 0
+        self.current = None
+        self.steps = 0
+
+    def wake(self, task):
+        task._sleep_seq = None
+        if task._waiting_on is not None:
+            waiters = task._waiting_on.waiters
+            if task in waiters:
+                waiters.remove(task)
+            task._waiting_on = None
+        if task not in self.ready:
+            self.ready.append(task)
+
+    def spawn(self, coro):
+        task = Task(coro)
+        self.ready.append(task)
+        return task
+
+    def step(self, task):
+        self.current = task
+        self.steps += 1
+        try:
+            if task._throw is not None:
+                exc, task._throw = task._throw, None
+                op = task.coro.throw(exc)
+            else:
+                op = task.coro.send(None)
+        except StopIteration as stop:
+            task._finish(result=stop.value)
+            return
+        except CancelledError as exc:
+            task._finish(exception=exc)
+            return
+        finally:
+            self.current = None
+        kind, arg = op
+        if kind == "sleep":
+            if arg == 0:
+                self.ready.append(task)
+            else:
+                self.seq += 1
+                task._sleep_seq = self.seq
+                wake_us = board.current.clock.now_us + arg
+                heapq.heappush(self.sleepers, (wake_us, self.seq, task))
+        elif kind == "wait":
+            if isinstance(arg, Task) and arg.done:
+                self.ready.append(task)
+            elif getattr(arg, "state", False) and not isinstance(arg, (Task, Lock)):
+                self.ready.append(task)
+            else:
+                arg.waiters.append(task)
+                task._waiting_on = arg
+
+    def run_until(self, main):
+        clock = board.current.clock
+        while not main.done:
+            while self.ready:
+                self.step(self.ready.popleft())
+                if main.done:
+                    break
+            if main.done:
+                break
+            # drop sleepers that were woken or cancelled some other way
+            while self.sleepers and self.sleepers[0][2]._sleep_seq != self.sleepers[0][1]:
+                heapq.heappop(self.sleepers)
+            if self.sleepers:
+                wake_us = self.sleepers[0][0]
+                if wake_us > clock.now_us:
+                    clock.sleep_until_event(wake_us - clock.now_us)
+                while self.sleepers and self.sleepers[0][0] <= clock.now_us:
+                    _, seq, task = heapq.heappop(self.sleepers)
+                    if task._sleep_seq == seq and not task.done:
+                        task._sleep_seq = None
+                        self.ready.append(task)
+            elif not self.ready:
+                # everything is waiting on events; only an interrupt can help
+                if clock.next_event_us() is None:
+                    raise RuntimeError("deadlock: no runnable task and no pending event")
+                clock.sleep_until_event(24 * 3600 * 1000000)
+        if main.exception is not None:
+            raise main.exception
+        return main.result
+
+
+_kernel = _Kernel()
+
+
+def create_task(coro):
+    return _kernel.spawn(coro)
+
+
+def current_task():
+    return _kernel.current
+
+
+def run(coro):
+    _kernel.reset()
+    main = _kernel.spawn(coro)
+    return _kernel.run_until(main)
+
+
+async def gather(*awaitables, return_exceptions=False):
+    results = []
+    for item in awaitables:
+        if not isinstance(item, Task):
+            item = create_task(item)
+        results.append(await item)
+    return results
+
+
+async def wait_for_ms(awaitable, timeout_ms):
+    task = awaitable if isinstance(awaitable, Task) else create_task(awaitable)
+
+    async def timer():
+        await sleep_ms(timeout_ms)
+        task.cancel()
+
+    guard = create_task(timer())
+    try:
+        return await task
+    except CancelledError:
+        raise TimeoutError()
+    finally:
+        guard.cancel()
+
+
+async def wait_for(awaitable, timeout):
+    return await wait_for_ms(awaitable, int(timeout * 1000))
+
+
+def get_event_loop():
+    return _kernel
+
+
+def new_event_loop():
+    _kernel.reset()
+    return _kernel
@@ -0,0 +1,34 @@
+"""``uselect`` stand-in: polls the simulated serial console without blocking."""
+
+POLLIN = 0x0001
+POLLOUT = 0x0004
+POLLERR = 0x0008
+POLLHUP = 0x0010
+
+
+class _Poll:
+    def __init__(self):
+        self._streams = {}
+
+    def register(self, stream, eventmask=POLLIN | POLLOUT):
+        self._streams[id(stream)] = (stream, eventmask)
+
+    def unregister(self, stream):
+        self._streams.pop(id(stream), None)
+
+    def modify(self, stream, eventmask):
+        self.register(stream, eventmask)
+
+    def poll(self, timeout=-1):
+        ready = []
+        for stream, mask in self._streams.values():
+            if mask & POLLIN and stream.any():
+                ready.append((stream, POLLIN))
+        return ready
+
+    def ipoll(self, timeout=-1, flags=0):
+        return iter(self.poll(timeout))
+
+
+def poll():
+    return _Poll()
@@ -0,0 +1,36 @@
+"""Stand-in for MicroPython's ``utime`` driven by the virtual clock."""
+
+from . import board
+from .clock import ticks_add, ticks_diff  # noqa: F401  (re-exported API)
+
+
+def sleep(seconds):
+    board.current.clock.sleep(seconds * 1000000)
+
+
+def sleep_ms(ms):
+    board.current.clock.sleep(ms * 1000)
+
+
+def sleep_us(us):
+    board.current.clock.sleep(us)
+
+
+def ticks_ms():
+    return board.current.clock.ticks_ms()
+
+
+def ticks_us():
+    return board.current.clock.ticks_us()
+
+
+def ticks_cpu():
+    return board.current.clock.ticks_us()
+
+
+def time():
+    return board.current.clock.now_us // 1000000
+
+
+def time_ns():
+    return board.current.clock.now_us * 1000
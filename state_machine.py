@@ -0,0 +1,111 @@
+#
+# Table driven menu state machine for radio_alarm_clock.py
+# This file must be saved on the Pico next to radio_alarm_clock.py
+#
+# Each (state, button) pair maps to an action and a next state, and each
+# state maps to the function that draws its screen. Both lookups are a
+# single dictionary access, and the tables can be walked to check that
+# every screen can be reached and left again.
+#
+# A transition can also repeat while its button is held. Its repeat value is the
+# largest step a held button may speed up to (0 = the button does not repeat).
+#
+
+# State machine class
+class StateMachine:
+
+    def __init__( self, initial ):
+        self.initial = initial
+        self.state = initial
+        self.transitions = {} # ( state, button ) -> ( action, next state )
+        self.repeats = {} # ( state, button ) -> largest step while held
+        self.screens = {} # state -> render function
+        self.entries = [initial] # states entered from outside the table
+
+#
+# Table building
+#
+    def add( self, state, button, action, next_state = None, repeat = 0 ):
+        self.transitions[( state, button )] = ( action, next_state )
+        if repeat:
+            self.repeats[( state, button )] = repeat
+
+    def add_screen( self, state, renderer ):
+        self.screens[state] = renderer
+
+    def add_entry( self, state ): # e.g. the alarm screen, which no button leads to
+        self.entries.append( state )
+
+#
+# Run the action for a button in the current state and move to the next state.
+# Returns False when the button does nothing in this state.
+#
+    def dispatch( self, button ):
+        entry = self.transitions.get(( self.state, button ))
+        if entry is None:
+            return( False )
+        action, next_state = entry
+        if action is not None:
+            action()
+        if next_state is not None:
+            self.state = next_state
+        return( True )
+
+    def repeat_limit( self, button ): # 0 when holding the button does nothing more
+        return( self.repeats.get(( self.state, button ), 0 ))
+
+    def render( self ):
+        self.screens[self.state]()
+
+#
+# Introspection
+#
+    def states( self ):
+        found = set( self.screens )
+        for ( state, button ), ( action, next_state ) in self.transitions.items():
+            found.add( state )
+            if next_state is not None:
+                found.add( next_state )
+        return( sorted( found ))
+
+    def edges( self ): # sorted ( state, button, action name, next state ) tuples
+        result = []
+        for ( state, button ), ( action, next_state ) in self.transitions.items():
+            if action is None:
+                name = None
+            else:
+                name = action.__name__
+            if next_state is None:
+                next_state = state
+            result.append(( state, button, name, next_state ))
+        result.sort()
+        return( result )
+
+    def reachable( self ): # states that can be reached from the entry states
+        seen = set( self.entries )
+        todo = list( self.entries )
+        while todo:
+            state = todo.pop()
+            for ( source, button, name, target ) in self.edges():
+                if source == state and target not in seen:
+                    seen.add( target )
+                    todo.append( target )
+        return( seen )
+
+    def unreachable( self ):
+        seen = self.reachable()
+        return( [state for state in self.states() if state not in seen] )
+
+    def stuck( self ): # states from which the initial state can no longer be reached
+        back = set([self.initial])
+        changed = True
+        while changed:
+            changed = False
+            for ( source, button, name, target ) in self.edges():
+                if target in back and source not in back:
+                    back.add( source )
+                    changed = True
+        return( [state for state in self.states() if state not in back] )
+
+    def missing_screens( self ):
+        return( [state for state in self.states() if state not in self.screens] )
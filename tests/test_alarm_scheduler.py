@@ -0,0 +1,153 @@
+"""Alarms in a min-heap: weekly recurrence, snoozes, edits and a clock that is set."""
+
+import contextlib
+import io
+
+import pytest
+
+from alarm_scheduler import (AlarmScheduler, EVERY_DAY, KIND_ONCE, KIND_SNOOZE, KIND_WEEKLY,
+                             SECONDS_PER_DAY, WEEKDAYS, WEEKEND)
+from sim import Simulation
+
+DAY = SECONDS_PER_DAY
+HOUR = 3600
+
+
+def fired(alarms, start, end):
+    """(time, id) of every alarm that goes off when due() is called each second."""
+    out = []
+    for now in range(start, end):
+        alarm_id = alarms.due(now)
+        if alarm_id >= 0:
+            out.append((now, alarm_id))
+    return out
+
+
+def test_once_fires_at_its_next_occurrence_and_is_removed():
+    alarms = AlarmScheduler()
+    now = 8 * HOUR
+    early = alarms.add_once(7 * HOUR, now)  # already past today: tomorrow
+    late = alarms.add_once(9 * HOUR, now)
+    assert alarms.get(early)[3] == DAY + 7 * HOUR
+    assert alarms.next_fire() == 9 * HOUR
+    assert alarms.due(9 * HOUR - 1) == -1
+    assert alarms.due(9 * HOUR) == late
+    assert alarms.get(late) is None
+    assert alarms.due(DAY + 7 * HOUR + 5) == early  # a late check still fires
+    assert alarms.pending() == 0
+    assert alarms.next_fire() == -1
+
+
+def test_an_alarm_for_the_current_minute_still_fires():
+    alarms = AlarmScheduler()
+    alarm_id = alarms.add_once(7 * HOUR, 7 * HOUR + 30)
+    assert alarms.next_fire() == 7 * HOUR
+    assert alarms.due(7 * HOUR + 31) == alarm_id
+
+
+def test_weekly_alarm_fires_on_its_days_only():
+    alarms = AlarmScheduler(start_weekday=0)  # day 0 is a Monday
+    weekdays = alarms.add_weekly(6 * HOUR + 30 * 60, WEEKDAYS, 0)
+    weekend = alarms.add_weekly(9 * HOUR, WEEKEND, 0)
+    days = [(now // DAY, alarm_id) for now, alarm_id in fired(alarms, 0, 14 * DAY)]
+    assert days == [(0, weekdays), (1, weekdays), (2, weekdays), (3, weekdays), (4, weekdays),
+                    (5, weekend), (6, weekend),
+                    (7, weekdays), (8, weekdays), (9, weekdays), (10, weekdays), (11, weekdays),
+                    (12, weekend), (13, weekend)]
+    assert alarms.pending() == 2
+    assert alarms.get(weekdays)[3] == 14 * DAY + 6 * HOUR + 30 * 60
+
+
+def test_weekly_alarm_needs_a_day():
+    with pytest.raises(ValueError):
+        AlarmScheduler().add_weekly(6 * HOUR, 0, 0)
+
+
+def test_moving_the_weekday_reschedules_weekly_alarms():
+    alarms = AlarmScheduler(start_weekday=0)
+    saturday = alarms.add_weekly(8 * HOUR, 1 << 5, 0)
+    assert alarms.get(saturday)[3] == 5 * DAY + 8 * HOUR
+    alarms.set_weekday(0, 5, 0)  # today is a Saturday after all
+    assert alarms.weekday(0) == 5
+    assert alarms.get(saturday)[3] == 8 * HOUR
+    assert alarms.due(8 * HOUR) == saturday
+
+
+def test_snooze_fires_once_at_its_absolute_time():
+    alarms = AlarmScheduler()
+    weekly = alarms.add_weekly(7 * HOUR, EVERY_DAY, 0)
+    assert alarms.due(7 * HOUR) == weekly
+    snooze = alarms.add_snooze(7 * HOUR + 9 * 60)
+    assert alarms.next_fire() == 7 * HOUR + 9 * 60
+    assert fired(alarms, 7 * HOUR, DAY) == [(7 * HOUR + 9 * 60, snooze)]
+    assert alarms.get(snooze) is None
+    assert alarms.get(weekly)[3] == DAY + 7 * HOUR  # the alarm itself is unchanged
+
+
+def test_edit_leaves_a_stale_entry_that_never_fires():
+    alarms = AlarmScheduler()
+    alarm_id = alarms.add_once(7 * HOUR, 0)
+    alarms.edit(alarm_id, 8 * HOUR, 0)
+    assert len(alarms.heap) == 2  # the old entry is not searched for
+    assert alarms.next_fire() == 8 * HOUR
+    assert len(alarms.heap) == 1  # ... and thrown away when it reaches the head
+    assert fired(alarms, 0, DAY) == [(8 * HOUR, alarm_id)]
+
+
+def test_editing_back_and_forth_fires_only_the_current_version():
+    alarms = AlarmScheduler()
+    alarm_id = alarms.add_weekly(7 * HOUR, EVERY_DAY, 0)
+    alarms.edit(alarm_id, 9 * HOUR, 0)
+    alarms.edit(alarm_id, 7 * HOUR, 0, days=WEEKEND)
+    # three entries carry the same id, only the newest version counts
+    assert sorted(fire for fire, i, version in alarms.heap) == [7 * HOUR, 9 * HOUR, 5 * DAY + 7 * HOUR]
+    assert fired(alarms, 0, 7 * DAY) == [(5 * DAY + 7 * HOUR, alarm_id), (6 * DAY + 7 * HOUR, alarm_id)]
+
+
+def test_deleted_alarms_do_not_fire():
+    alarms = AlarmScheduler()
+    keep = alarms.add_once(8 * HOUR, 0)
+    gone = alarms.add_once(7 * HOUR, 0)
+    alarms.add_snooze(7 * HOUR + 5 * 60)
+    alarms.add_snooze(7 * HOUR + 10 * 60)
+    alarms.delete(gone)
+    alarms.delete_kind(KIND_SNOOZE)
+    alarms.delete(12345)  # unknown ids are ignored
+    assert alarms.ids() == [keep]
+    assert fired(alarms, 0, DAY) == [(8 * HOUR, keep)]
+
+
+def test_setting_the_clock_reschedules_and_shifts_snoozes():
+    alarms = AlarmScheduler()
+    daily = alarms.add_weekly(7 * HOUR, EVERY_DAY, 0)
+    snooze = alarms.add_snooze(6 * HOUR + 10 * 60)
+    now = 6 * HOUR
+    # the clock is set two hours ahead: the daily alarm moves to tomorrow,
+    # the snooze still goes off ten minutes from now
+    alarms.reschedule(now + 2 * HOUR, 2 * HOUR)
+    assert alarms.get(daily)[3] == DAY + 7 * HOUR
+    assert alarms.get(snooze)[3] == 8 * HOUR + 10 * 60
+    assert len(alarms.heap) == 2
+    assert fired(alarms, now + 2 * HOUR, DAY + 8 * HOUR) == [(8 * HOUR + 10 * 60, snooze),
+                                                             (DAY + 7 * HOUR, daily)]
+
+
+def test_report_shows_the_last_alarm_that_went_off():
+    alarms = AlarmScheduler()
+    assert alarms.report() == "alarms:0 heap:0 next:-1 last:-1/-1"
+    weekly = alarms.add_weekly(7 * HOUR, EVERY_DAY, 0)
+    alarms.due(7 * HOUR)
+    assert alarms.report() == "alarms:1 heap:1 next:{} last:{}/{}".format(
+        DAY + 7 * HOUR, weekly, KIND_WEEKLY)
+    once = alarms.add_once(8 * HOUR, 7 * HOUR)
+    alarms.due(8 * HOUR)
+    assert alarms.report().endswith("last:{}/{}".format(once, KIND_ONCE))
+
+
+def test_the_diagnostics_dump_includes_the_alarms():
+    s = Simulation()
+    s.at(300, lambda: s.namespace["dump_diagnostics"]())
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        s.run(0.5)
+    assert s.namespace["alarms"].report() in out.getvalue()
@@ -0,0 +1,115 @@
+"""Band scan: the station index and the next/previous station tables built from it."""
+
+import contextlib
+import io
+
+import pytest
+
+from sim import Simulation
+from sim.rda5807 import Station
+
+
+def scanned(stations):
+    s = Simulation(stations=stations)
+    with contextlib.redirect_stdout(io.StringIO()):
+        s.run(0.5)
+    s.clock.stop_us = None  # drive the radio directly from here on
+    radio = s.namespace["fm_radio"]
+    radio.StartScan()
+    steps = 0
+    while radio.ScanStep():
+        s.clock.advance(s.namespace["SCAN_POLL_MS"] * 1000)
+        steps += 1
+    assert steps < 4 * s.namespace["SCAN_CHANNELS"]
+    return s, radio
+
+
+@pytest.fixture(scope="module")
+def band():
+    return scanned(None)  # the simulator's default stations
+
+
+def test_every_strong_station_is_found(band):
+    s, radio = band
+    assert radio.StationCount == 5
+    assert not radio.Scanning
+    found = [channel for channel in range(s.namespace["CHANNEL_MIN"], s.namespace["CHANNEL_MAX"] + 1)
+             if radio.IsStation(channel - s.namespace["SCAN_FIRST_CHANNEL"])]
+    assert found == sorted(s.radio.stations)
+
+
+def test_the_index_keeps_signal_and_stereo(band):
+    s, radio = band
+    first = s.namespace["SCAN_FIRST_CHANNEL"]
+    assert radio.StationIndex[203 - first] == 58 | s.namespace["SCAN_STEREO"]
+    assert radio.StationIndex[120 - first] == 40  # mono
+    assert radio.StationIndex[100 - first] == 5  # noise
+
+
+@pytest.mark.parametrize("channel, up, station", [
+    (10, True, 30),
+    (30, True, 120),
+    (100, True, 120),
+    (100, False, 30),
+    (141, False, 120),
+    (180, True, 203),
+    (203, True, 30),  # past the top of the band: back to the first station
+    (210, True, 30),
+    (30, False, 203),  # below the first station: wrap to the last one
+    (10, False, 203),
+    (0, True, 30),  # channels outside the band are clamped
+    (300, False, 203),
+])
+def test_next_and_previous_station_wrap_around_the_band(band, channel, up, station):
+    s, radio = band
+    assert radio.NextStation(channel, up) == station
+
+
+def test_the_radio_is_tuned_back_after_the_scan(band):
+    s, radio = band
+    assert radio.QueueCount == 1
+    assert radio.ServiceBus()
+    assert s.radio.regs[0x03] >> 6 == radio.Channel  # muted, so powered down until unmuted
+    assert s.radio.muted
+
+
+def test_no_station_found():
+    s, radio = scanned({})
+    assert radio.StationCount == 0
+    assert radio.NextStation(100, True) == -1
+    assert radio.NextStation(100, False) == -1
+
+
+def test_a_single_station_is_its_own_neighbour():
+    s, radio = scanned({150: Station(40)})
+    assert radio.StationCount == 1
+    assert radio.NextStation(150, True) == 150
+    assert radio.NextStation(150, False) == 150
+    assert radio.NextStation(20, False) == 150
+
+
+def test_weak_channels_and_the_shoulders_of_a_station_are_skipped():
+    s, radio = scanned({
+        60: Station(24),  # below SCAN_STRONG_RSSI
+        100: Station(50),
+        101: Station(30),  # the signal of 100 on the next channel
+        140: Station(35),
+        141: Station(35),  # two equal channels count once
+    })
+    assert radio.StationCount == 2
+    assert radio.NextStation(10, True) == 100
+    assert radio.NextStation(100, True) == 141
+    assert radio.NextStation(141, True) == 100
+
+
+def test_without_a_scan_the_switch_starts_one():
+    s = Simulation(stations={150: Station(40)})
+    s.set_switch(1, 200)  # switch on -
+    s.press(4, 400)  # radio
+    s.press(2, 800)  # station
+    s.press(2, 1200)  # next station: nothing scanned yet
+    with contextlib.redirect_stdout(io.StringIO()):
+        s.run(6)
+    radio = s.namespace["fm_radio"]
+    assert radio.Scans == 1
+    assert radio.NextStation(10, True) == 150
@@ -0,0 +1,180 @@
+"""Button events: the IRQ-side queue and the timer that debounces and repeats."""
+
+import contextlib
+import io
+import sys
+
+import pytest
+
+import sim.board
+import sim.machine
+import sim.utime
+from sim import Simulation
+
+
+@pytest.fixture
+def events(monkeypatch):
+    sim.board.install(sim.board.Board())
+    monkeypatch.setitem(sys.modules, "machine", sim.machine)
+    monkeypatch.setitem(sys.modules, "utime", sim.utime)
+    monkeypatch.delitem(sys.modules, "input_events", raising=False)
+    import input_events
+    return input_events
+
+
+def drain(queue):
+    codes = []
+    code = queue.pop()
+    while code >= 0:
+        codes.append(code)
+        code = queue.pop()
+    return codes
+
+
+def test_event_code_round_trip(events):
+    code = events.event_code(3, 1, events.EVENT_RELEASE)
+    assert events.event_button(code) == 3
+    assert events.event_switch(code) == 1
+    assert events.event_kind(code) == events.EVENT_RELEASE
+    repeat = events.event_code(2, 0, events.EVENT_REPEAT | (2 << 4))
+    assert events.event_kind(repeat) == events.EVENT_REPEAT
+    assert events.event_speed(repeat) == 2
+    assert events.event_speed(code) == 0
+
+
+def test_queue_keeps_order_and_wraps(events):
+    queue = events.InputQueue(4)
+    for round in range(3):
+        assert queue.push(1) and queue.push(2)
+        assert queue.pending() == 2
+        assert drain(queue) == [1, 2]
+    assert queue.pop() == -1
+
+
+def test_full_queue_drops_and_counts(events):
+    queue = events.InputQueue(4)  # one slot stays empty
+    assert [queue.push(code) for code in (1, 2, 3, 4, 5)] == [True, True, True, False, False]
+    assert queue.dropped == 2
+    assert queue.depth_max == 3
+    assert drain(queue) == [1, 2, 3]
+    assert queue.push(6)
+
+
+class Button:
+    def __init__(self):
+        self.level = 1  # pulled up, a press pulls it low
+        self.on_read = None
+
+    def value(self):
+        level = self.level
+        if self.on_read is not None:
+            hook, self.on_read = self.on_read, None
+            hook()
+        return level
+
+
+class Rig:
+    def __init__(self, events, **options):
+        self.events = events
+        self.queue = events.InputQueue(256)
+        self.buttons = [None, Button(), Button(), Button(), Button()]
+        self.switch = Button()
+        self.notified = 0
+        self.timer = events.ButtonTimer(self.queue, self.buttons, self.switch, self.notify, **options)
+
+    def notify(self):
+        self.notified += 1
+
+    def set(self, button, pressed):
+        self.buttons[button].level = 0 if pressed else 1
+        self.timer.edge()
+
+    def poll(self, ms):
+        for i in range(ms // self.timer.poll_ms):
+            if not self.timer.running:
+                break
+            self.timer.poll(None)
+
+    def kinds(self):
+        names = {self.events.EVENT_PRESS: "press", self.events.EVENT_RELEASE: "release",
+                 self.events.EVENT_REPEAT: "repeat"}
+        return [(self.events.event_button(code), names[self.events.event_kind(code)])
+                for code in drain(self.queue)]
+
+
+def test_press_and_release_after_debounce(events):
+    rig = Rig(events)
+    rig.set(2, True)
+    assert rig.timer.running
+    rig.poll(10)
+    assert rig.kinds() == []  # not steady for 15 ms yet
+    rig.poll(10)
+    assert rig.kinds() == [(2, "press")]
+    rig.set(2, False)
+    rig.poll(50)
+    assert rig.kinds() == [(2, "release")]
+    assert not rig.timer.running
+    assert rig.notified == 2
+
+
+def test_bounces_are_ignored(events):
+    rig = Rig(events)
+    for i in range(4):
+        rig.set(1, True)
+        rig.poll(5)
+        rig.set(1, False)
+        rig.poll(5)
+    assert rig.kinds() == []
+    assert rig.timer.bounces > 0
+    rig.poll(50)
+    assert not rig.timer.running
+
+
+def test_held_button_repeats_faster_and_faster(events):
+    rig = Rig(events)
+    rig.set(3, True)
+    rig.poll(15)
+    assert rig.kinds() == [(3, "press")]
+    rig.poll(400 - 5)
+    assert rig.kinds() == []  # nothing before long_ms
+    rig.poll(5)
+    assert rig.kinds() == [(3, "repeat")]
+    rig.poll(5000)
+    codes = drain(rig.queue)
+    assert all(events.event_kind(code) == events.EVENT_REPEAT for code in codes)
+    speeds = [events.event_speed(code) for code in [0] + codes]
+    assert speeds == sorted(speeds) and speeds[-1] == 3
+    assert (speeds.index(1), speeds.index(2), speeds.index(3)) == (6, 14, 24)
+    # the gaps shrink by repeat_step_ms each time, down to repeat_min_ms
+    held, repeats = 400, 0
+    while held <= 5400:
+        held += max(30, 120 - repeats * 10)
+        repeats += 1
+    assert len(codes) + 1 == repeats
+
+
+def test_press_between_sample_and_stop_is_not_lost(events):
+    rig = Rig(events)
+    rig.set(1, True)
+    rig.poll(20)
+    rig.set(1, False)
+    rig.poll(20)
+    assert rig.kinds() == [(1, "press"), (1, "release")]
+    # the last poll samples button 4 released, and it goes down right after:
+    # its edge finds the timer still running
+    rig.buttons[4].on_read = lambda: rig.set(4, True)
+    rig.timer.poll(None)
+    assert rig.timer.running
+    rig.poll(20)
+    assert rig.kinds() == [(4, "press")]
+
+
+def test_bounced_press_in_the_clock_is_one_press():
+    s = Simulation()
+    s.press(1, at_ms=2000, hold_ms=100, bounce=6)
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        s.run(3)
+    assert out.getvalue().count("Button 1") == 1
+    assert s.namespace["menu"].state == 1
+    assert s.namespace["button_timer"].edges > 2
+    assert not s.namespace["button_timer"].running
@@ -0,0 +1,197 @@
+"""The second core worker, on a real thread, and the radio queue lock it relies on."""
+
+import _thread
+import contextlib
+import io
+import sys
+import threading
+import time
+
+import pytest
+
+import sim.board
+import sim.utime
+from sim import Simulation
+
+
+class Panel:
+    def __init__(self):
+        self.commands = []
+
+    def contrast(self, value):
+        self.commands.append(("contrast", value))
+
+    def poweron(self):
+        self.commands.append("on")
+
+    def poweroff(self):
+        self.commands.append("off")
+
+
+class Display:
+    def __init__(self):
+        self.oled = Panel()
+        self.frames = []
+
+    def flush(self, buffer=None):
+        self.frames.append(bytes(buffer))
+
+
+class Radio:
+    """Only what the worker uses; every write is queued and goes out at once."""
+
+    def __init__(self):
+        self.QueueLock = None
+        self.QueueCount = 0
+        self.Online = True
+        self.Attempts = 0
+        self.Scanning = False
+        self.writes = 0
+        self.rds_due = False
+        self.rds_polls = 0
+
+    def ServiceBus(self):
+        if self.QueueCount == 0:
+            return False
+        self.QueueCount -= 1
+        self.writes += 1
+        return True
+
+    def RdsWanted(self):
+        return self.rds_due
+
+    def RdsRemaining(self):
+        return 0
+
+    def PollRds(self):
+        self.rds_due = False
+        self.rds_polls += 1
+        return True
+
+
+def wait_until(condition, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    sim.board.install(sim.board.Board())
+    monkeypatch.setitem(sys.modules, "utime", sim.utime)
+    monkeypatch.delitem(sys.modules, "io_worker", raising=False)
+    import io_worker
+    changed = threading.Event()
+    worker = io_worker.IOWorker(Display(), Radio(), 4, changed, True)
+    assert worker.dual
+    shown = []
+    worker.on_shown = lambda: shown.append(len(worker.display.frames))
+    worker.shown = shown
+    worker.start()
+    assert wait_until(lambda: worker.wake.locked())  # the first pass found nothing
+    yield worker
+    worker.stop()
+
+
+def blocked(worker):
+    """Core 1 waits on the wake lock and does not come round again by itself."""
+    waits = worker.waits
+    time.sleep(0.05)
+    return worker.wake.locked() and worker.waits == waits
+
+
+def test_idle_core_blocks_instead_of_polling(worker):
+    assert blocked(worker)
+
+
+def test_frames_are_sent_and_shown(worker):
+    worker.submit_frame(b"abcd")
+    assert wait_until(lambda: worker.display.frames == [b"abcd"])
+    assert wait_until(lambda: worker.shown == [1])
+    worker.submit_frame(b"efgh")
+    assert wait_until(lambda: worker.display.frames[-1] == b"efgh")
+    assert blocked(worker)
+    assert worker.frames_sent == 2
+
+
+def test_panel_commands_are_sent_from_the_worker(worker):
+    worker.poweroff()
+    worker.contrast(1)
+    assert wait_until(lambda: worker.display.oled.commands == ["off", ("contrast", 1)])
+    assert blocked(worker)
+
+
+def test_notify_runs_queued_radio_work(worker):
+    radio = worker.radio
+    with radio.QueueLock:
+        radio.QueueCount = 2
+    assert blocked(worker)  # nothing woke it yet
+    worker.notify()
+    assert wait_until(lambda: radio.writes == 2)
+    radio.rds_due = True
+    worker.notify()
+    assert wait_until(lambda: radio.rds_polls == 1)
+    assert worker.changed.is_set()
+    assert blocked(worker)
+
+
+def test_a_failed_write_is_reported(worker):
+    radio = worker.radio
+
+    def fail():
+        radio.Attempts += 1
+        return False
+    radio.ServiceBus = fail
+    worker.notify()
+    assert wait_until(worker.changed.is_set)
+
+
+class CheckedLock:
+    def __init__(self):
+        self.lock = _thread.allocate_lock()
+        self.held = False
+
+    def acquire(self):
+        self.lock.acquire()
+        self.held = True
+
+    def release(self):
+        self.held = False
+        self.lock.release()
+
+
+class CheckedBuffer(bytearray):
+    lock = None
+
+    def __setitem__(self, key, value):
+        assert self.lock.held, "changed outside the queue lock"
+        bytearray.__setitem__(self, key, value)
+
+
+def test_radio_settings_only_change_under_the_queue_lock():
+    s = Simulation()
+    with contextlib.redirect_stdout(io.StringIO()):
+        s.run(0.5)
+    s.clock.stop_us = None  # drive the radio directly from here on
+    radio = s.namespace["fm_radio"]
+    lock = CheckedLock()
+    radio.QueueLock = lock
+    CheckedBuffer.lock = lock
+    radio.Settings = CheckedBuffer(radio.Settings)
+    radio.Shadow = CheckedBuffer(radio.Shadow)
+    radio.BeginUpdate()
+    radio.SetVolume(7)
+    radio.ProgramRadio()  # deferred
+    assert radio.QueueCount == 0
+    radio.CommitUpdate()
+    assert radio.QueueCount == 1
+    assert radio.ServiceBus()
+    radio.StartScan()
+    while radio.ScanStep():
+        pass
+    assert radio.QueueCount == 1  # the end of the scan tunes back
+    assert radio.UpdateDepth == 0
+    assert not lock.held
@@ -0,0 +1,115 @@
+"""Cached screen layers: a fixed pool of buffers, least recently used one reused."""
+
+import contextlib
+import io
+import sys
+
+import pytest
+
+import sim.framebuf
+import sim.micropython
+from sim import Simulation
+
+
+@pytest.fixture
+def render(monkeypatch):
+    monkeypatch.setitem(sys.modules, "framebuf", sim.framebuf)
+    monkeypatch.setitem(sys.modules, "micropython", sim.micropython)
+    monkeypatch.delitem(sys.modules, "oled_render", raising=False)
+    import oled_render
+    return oled_render
+
+
+class Oled:
+    def __init__(self):
+        self.buffer = bytearray(128 * 64 // 8)
+
+
+def label(text):
+    def builder(fb, variant):
+        fb.text(text, 0, 8 * variant, 1)
+    return builder
+
+
+def test_layers_are_allocated_up_front(render):
+    cache = render.TemplateCache(Oled(), 128, 64, 3 * 1024)
+    assert cache.capacity == 3
+    assert len(cache.free) == 3
+    pool = {id(entry[0]) for entry in cache.free}
+    for key in range(10):
+        cache.draw(key, label("screen %d" % key))
+    assert cache.misses == 10
+    assert cache.evictions == 7
+    assert {id(entry[0]) for entry in cache.layers.values()} == pool
+
+
+def test_a_hit_copies_the_layer_without_drawing(render):
+    oled = Oled()
+    cache = render.TemplateCache(oled, 128, 64, 2 * 1024)
+    draws = []
+
+    def builder(fb, variant):
+        draws.append(variant)
+        fb.fill_rect(0, 0, 8, 8, 1)
+
+    cache.draw(1, builder, 1)
+    first = bytes(oled.buffer)
+    oled.buffer[:] = bytes(len(oled.buffer))
+    cache.draw(1, builder, 1)
+    assert draws == [1]
+    assert cache.hits == 1
+    assert bytes(oled.buffer) == first
+
+
+def test_the_least_recently_used_layer_is_redrawn_from_blank(render):
+    oled = Oled()
+    cache = render.TemplateCache(oled, 128, 64, 2 * 1024)
+    cache.draw(1, label("AAAA"))
+    cache.draw(2, label("BBBB"))
+    cache.draw(1, label("AAAA"))  # 2 is now the oldest
+    cache.draw(3, label("CC"))
+    assert sorted(cache.layers) == [1, 3]
+    expected = bytearray(len(oled.buffer))
+    sim.framebuf.FrameBuffer(expected, 128, 64, sim.framebuf.MONO_VLSB).text("CC", 0, 0, 1)
+    assert oled.buffer == expected  # nothing of "BBBB" is left
+
+
+def test_clear_returns_every_layer_to_the_pool(render):
+    cache = render.TemplateCache(Oled(), 128, 64, 4 * 1024)
+    for key in range(3):
+        cache.draw(key, label("x"))
+    cache.clear()
+    assert cache.layers == {}
+    assert len(cache.free) == 4
+    cache.draw(0, label("x"))
+    assert cache.misses == 4 and cache.evictions == 0
+
+
+def test_every_clock_screen_fits_in_the_cache():
+    s = Simulation()
+    s.send("set alarm 06:00\n", 300)  # not while the menus are walked
+    presses = [
+        3, 4,  # delete the alarm
+        1, 1,  # format, back
+        2, 1,  # time, back
+        3, 2, 1,  # alarm, edit, confirm: the alarm is set
+        3, 2, 1,  # the same two screens with an alarm set
+        3, 3, 1, 1,  # alarm, snooze, back, back
+        4, 2, 1, 3, 1, 4, 4, 1,  # radio: station, sound, mute and unmute, back
+        1, 4, 1,  # format, diagnostics, back
+    ]
+    at = 500
+    for level in (1, 0):
+        s.set_switch(level, at)
+        at += 300
+        for button in presses:
+            s.press(button, at)
+            at += 300
+    with contextlib.redirect_stdout(io.StringIO()):
+        s.run(at / 1000 + 0.5)
+    ns = s.namespace
+    templates = ns["templates"]
+    assert templates.capacity == ns["TEMPLATE_LAYERS"]
+    assert len(templates.layers) == ns["TEMPLATE_LAYERS"] - 1  # all but the ringing alarm
+    assert templates.evictions == 0
+    assert templates.misses == len(templates.layers)
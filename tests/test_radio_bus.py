@@ -0,0 +1,118 @@
+"""Radio writes: retry with backoff, offline reporting and the write queue."""
+
+import contextlib
+import errno
+import io
+
+import pytest
+
+from sim import Simulation
+
+
+@pytest.fixture
+def rig():
+    s = Simulation()
+    with contextlib.redirect_stdout(io.StringIO()):
+        s.run(0.5)
+    s.clock.stop_us = None  # drive the radio directly from here on
+    radio = s.namespace["fm_radio"]
+    assert radio.QueueCount == 0
+    return s, radio
+
+
+def queue_volume(radio, volume):
+    assert radio.SetVolume(volume)
+    radio.ProgramRadio()
+
+
+def fail_writes(radio, code=errno.EIO):
+    radio.radio_i2c.fault = lambda op, address: code if op == "write" else None
+
+
+def test_a_failed_write_backs_off_doubling(rig):
+    s, radio = rig
+    ns = s.namespace
+    fail_writes(radio)
+    queue_volume(radio, 3)
+    bus = radio.radio_i2c
+    ticks_ms, ticks_diff = ns["utime"].ticks_ms, ns["utime"].ticks_diff
+    waits = []
+    for attempt in range(1, ns["RADIO_RETRY_BUDGET"]):
+        before = bus.transactions
+        start = ticks_ms()
+        assert not radio.ServiceBus()
+        assert bus.transactions == before + 1
+        assert radio.Attempts == attempt
+        waits.append(ticks_diff(radio.NextAttempt, start))
+        # nothing touches the bus until the backoff is over
+        s.clock.advance((ticks_diff(radio.NextAttempt, ticks_ms()) - 1) * 1000)
+        assert not radio.ServiceBus()
+        assert bus.transactions == before + 1
+        s.clock.advance(1000)
+    low = ns["RADIO_BACKOFF_MIN"]
+    assert waits == [low, 2 * low, 4 * low, 8 * low]
+    assert radio.Online
+    assert radio.ErrorCounts == {errno.EIO: len(waits)}
+
+
+def test_out_of_retries_the_radio_goes_offline_and_keeps_the_newest_image(rig):
+    s, radio = rig
+    ns = s.namespace
+    fail_writes(radio, errno.ETIMEDOUT)
+    for volume in range(1, ns["RADIO_QUEUE_SIZE"] + 3):
+        queue_volume(radio, volume)
+    assert radio.QueueCount == ns["RADIO_QUEUE_SIZE"]
+    assert radio.WritesCoalesced == 2
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        for attempt in range(ns["RADIO_RETRY_BUDGET"]):
+            s.clock.advance(ns["RADIO_BACKOFF_MAX"] * 1000)
+            start = ns["utime"].ticks_ms()
+            assert not radio.ServiceBus()
+    assert out.getvalue() == "Radio offline\n"
+    assert not radio.Online
+    assert radio.QueueCount == 1
+    assert radio.WriteQueue[radio.QueueHead][7] & 0x0F == ns["RADIO_QUEUE_SIZE"] + 2
+    assert ns["utime"].ticks_diff(radio.NextAttempt, start) == ns["RADIO_BACKOFF_MAX"]
+
+
+def test_changes_made_while_offline_are_written_when_the_radio_answers(rig):
+    s, radio = rig
+    ns = s.namespace
+    fail_writes(radio)
+    queue_volume(radio, 2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for attempt in range(ns["RADIO_RETRY_BUDGET"]):
+            s.clock.advance(ns["RADIO_BACKOFF_MAX"] * 1000)
+            radio.ServiceBus()
+    assert not radio.Online
+    queue_volume(radio, 9)  # queued behind the image kept while offline
+    assert radio.QueueCount == 2
+
+    radio.radio_i2c.fault = None
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        s.clock.advance(ns["RADIO_BACKOFF_MAX"] * 1000)
+        assert radio.ServiceBus()
+        assert radio.ServiceBus()
+    assert out.getvalue() == "Radio online\n"
+    assert radio.Online
+    assert radio.Attempts == 0
+    assert radio.QueueCount == 0
+    assert radio.Shadow == radio.Settings
+    assert s.radio.volume == 9
+
+
+def test_an_unchanged_image_is_not_written_again(rig):
+    s, radio = rig
+    writes = s.radio.writes
+    skipped = radio.WritesSkipped
+    radio.ProgramRadio()
+    assert radio.QueueCount == 0
+    assert radio.WritesSkipped == skipped + 1
+    queue_volume(radio, 4)
+    queue_volume(radio, 4)
+    assert radio.QueueCount == 1
+    assert radio.ServiceBus()
+    assert not radio.ServiceBus()
+    assert s.radio.writes == writes + 1
@@ -0,0 +1,125 @@
+"""RdsDecoder: station name (0A) and RadioText (2A/2B) assembly."""
+
+from rds_decoder import RdsDecoder
+
+PI = 0xC203
+
+
+def ps_groups(name):
+    """Four 0A groups carrying an 8 character station name."""
+    name = name.ljust(8).encode()
+    return [(PI, segment, 0, (name[segment * 2] << 8) | name[segment * 2 + 1])
+            for segment in range(4)]
+
+
+def rt_groups_a(text, flag=0, end=True):
+    """2A groups, 4 characters each, with a 0x0D end marker if it fits."""
+    data = text.encode() + (b"\r" if end and len(text) < 64 else b"")
+    data = data.ljust(-(-len(data) // 4) * 4)
+    groups = []
+    for segment in range(len(data) // 4):
+        chunk = data[segment * 4:segment * 4 + 4]
+        b = (2 << 12) | (flag << 4) | segment
+        groups.append((PI, b, (chunk[0] << 8) | chunk[1], (chunk[2] << 8) | chunk[3]))
+    return groups
+
+
+def rt_groups_b(text, flag=0, end=True):
+    """2B groups, 2 characters each in block D."""
+    data = text.encode() + (b"\r" if end and len(text) < 32 else b"")
+    data = data.ljust(-(-len(data) // 2) * 2)
+    groups = []
+    for segment in range(len(data) // 2):
+        chunk = data[segment * 2:segment * 2 + 2]
+        b = (2 << 12) | 0x0800 | (flag << 4) | segment
+        groups.append((PI, b, PI, (chunk[0] << 8) | chunk[1]))
+    return groups
+
+
+def feed(decoder, groups, bler_b=0):
+    changed = False
+    for a, b, c, d in groups:
+        changed = decoder.feed(a, b, c, d, 0, bler_b) or changed
+    return changed
+
+
+def text(decoder):
+    return bytes(decoder.text[:decoder.length]).decode()
+
+
+def rt(decoder):
+    return bytes(decoder.rt[:decoder.rt_length]).decode()
+
+
+def test_station_name_needs_all_four_segments():
+    decoder = RdsDecoder()
+    groups = ps_groups("CLASSIC")
+    assert not feed(decoder, groups[:3])
+    assert text(decoder) == ""
+    assert feed(decoder, groups[3:])
+    assert text(decoder) == "CLASSIC"
+    assert decoder.ps_updates == 1
+
+
+def test_same_station_name_again_is_not_a_change():
+    decoder = RdsDecoder()
+    feed(decoder, ps_groups("JAZZ FM"))
+    assert not feed(decoder, ps_groups("JAZZ FM"))
+
+
+def test_radiotext_2a_up_to_the_end_marker():
+    decoder = RdsDecoder()
+    feed(decoder, ps_groups("CLASSIC"))
+    assert feed(decoder, rt_groups_a("Now playing: Canon in D"))
+    assert rt(decoder) == "Now playing: Canon in D"
+    assert text(decoder) == "CLASSIC  Now playing: Canon in D"
+
+
+def test_radiotext_2a_without_end_marker_fills_64_characters():
+    decoder = RdsDecoder()
+    message = "".join(chr(0x41 + i % 26) for i in range(64))
+    assert feed(decoder, rt_groups_a(message, end=False))
+    assert rt(decoder) == message
+
+
+def test_radiotext_2b_up_to_the_end_marker():
+    decoder = RdsDecoder()
+    assert feed(decoder, rt_groups_b("Traffic news"))
+    assert rt(decoder) == "Traffic news"
+
+
+def test_radiotext_2b_without_end_marker_fills_32_characters():
+    decoder = RdsDecoder()
+    message = "ABCDEFGHIJKLMNOPQRSTUVWXYZ012345"
+    assert feed(decoder, rt_groups_b(message, end=False))
+    assert rt(decoder) == message
+
+
+def test_new_text_flag_replaces_the_radiotext():
+    decoder = RdsDecoder()
+    feed(decoder, rt_groups_a("First text"))
+    assert feed(decoder, rt_groups_a("Second", flag=1))
+    assert rt(decoder) == "Second"
+
+
+def test_groups_with_a_damaged_block_b_are_dropped():
+    decoder = RdsDecoder(max_bler=1)
+    assert not feed(decoder, ps_groups("CLASSIC"), bler_b=2)
+    assert decoder.rejected == 4
+    assert text(decoder) == ""
+
+
+def test_another_pi_code_starts_over():
+    decoder = RdsDecoder()
+    feed(decoder, ps_groups("CLASSIC"))
+    decoder.feed(0x1234, 0, 0, 0x4142, 0, 0)
+    assert decoder.pi == 0x1234
+    assert text(decoder) == ""
+
+
+def test_characters_outside_ascii_become_spaces():
+    decoder = RdsDecoder()
+    groups = ps_groups("AB")
+    groups[0] = (PI, 0, 0, 0x41E9)
+    feed(decoder, groups)
+    assert text(decoder) == "A"
@@ -0,0 +1,144 @@
+"""Serial command transactions and error handling, alone and in the clock."""
+
+import contextlib
+import io
+import sys
+
+import pytest
+
+import sim.uselect
+from sim import Simulation
+from sim.board import SerialConsole
+
+
+@pytest.fixture
+def serial_commands(monkeypatch):
+    monkeypatch.setitem(sys.modules, "uselect", sim.uselect)
+    monkeypatch.delitem(sys.modules, "serial_commands", raising=False)
+    import serial_commands
+    return serial_commands
+
+
+class Recorder:
+    def __init__(self, serial_commands, **options):
+        self.calls = []
+        self.replies = []
+        self.console = SerialConsole()
+        self.serial = serial_commands.SerialCommands(
+            self.console, lambda: self.calls.append("begin"),
+            lambda: self.calls.append("commit"), **options)
+        self.serial.reply = self.replies.append
+
+    def type(self, text):
+        self.console.feed(text)
+        return self.serial.poll()
+
+
+def failing(error):
+    def handler(argument):
+        raise error
+    return handler
+
+
+def test_commands_of_one_poll_form_one_transaction(serial_commands):
+    rec = Recorder(serial_commands)
+    rec.serial.add("get", "vol", lambda argument: "vol 7")
+    rec.serial.add("set", "vol", lambda argument: None)
+    assert rec.type("get vol; set vol 3\nset vol 4\n") == 2
+    assert rec.calls == ["begin", "commit"]
+    assert rec.replies == ["vol 7", "ok", "ok"]
+    assert rec.serial.transactions == 1
+    assert rec.serial.commands == 3
+
+
+def test_nothing_waiting_opens_no_transaction(serial_commands):
+    rec = Recorder(serial_commands)
+    assert rec.type("") == 0
+    assert rec.type("\r\n\n") == 0
+    assert rec.type("get vo") == 0  # not a whole line yet
+    assert rec.calls == []
+
+
+def test_a_line_longer_than_max_chars_finishes_on_the_next_poll(serial_commands):
+    rec = Recorder(serial_commands, max_chars=8)
+    rec.serial.add("get", "vol", lambda argument: "vol 7")
+    assert rec.type("get vol;get vol\n") == 0
+    assert rec.serial.poll() == 1
+    assert rec.replies == ["vol 7", "vol 7"]
+
+
+def test_the_character_already_read_comes_first(serial_commands):
+    rec = Recorder(serial_commands)
+    rec.serial.add("get", "vol", lambda argument: "vol 7")
+    rec.console.feed("et vol\n")
+    assert rec.serial.poll("g") == 1
+    assert rec.replies == ["vol 7"]
+
+
+@pytest.mark.parametrize("error", [ValueError("use 0-15"), RuntimeError("bus"), OverflowError("big")])
+def test_a_failing_handler_is_an_error_reply_and_still_commits(serial_commands, error):
+    rec = Recorder(serial_commands)
+    rec.serial.add("set", "freq", failing(error))
+    rec.serial.add("set", "vol", lambda argument: None)
+    assert rec.type("set freq 1e999; set vol 5\n") == 1
+    assert rec.replies == ["err set freq: %s" % error, "ok"]
+    assert rec.calls == ["begin", "commit"]
+    assert rec.serial.errors == 1
+
+
+def test_unknown_command(serial_commands):
+    rec = Recorder(serial_commands)
+    rec.type("get nothing\nhello\n")
+    assert rec.replies == ["err unknown command: get nothing", "err unknown command: hello"]
+    assert rec.calls == ["begin", "commit"]
+
+
+def test_a_line_that_does_not_fit_is_dropped(serial_commands):
+    rec = Recorder(serial_commands, line_size=8, max_chars=64)
+    rec.serial.add("get", "vol", lambda argument: "vol 7")
+    rec.type("get vol; get vol; get vol\nget vol\n")
+    assert rec.replies == ["err line too long", "vol 7"]
+    assert rec.serial.errors == 1
+
+
+def test_commit_runs_when_the_stream_fails(serial_commands):
+    rec = Recorder(serial_commands)
+    rec.serial.add("get", "vol", lambda argument: "vol 7")
+    rec.console.feed("get vol\nget")
+
+    def read(n=-1, read=rec.console.read):
+        if rec.replies:
+            raise OSError("read failed")
+        return read(n)
+    rec.console.read = read
+    with pytest.raises(OSError):
+        rec.serial.poll()
+    assert rec.calls == ["begin", "commit"]
+
+
+def run_clock(lines, seconds=1.0):
+    sim = Simulation()
+    for at_ms, line in lines:
+        sim.send(line + "\n", at_ms)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        sim.run(seconds)
+    return sim, out.getvalue().splitlines()
+
+
+def test_clock_bad_frequency_leaves_no_update_open():
+    sim, out = run_clock([(500, "set freq inf; set vol 5"), (700, "set freq nan")])
+    assert "err set freq: outside 88.0-108.0" in out
+    assert out.count("err set freq: outside 88.0-108.0") == 2
+    assert sim.namespace["fm_radio"].UpdateDepth == 0
+    assert sim.namespace["radio_volume"] == 5
+    assert sim.radio.volume == 5
+
+
+def test_clock_one_radio_write_per_batch():
+    sim, out = run_clock([(600, "set vol 9; set freq 101.1; set mute 0")])
+    assert out[-3:] == ["ok", "ok", "ok"]
+    writes = [entry for entry in sim.radio.history if entry[0] >= 600000]
+    assert len(writes) == 1
+    now, channel, volume, muted, powered = writes[0]
+    assert (channel, volume, muted) == (1011 - 870, 9, False)
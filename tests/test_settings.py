@@ -0,0 +1,66 @@
+"""Settings survive a power cycle: saved by one run, loaded by the next."""
+
+import contextlib
+import io
+import os
+
+import pytest
+
+from sim import Simulation
+
+
+def run(sim, seconds):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        sim.run(seconds)
+    return out.getvalue().splitlines()
+
+
+@pytest.fixture(scope="module")
+def restarted():
+    first = Simulation()
+    # no serial command for the snooze time: change it the way the menu does
+    first.at(300, lambda: first.namespace.update(snooze_minute=12))
+    first.send("set vol 9; set freq 101.1; set mute 0; set format 24\n", 500)
+    first.send("set alarm 06:45; set day fri\n", 800)
+    out = run(first, 10)  # settings_task saves 5 s after the last change
+    assert out.count("ok") == 6
+    assert os.listdir(first.flash_dir)
+
+    second = Simulation(flash_dir=first.flash_dir)
+    run(second, 0.5)
+    return second.namespace
+
+
+def test_radio_settings(restarted):
+    assert restarted["radio_volume"] == 9
+    assert restarted["radio_channel"] == 1011 - 870
+    assert restarted["fm_radio"].Channel == 1011 - 870
+    assert restarted["mute_status"] is False
+
+
+def test_display_format(restarted):
+    assert restarted["format"] == 24
+
+
+def test_alarm(restarted):
+    assert restarted["alarm_set"] is True
+    assert restarted["alarm_seconds"] == (6 * 60 + 45) * 60
+    kind, time, days, fire = restarted["alarms"].get(restarted["primary_alarm"])
+    assert time == (6 * 60 + 45) * 60
+
+
+def test_snooze(restarted):
+    assert restarted["snooze_minute"] == 12
+
+
+def test_weekday(restarted):
+    assert restarted["alarms"].weekday(0) == 4  # Friday
+
+
+def test_a_fresh_flash_keeps_the_defaults():
+    namespace = Simulation().run(0.5).namespace
+    assert namespace["saved_settings"] is None
+    assert namespace["format"] == 12
+    assert namespace["alarm_set"] is False
+    assert namespace["snooze_minute"] == 5
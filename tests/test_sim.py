@@ -0,0 +1,134 @@
+"""The simulator itself: virtual time, the fake framebuf and the event loop."""
+
+import contextlib
+import io
+import random
+
+import pytest
+
+import sim.uasyncio
+from sim import Simulation, framebuf
+from sim.clock import SimulationComplete, VirtualClock, ticks_add, ticks_diff, TICKS_MAX
+
+
+def run_quietly(s, seconds):
+    with contextlib.redirect_stdout(io.StringIO()):
+        s.run(seconds)
+    return s
+
+
+def test_scheduled_callbacks_fire_in_time_order():
+    clock = VirtualClock()
+    fired = []
+    clock.schedule(5, lambda: fired.append((5, clock.now_us)))
+    clock.schedule(2, lambda: fired.append((2, clock.now_us)))
+    clock.schedule(2, lambda: fired.append(("2 again", clock.now_us)))
+    clock.sleep(10000)
+    assert fired == [(2, 2000), ("2 again", 2000), (5, 5000)]
+    assert clock.now_us == 10000
+    assert clock.sleep_us == 10000
+
+
+def test_sleep_until_event_wakes_early():
+    clock = VirtualClock()
+    clock.schedule(3, lambda: None)
+    clock.sleep_until_event(1000000)
+    assert clock.now_us == 3000
+
+
+def test_stop_time_ends_the_run():
+    clock = VirtualClock()
+    clock.stop_us = 1500
+    with pytest.raises(SimulationComplete):
+        clock.charge(2000)
+
+
+def test_ticks_wrap_like_micropython():
+    assert ticks_add(TICKS_MAX, 1) == 0
+    assert ticks_diff(ticks_add(TICKS_MAX, 5), TICKS_MAX) == 5
+    assert ticks_diff(0, TICKS_MAX) == 1
+
+
+def pixel_blit(dst, src, x, y, key):
+    for yy in range(max(0, y), min(dst.height, y + src.height)):
+        for xx in range(max(0, x), min(dst.width, x + src.width)):
+            value = src.pixel(xx - x, yy - y)
+            if value != key:
+                dst.pixel(xx, yy, value)
+
+
+@pytest.mark.parametrize("key", [-1, 0])
+def test_blit_fast_paths_match_the_pixel_path(key):
+    rng = random.Random(key)
+    for trial in range(300):
+        w = rng.choice([8, 16, 40])
+        h = rng.choice([8, 16])
+        src = framebuf.FrameBuffer(bytearray(rng.getrandbits(8) for i in range(w * h // 8)),
+                                   w, h, framebuf.MONO_VLSB)
+        fast = framebuf.FrameBuffer(bytearray(rng.getrandbits(8) for i in range(128 * 8)),
+                                    128, 64, framebuf.MONO_VLSB)
+        slow = framebuf.FrameBuffer(bytearray(fast.buf), 128, 64, framebuf.MONO_VLSB)
+        x = rng.randint(-20, 130)
+        y = rng.choice([rng.randint(-16, 64), 8 * rng.randint(-2, 8)])
+        fast.blit(src, x, y, key)
+        pixel_blit(slow, src, x, y, key)
+        assert bytes(fast.buf) == bytes(slow.buf), (w, h, x, y)
+
+
+def test_text_is_tracked_as_cells():
+    fb = framebuf.FrameBuffer(bytearray(128 * 8), 128, 64, framebuf.MONO_VLSB)
+    fb.text("12:30", 8, 16)
+    assert fb.text_lines() == {16: [(8, "12:30")]}
+    fb.fill_rect(8, 16, 16, 8, 0)
+    assert fb.text_lines() == {16: [(24, ":30")]}
+
+
+READER_SCRIPT = '''
+import sys
+import utime
+import uasyncio as asyncio
+
+lines = []
+
+async def main():
+    reader = asyncio.StreamReader(sys.stdin)
+    while True:
+        line = await reader.readline()
+        lines.append((utime.ticks_ms(), line))
+
+asyncio.run(main())
+'''
+
+
+def test_stream_reader_wakes_when_text_arrives(tmp_path):
+    script = tmp_path / "reader.py"
+    script.write_text(READER_SCRIPT)
+    s = Simulation(str(script))
+    s.send("get ", 1000)
+    s.send("vol\n", 1200)
+    s.send("get time\n", 2500)
+    s.at(9000, lambda: None)
+    run_quietly(s, 5)
+    assert s.namespace["lines"] == [(1200, "get vol\n"), (2500, "get time\n")]
+    assert sim.uasyncio._kernel.steps < 10  # no polling in between
+
+
+def test_the_clock_runs_unmodified():
+    s = Simulation()
+    s.press(1, at_ms=5000)
+    s.snapshot_at(5500, "format")
+    run_quietly(s, 10)
+    assert s.completed
+    assert s.snapshots["format"].contains("Change Format")
+
+
+@pytest.mark.parametrize("line, max_steps", [(None, 8 * 3600), ("set mute 0; set vol 5", 12 * 3600)])
+def test_a_quiet_hour_only_wakes_for_the_ticks(line, max_steps):
+    s = Simulation()
+    if line:
+        s.send(line + "\n", 500)
+    run_quietly(s, 3600)
+    assert sim.uasyncio._kernel.steps < max_steps
+    # RDS is only polled while the panel is on, the first two minutes
+    assert s.namespace["fm_radio"].RdsPolls < 150 * 1000 // 40
+    assert not s.snapshot().display_on
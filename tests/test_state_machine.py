@@ -0,0 +1,101 @@
+"""StateMachine dispatch and table introspection, and the clock's own table."""
+
+import contextlib
+import io
+
+import pytest
+
+from sim import Simulation
+from state_machine import StateMachine
+
+
+def make_table():
+    calls = []
+    menu = StateMachine(0)
+    menu.add(0, 1, None, 1)
+    menu.add(1, 1, None, 0)
+    menu.add(1, 2, lambda: calls.append("up"), repeat=5)
+    menu.add_screen(0, lambda: calls.append("screen 0"))
+    menu.add_screen(1, lambda: calls.append("screen 1"))
+    return menu, calls
+
+
+def test_dispatch_runs_the_action_and_moves_on():
+    menu, calls = make_table()
+    assert menu.dispatch(1)
+    assert menu.state == 1
+    assert menu.dispatch(2)
+    assert menu.state == 1  # no next state: stays
+    assert calls == ["up"]
+    assert not menu.dispatch(4)
+
+
+def test_repeat_limit_follows_the_current_state():
+    menu, calls = make_table()
+    assert menu.repeat_limit(2) == 0
+    menu.dispatch(1)
+    assert menu.repeat_limit(2) == 5
+
+
+def test_render_draws_the_screen_of_the_current_state():
+    menu, calls = make_table()
+    menu.render()
+    assert calls == ["screen 0"]
+
+
+def test_a_complete_table_has_no_findings():
+    menu, calls = make_table()
+    assert menu.states() == [0, 1]
+    assert menu.unreachable() == []
+    assert menu.stuck() == []
+    assert menu.missing_screens() == []
+
+
+def test_unreachable_state():
+    menu, calls = make_table()
+    menu.add(7, 1, None, 0)
+    menu.add_screen(7, lambda: None)
+    assert menu.unreachable() == [7]
+    menu.add_entry(7)
+    assert menu.unreachable() == []
+
+
+def test_stuck_state():
+    menu, calls = make_table()
+    menu.add(1, 3, None, 8)
+    menu.add_screen(8, lambda: None)
+    assert menu.stuck() == [8]
+
+
+def test_missing_screen():
+    menu, calls = make_table()
+    menu.add(1, 4, None, 9)
+    menu.add(9, 1, None, 0)
+    assert menu.missing_screens() == [9]
+
+
+def test_edges_name_the_actions():
+    menu, calls = make_table()
+    menu.add(0, 2, test_missing_screen)
+    assert (0, 2, "test_missing_screen", 0) in menu.edges()
+    assert (0, 1, None, 1) in menu.edges()
+
+
+@pytest.fixture(scope="module")
+def clock_menu():
+    sim = Simulation()
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim.run(seconds=0.5)
+    return sim.namespace["menu"]
+
+
+def test_clock_table_every_screen_reachable(clock_menu):
+    assert clock_menu.unreachable() == []
+
+
+def test_clock_table_no_screen_is_a_dead_end(clock_menu):
+    assert clock_menu.stuck() == []
+
+
+def test_clock_table_every_state_has_a_screen(clock_menu):
+    assert clock_menu.missing_screens() == []
@@ -0,0 +1,102 @@
+"""The one second tick: absolute deadlines, catch-up after a late wake and overruns."""
+
+import contextlib
+import io
+import sys
+
+import pytest
+
+import sim.board
+import sim.clock
+import sim.utime
+from sim import Simulation
+
+
+@pytest.fixture
+def board(monkeypatch):
+    board = sim.board.Board()
+    sim.board.install(board)
+    monkeypatch.setitem(sys.modules, "utime", sim.utime)
+    monkeypatch.delitem(sys.modules, "tick_scheduler", raising=False)
+    return board
+
+
+@pytest.fixture
+def ticker(board):
+    import tick_scheduler
+    return tick_scheduler.TickScheduler(1000)
+
+
+def sleep_ms(board, ms):
+    board.clock.advance(ms * 1000)
+
+
+def test_nothing_is_due_before_the_deadline(board, ticker):
+    sleep_ms(board, 400)
+    assert ticker.remaining() == 600
+    assert ticker.advance() == 0
+    assert ticker.ticks == 0
+
+
+def test_an_on_time_wake_delivers_one_tick(board, ticker):
+    sleep_ms(board, 1000)
+    assert ticker.remaining() == 0
+    assert ticker.advance() == 1
+    assert ticker.remaining() == 1000
+    assert (ticker.ticks, ticker.missed, ticker.late_last) == (1, 0, 0)
+
+
+def test_work_is_taken_out_of_the_next_sleep(board, ticker):
+    for second in range(5):
+        sleep_ms(board, ticker.remaining())
+        assert ticker.advance() == 1
+        sleep_ms(board, 130)  # rendering, radio, ...
+        ticker.finish()
+        assert ticker.remaining() == 870
+    assert board.clock.ticks_ms() == 5130  # ticks at 1000 .. 5000 ms, never later
+    assert ticker.busy_max == 130
+    assert ticker.overruns == 0
+
+
+def test_a_late_wake_catches_up_the_missed_ticks(board, ticker):
+    sleep_ms(board, 3250)
+    assert ticker.advance() == 3
+    assert ticker.missed == 2
+    assert ticker.late_last == ticker.late_max == 2250
+    # the next deadline stays on the one second grid
+    assert ticker.remaining() == 750
+    sleep_ms(board, 750)
+    assert ticker.advance() == 1
+    assert ticker.ticks == 4
+    assert ticker.late_last == 0
+    assert ticker.late_max == 2250
+
+
+def test_a_long_tick_counts_as_an_overrun(board, ticker):
+    sleep_ms(board, 1000)
+    ticker.advance()
+    sleep_ms(board, 1200)
+    ticker.finish()
+    assert ticker.overruns == 1
+    assert ticker.busy_last == 1200
+    assert ticker.advance() == 1  # the deadline at 2000 ms already passed
+    assert ticker.late_last == 200
+    assert "missed:0 overruns:1 late:200/200ms busy:1200/1200ms" in ticker.report()
+
+
+def test_deadlines_survive_the_ticks_wrap(board, ticker):
+    board.clock.now_us = (sim.clock.TICKS_PERIOD - 500) * 1000
+    ticker.__init__(1000)  # first deadline 500 ms after the wrap
+    sleep_ms(board, 2100)
+    assert ticker.advance() == 2
+    assert ticker.remaining() == 900
+
+
+def test_the_clock_keeps_time_while_the_radio_is_busy():
+    s = Simulation()
+    s.send("set freq 101.1; set mute 0\n", 300)
+    with contextlib.redirect_stdout(io.StringIO()):
+        s.run(60.5)
+    ns = s.namespace
+    assert ns["clock_now"]() == 11 * 3600 + 22 * 60 + 50 + 60
+    assert ns["tick_scheduler"].missed == 0
@@ -0,0 +1,82 @@
+"""The time of day as seconds since midnight, and how it is shown in 12 and 24 hours."""
+
+import contextlib
+import io
+
+import pytest
+
+from sim import Simulation
+
+
+def run(sim, seconds):
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim.run(seconds)
+    return sim
+
+
+@pytest.fixture(scope="module")
+def clock():
+    s = run(Simulation(), 0.5)
+    s.clock.stop_us = None  # call the clock's functions directly from here on
+    return s.namespace
+
+
+@pytest.mark.parametrize("text, seconds", [
+    ("00:00", 0),
+    ("00:00:01", 1),
+    ("12:00", 12 * 3600),
+    ("07:05:09", 7 * 3600 + 5 * 60 + 9),
+    ("23:59:59", 86399),
+])
+def test_parse_and_print_round_trip(clock, text, seconds):
+    assert clock["parse_time"](text) == seconds
+    assert clock["time_text"](seconds) == (text + ":00")[:8]
+
+
+@pytest.mark.parametrize("text", ["24:00", "12:60", "12:00:60", "-1:00", "12", "1:2:3:4", "ab:cd"])
+def test_parse_rejects_times_that_do_not_exist(clock, text):
+    with pytest.raises(ValueError):
+        clock["parse_time"](text)
+
+
+def test_the_day_rolls_over_at_midnight(clock):
+    clock["clock_seconds"] = 86399
+    day = clock["clock_day"]
+    clock["advance_clock"](1)
+    assert (clock["clock_seconds"], clock["clock_day"]) == (0, day + 1)
+    clock["advance_clock"](2 * 86400 + 61)  # a long catch-up spans several days
+    assert (clock["clock_seconds"], clock["clock_day"]) == (61, day + 3)
+    assert clock["clock_now"]() == (day + 3) * 86400 + 61
+
+
+@pytest.mark.parametrize("switch, seconds, hours, minutes", [
+    (False, 23 * 3600 + 30 * 60, 30 * 60, 23 * 3600 + 31 * 60),  # + wraps past midnight
+    (True, 30 * 60, 23 * 3600 + 30 * 60, 29 * 60),  # - wraps back
+    (False, 10 * 3600 + 59 * 60 + 15, 11 * 3600 + 59 * 60 + 15, 10 * 3600 + 15),  # minutes stay in the hour
+    (True, 10 * 3600 + 15, 9 * 3600 + 15, 10 * 3600 + 59 * 60 + 15),
+])
+def test_hour_and_minute_buttons_wrap(clock, switch, seconds, hours, minutes):
+    clock["switch_level"] = switch
+    clock["increment"] = 1
+    assert clock["add_hours"](seconds) == hours
+    assert clock["add_minutes"](seconds) == minutes
+
+
+@pytest.mark.parametrize("time, format, shown", [
+    ("00:05", "12", "12:05 AM"),
+    ("11:59", "12", "11:59 AM"),
+    ("12:00", "12", "12:00 PM"),
+    ("13:07", "12", "01:07 PM"),
+    ("23:59", "12", "11:59 PM"),
+    ("00:05", "24", "00:05"),
+    ("13:07", "24", "13:07"),
+])
+def test_the_main_screen_shows_the_selected_format(time, format, shown):
+    s = Simulation()
+    s.send("set format %s; set time %s:30\n" % (format, time), 300)
+    s.snapshot_at(900, "main")
+    run(s, 1)
+    snapshot = s.snapshots["main"]
+    assert snapshot.contains(shown), snapshot.text()
+    if format == "24":
+        assert not snapshot.contains(" AM") and not snapshot.contains(" PM")
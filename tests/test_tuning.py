@@ -0,0 +1,87 @@
+"""Tuning on whole channels: CHANNEL_TABLE and SetFrequency rounding and range checks."""
+
+import contextlib
+import io
+
+import pytest
+
+from sim import Simulation
+
+
+@pytest.fixture(scope="module")
+def clock():
+    s = Simulation()
+    with contextlib.redirect_stdout(io.StringIO()):
+        s.run(0.5)
+    s.clock.stop_us = None  # drive the radio directly from here on
+    return s
+
+
+def test_the_table_holds_register_03h_of_every_channel(clock):
+    ns = clock.namespace
+    table = ns["CHANNEL_TABLE"]
+    assert len(table) == 2 * (ns["CHANNEL_MAX"] - ns["CHANNEL_MIN"] + 1)
+    for channel in range(ns["CHANNEL_MIN"], ns["CHANNEL_MAX"] + 1):
+        offset = 2 * (channel - ns["CHANNEL_MIN"])
+        register = (table[offset] << 8) | table[offset + 1]
+        assert register >> 6 == channel
+        assert register & 0x0030 == 0x0010  # TUNE, band 87-108 MHz, 100 kHz spacing
+
+
+@pytest.mark.parametrize("frequency, channel", [
+    ("88.0", 10),
+    ("101.1", 141),
+    (101.1, 141),
+    ("101.14", 141),
+    ("101.15", 142),  # halves round up
+    ("101.06", 141),
+    (107.3, 203),
+    ("108", 210),
+    ("107.96", 210),
+    (88, 10),
+])
+def test_set_frequency_rounds_to_the_nearest_channel(clock, frequency, channel):
+    radio = clock.namespace["fm_radio"]
+    assert radio.SetFrequency(frequency)
+    assert radio.Channel == channel
+
+
+@pytest.mark.parametrize("frequency", [
+    "87.9", "87.94", "108.1", "108.05", 0, -101.1, "", "abc", "101,1", None, "inf", "nan",
+])
+def test_set_frequency_rejects_values_outside_the_band(clock, frequency):
+    radio = clock.namespace["fm_radio"]
+    assert radio.SetFrequency("99.9")
+    assert not radio.SetFrequency(frequency)
+    assert radio.Channel == 129  # unchanged
+
+
+@pytest.mark.parametrize("channel", [9, 211, -1, 10.0, "141"])
+def test_set_channel_takes_whole_channels_in_the_band(clock, channel):
+    radio = clock.namespace["fm_radio"]
+    assert radio.SetChannel(141)
+    assert not radio.SetChannel(channel)
+    assert radio.Channel == 141
+
+
+def test_the_settings_image_copies_the_table_entry(clock):
+    ns = clock.namespace
+    radio = ns["fm_radio"]
+    for channel in (ns["CHANNEL_MIN"], 141, ns["CHANNEL_MAX"]):
+        radio.SetChannel(channel)
+        radio.UpdateSettings()
+        offset = 2 * (channel - ns["CHANNEL_MIN"])
+        assert radio.Settings[2:4] == ns["CHANNEL_TABLE"][offset:offset + 2]
+
+
+def test_the_chip_tunes_to_the_frequency_from_the_console():
+    s = Simulation()
+    s.send("set mute 0; set freq 103.36\n", 300)
+    s.send("set freq 120\n", 600)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        s.run(1)
+    lines = out.getvalue().splitlines()
+    assert lines.count("ok") == 2
+    assert lines[-1] == "err set freq: outside 88.0-108.0"
+    assert s.radio.frequency_tenths == 1034
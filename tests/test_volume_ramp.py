@@ -0,0 +1,124 @@
+"""The alarm fade in: level timing, curves, the duration cap and cancelling."""
+
+import contextlib
+import io
+import sys
+
+import pytest
+
+import sim.board
+import sim.utime
+from sim import Simulation
+
+
+@pytest.fixture
+def board(monkeypatch):
+    board = sim.board.Board()
+    sim.board.install(board)
+    monkeypatch.setitem(sys.modules, "utime", sim.utime)
+    monkeypatch.delitem(sys.modules, "volume_ramp", raising=False)
+    return board
+
+
+@pytest.fixture
+def ramps(board):
+    import volume_ramp
+    return volume_ramp
+
+
+def follow(board, ramp):
+    """(ms after begin, level) of every step, sleeping as the ramp asks."""
+    start = board.clock.ticks_ms()
+    levels = []
+    while ramp.active:
+        board.clock.advance(ramp.remaining() * 1000)
+        level = ramp.step()
+        if level >= 0:
+            levels.append((board.clock.ticks_ms() - start, level))
+    return levels
+
+
+@pytest.mark.parametrize("curve", [0, 1])
+def test_the_curve_starts_at_start_and_ends_at_target(ramps, curve):
+    ramp = ramps.VolumeRamp(1, 15, 28000, curve)
+    assert ramp.due_after(1) == 0
+    assert ramp.due_after(15) == 28000
+    times = [ramp.due_after(level) for level in range(1, 16)]
+    assert times == sorted(times)
+
+
+def test_linear_levels_are_evenly_spaced(board, ramps):
+    ramp = ramps.VolumeRamp(1, 15, 28000, ramps.RAMP_LINEAR)
+    ramp.begin()
+    assert ramp.level == 1
+    assert ramp.remaining() == 2000
+    assert follow(board, ramp) == [(2000 * (level - 1), level) for level in range(2, 16)]
+    assert ramp.steps == 14
+    assert ramp.remaining() == -1
+    assert ramp.step() == -1
+
+
+def test_exponential_starts_slowly(board, ramps):
+    ramp = ramps.VolumeRamp(1, 15, 28000, ramps.RAMP_EXPONENTIAL)
+    ramp.begin()
+    levels = follow(board, ramp)
+    assert [level for at, level in levels] == list(range(2, 16))
+    assert levels[-1][0] == 28000
+    gaps = [b[0] - a[0] for a, b in zip([(0, 1)] + levels, levels)]
+    assert gaps == sorted(gaps, reverse=True)
+    assert gaps[0] > 3 * 2000 > 3 * gaps[-1]
+
+
+def test_the_cap_wins_over_the_duration(board, ramps):
+    ramp = ramps.VolumeRamp(1, 15, 600000, ramps.RAMP_LINEAR, max_duration_ms=120000)
+    assert ramp.duration == 120000
+    ramp.begin()
+    assert follow(board, ramp)[-1] == (120000, 15)
+
+
+def test_a_late_wake_skips_to_the_level_that_is_due(board, ramps):
+    ramp = ramps.VolumeRamp(1, 15, 28000, ramps.RAMP_LINEAR)
+    ramp.begin()
+    board.clock.advance(9000 * 1000)  # levels 2 .. 5 were due
+    assert ramp.step() == 5
+    assert ramp.steps == 1
+    assert ramp.remaining() == 1000
+    board.clock.advance(60000 * 1000)
+    assert ramp.step() == 15
+    assert not ramp.active
+
+
+def test_cancel_stops_the_ramp(board, ramps):
+    ramp = ramps.VolumeRamp(1, 15, 28000, ramps.RAMP_LINEAR)
+    ramp.begin()
+    board.clock.advance(4000 * 1000)
+    assert ramp.step() == 3
+    ramp.cancel()
+    assert ramp.remaining() == -1
+    board.clock.advance(60000 * 1000)
+    assert ramp.step() == -1
+    assert ramp.level == 3
+
+
+@pytest.mark.parametrize("start, target, duration", [(15, 15, 30000), (9, 4, 30000), (1, 15, 0)])
+def test_nothing_to_ramp(board, ramps, start, target, duration):
+    ramp = ramps.VolumeRamp(start, target, duration)
+    ramp.begin()
+    assert not ramp.active
+    assert ramp.remaining() == -1
+    assert ramp.step() == -1
+
+
+def test_the_alarm_fades_in_until_it_is_accepted():
+    s = Simulation()
+    s.send("set alarm 11:23\n", 300)  # the clock starts at 11:22:50
+    s.press(1, 25000)  # accept while the volume is still rising
+    with contextlib.redirect_stdout(io.StringIO()):
+        s.run(40)
+    levels = [volume for at, channel, volume, muted, powered in s.radio.history if not muted]
+    ramp = s.namespace["alarm_ramp"]
+    assert levels[0] == ramp.start
+    assert levels == sorted(levels)
+    assert 1 < max(levels) < ramp.target
+    assert not ramp.active
+    assert ramp.level == max(levels)
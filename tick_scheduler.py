@@ -0,0 +1,71 @@
+#
+# Drift free tick for radio_alarm_clock.py
+# This file must be saved on the Pico next to radio_alarm_clock.py
+#
+# Deadlines are kept as absolute utime.ticks_ms() values, so time spent
+# rendering or talking to the radio is taken out of the next sleep instead
+# of being added to every second.
+#
+import utime
+
+# Tick scheduler class
+class TickScheduler:
+
+    def __init__( self, period_ms = 1000 ):
+        self.period = period_ms
+        self.last_deadline = utime.ticks_ms()
+        self.deadline = utime.ticks_add( self.last_deadline, period_ms )
+#
+# Overrun statistics
+#
+        self.ticks = 0 # ticks delivered, including caught up ones
+        self.late_last = 0 # ms the last wake up came after its deadline
+        self.late_max = 0
+        self.busy_last = 0 # ms of work done in the last tick
+        self.busy_max = 0
+        self.overruns = 0 # ticks whose work ran past the next deadline
+        self.missed = 0 # ticks that were caught up instead of slept through
+
+#
+# ms left until the next tick is due (0 when it is already due)
+#
+    def remaining( self ):
+        return( max( 0, utime.ticks_diff( self.deadline, utime.ticks_ms() )))
+
+#
+# Record how long the work of the current tick took (call when it is done)
+#
+    def finish( self ):
+        busy = utime.ticks_diff( utime.ticks_ms(), self.last_deadline )
+        self.busy_last = busy
+        if busy > self.busy_max:
+            self.busy_max = busy
+        if busy > self.period:
+            self.overruns += 1
+
+#
+# Count the deadlines that have passed and move the deadline past them.
+# Returns 0 when the next tick is not due yet.
+#
+    def advance( self ):
+        late = utime.ticks_diff( utime.ticks_ms(), self.deadline )
+        if late < 0:
+            return( 0 )
+        elapsed = 1 + late // self.period
+        self.last_deadline = utime.ticks_add( self.deadline, ( elapsed - 1 ) * self.period )
+        self.deadline = utime.ticks_add( self.last_deadline, self.period )
+
+        self.ticks += elapsed
+        self.missed += elapsed - 1
+        self.late_last = late
+        if late > self.late_max:
+            self.late_max = late
+        return( elapsed )
+
+#
+# One line summary for the serial console
+#
+    def report( self ):
+        return( "ticks:{} missed:{} overruns:{} late:{}/{}ms busy:{}/{}ms".format(
+            self.ticks, self.missed, self.overruns, self.late_last, self.late_max,
+            self.busy_last, self.busy_max ))
@@ -0,0 +1,83 @@
+#
+# Alarm volume ramp (fade in) for radio_alarm_clock.py
+# This file must be saved on the Pico next to radio_alarm_clock.py
+#
+# The ramp raises the volume one level at a time from start to target. Instead
+# of polling, it works out when the next level is due, so the task driving it
+# sleeps until then and makes one radio write per level.
+#
+#   ramp.begin()            start at ramp.start (write that level yourself)
+#   ramp.remaining()        ms until the next level is due (-1 when idle)
+#   ramp.step()             the level that is due now, or -1
+#   ramp.cancel()           stop (Accept/Snooze)
+#
+import math
+import utime
+
+RAMP_LINEAR = 0 # equal time per volume level
+RAMP_EXPONENTIAL = 1 # slow start, the last levels come quickly
+
+# Volume ramp class
+class VolumeRamp:
+
+    def __init__( self, start = 1, target = 15, duration_ms = 30000, curve = RAMP_LINEAR,
+                  max_duration_ms = 120000, sharpness = 4 ):
+        self.start = start
+        self.target = target
+        self.duration = min( duration_ms, max_duration_ms ) # the cap wins over the setting
+        self.curve = curve
+        self.sharpness = sharpness # exponential only: larger means a slower start
+        self.active = False
+        self.started = 0
+        self.level = start
+        self.next_due = 0
+        self.steps = 0 # levels applied since begin()
+
+    def begin( self ):
+        self.active = self.target > self.start and self.duration > 0
+        self.started = utime.ticks_ms()
+        self.level = self.start
+        self.steps = 0
+        if self.active:
+            self.next_due = utime.ticks_add( self.started, self.due_after( self.start + 1 ))
+
+    def cancel( self ):
+        self.active = False
+
+#
+# ms after begin() at which the volume reaches level
+#
+    def due_after( self, level ):
+        fraction = ( level - self.start ) / ( self.target - self.start )
+        if self.curve == RAMP_EXPONENTIAL:
+            k = self.sharpness
+            fraction = math.log( 1 + fraction * ( math.exp( k ) - 1 )) / k
+        return( int( fraction * self.duration ))
+
+    def remaining( self ):
+        if not self.active:
+            return( -1 )
+        return( max( 0, utime.ticks_diff( self.next_due, utime.ticks_ms() )))
+
+#
+# Return the level that is due now (skipping levels that were missed, so a late
+# wake up still costs one write) or -1 when nothing is due yet
+#
+    def step( self ):
+        if not self.active or utime.ticks_diff( utime.ticks_ms(), self.next_due ) < 0:
+            return( -1 )
+        elapsed = utime.ticks_diff( utime.ticks_ms(), self.started )
+        level = self.level + 1
+        while level < self.target and self.due_after( level + 1 ) <= elapsed:
+            level += 1
+        self.level = level
+        self.steps += 1
+        if level >= self.target:
+            self.active = False
+        else:
+            self.next_due = utime.ticks_add( self.started, self.due_after( level + 1 ))
+        return( level )
+
+    def report( self ):
+        return( "ramp {} level:{} steps:{} curve:{} {}ms".format(
+            "on" if self.active else "off", self.level, self.steps, self.curve, self.duration ))